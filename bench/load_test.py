@@ -0,0 +1,288 @@
+"""
+Closed-loop load generator for the chatbot API.
+
+Replays the client turns of recorded dialogs (``dials/*.json``) or synthetic
+ones against ``/init-session`` + ``/chat`` with ``--concurrency`` sessions in
+flight, then writes latency percentiles and throughput as JSON:
+
+    python bench/load_test.py --url https://localhost:8000 --insecure \\
+        --dials src/dials --sessions 200 --concurrency 16 --out bench/runs/results/run.json
+
+Per-stage server timings are taken from the ``/metrics`` histograms
+(difference between before and after the run).
+"""
+import argparse
+import asyncio
+import glob
+import json
+import os
+import platform
+import random
+import re
+import time
+from datetime import datetime
+
+import httpx
+
+
+SYNTHETIC_UTTERANCES = [
+    "갑자기 숨이 안 쉬어져요",
+    "심장이 너무 빨리 뛰어요",
+    "죽을 것 같아요, 어떡하죠",
+    "손이 떨리고 어지러워요",
+    "지하철 안인데 내리고 싶어요",
+    "조금 나아진 것 같아요",
+    "네, 따라 해 볼게요",
+    "아직도 가슴이 답답해요",
+    "이제 좀 괜찮아졌어요",
+]
+
+
+def load_dialogs(dial_dir, limit=None):
+    """Client utterances of each recorded dialog (dialogs without any are skipped)."""
+    dialogs = []
+    for path in sorted(glob.glob(os.path.join(dial_dir, "*.json"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError):
+            continue
+        turns = [m["message"] for m in history if m.get("role", "").lower() == "client"]
+        if turns:
+            dialogs.append(turns)
+        if limit and len(dialogs) >= limit:
+            break
+    return dialogs
+
+
+def synthetic_dialogs(n, turns, rng):
+    return [[rng.choice(SYNTHETIC_UTTERANCES) for _ in range(turns)] for _ in range(n)]
+
+
+def percentile(values, q):
+    """Linear-interpolated percentile of `values` (q in 0..100)."""
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * q / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def summarize(latencies_ms):
+    if not latencies_ms:
+        return {"count": 0}
+    return {
+        "count": len(latencies_ms),
+        "mean": round(sum(latencies_ms) / len(latencies_ms), 1),
+        "p50": round(percentile(latencies_ms, 50), 1),
+        "p95": round(percentile(latencies_ms, 95), 1),
+        "p99": round(percentile(latencies_ms, 99), 1),
+        "max": round(max(latencies_ms), 1),
+    }
+
+
+STAGE_SAMPLE = re.compile(r'^chat_stage_duration_seconds_(sum|count)\{stage="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+
+async def stage_totals(client, url):
+    """``{stage: (sum_seconds, count)}`` from the server's /metrics, or ``{}``."""
+    try:
+        resp = await client.get(f"{url}/metrics")
+        resp.raise_for_status()
+    except httpx.HTTPError:
+        return {}
+    totals = {}
+    for kind, stage, value in STAGE_SAMPLE.findall(resp.text):
+        s, c = totals.get(stage, (0.0, 0.0))
+        totals[stage] = (s + float(value), c) if kind == "sum" else (s, c + float(value))
+    return totals
+
+
+def stage_means(before, after):
+    means = {}
+    for stage, (s, c) in after.items():
+        s0, c0 = before.get(stage, (0.0, 0.0))
+        if c - c0 > 0:
+            means[stage] = round((s - s0) / (c - c0) * 1000, 1)
+    return means
+
+
+def last_sse_event(text):
+    """``(event, data)`` of the last event in an SSE body, or ``(None, None)``."""
+    event = data = None
+    for block in text.split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines() if ": " in line)
+        if "event" in fields:
+            event, data = fields["event"], fields.get("data")
+    return event, data
+
+
+async def wait_ready(client, url, timeout):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            resp = await client.get(f"{url}/status")
+            if resp.status_code == 200 and resp.json().get("ready"):
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(1)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+class Stats:
+    def __init__(self):
+        self.turn_ms = []
+        self.init_ms = []
+        self.turns = 0
+        self.sessions = 0
+        self.ended = 0
+        self.rejected = 0
+        self.errors = {}
+
+    def error(self, kind):
+        self.errors[kind] = self.errors.get(kind, 0) + 1
+
+
+async def run_session(client, url, turns, stats, think_time, endpoint):
+    start = time.perf_counter()
+    try:
+        resp = await client.post(f"{url}/init-session")
+        resp.raise_for_status()
+    except httpx.HTTPError as e:
+        stats.error(f"init:{type(e).__name__}")
+        return
+    stats.init_ms.append((time.perf_counter() - start) * 1000)
+    stats.sessions += 1
+    session_id = resp.json()["session_id"]
+
+    for utterance in turns:
+        if think_time:
+            await asyncio.sleep(think_time)
+        start = time.perf_counter()
+        try:
+            resp = await client.post(
+                f"{url}/{endpoint}", json={"session_id": session_id, "user_utterance": utterance}
+            )
+        except httpx.HTTPError as e:
+            stats.error(type(e).__name__)
+            return
+        elapsed = (time.perf_counter() - start) * 1000
+
+        if resp.status_code == 503:
+            stats.rejected += 1
+            continue
+        if resp.status_code != 200:
+            stats.error(f"http_{resp.status_code}")
+            return
+        if endpoint == "chat":
+            end_signal = resp.json().get("end_signal", False)
+        else:
+            # SSE: 200 이어도 스트림이 error 이벤트로 끝나면 실패한 턴
+            event, data = last_sse_event(resp.text)
+            if event != "done":
+                stats.error(f"sse_{event or 'incomplete'}")
+                return
+            end_signal = json.loads(data).get("end_signal", False)
+        stats.turn_ms.append(elapsed)
+        stats.turns += 1
+        if end_signal:
+            stats.ended += 1
+            return
+
+
+async def run(args):
+    rng = random.Random(args.seed)
+    dialogs = load_dialogs(args.dials, args.max_dialogs) if args.dials else []
+    source = f"dials:{args.dials}" if dialogs else "synthetic"
+    if not dialogs:
+        dialogs = synthetic_dialogs(max(args.sessions, 1), args.turns, rng)
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(timeout=args.timeout, verify=not args.insecure, limits=limits) as client:
+        await wait_ready(client, args.url, args.ready_timeout)
+        before = await stage_totals(client, args.url)
+
+        stats = Stats()
+        queue = asyncio.Queue()
+        for i in range(args.sessions):
+            queue.put_nowait(dialogs[i % len(dialogs)][:args.turns])
+
+        async def worker():
+            while True:
+                try:
+                    turns = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                await run_session(client, args.url, turns, stats, args.think_time, args.endpoint)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+        duration = time.perf_counter() - started
+
+        after = await stage_totals(client, args.url)
+
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "host": platform.node(),
+        "params": {
+            "url": args.url,
+            "endpoint": args.endpoint,
+            "source": source,
+            "sessions": args.sessions,
+            "concurrency": args.concurrency,
+            "max_turns": args.turns,
+            "think_time": args.think_time,
+            "seed": args.seed,
+        },
+        "duration_s": round(duration, 2),
+        "sessions_completed": stats.sessions,
+        "sessions_ended": stats.ended,
+        "turns": stats.turns,
+        "turns_per_s": round(stats.turns / duration, 2) if duration > 0 else None,
+        "rejected_503": stats.rejected,
+        "errors": stats.errors,
+        "turn_latency_ms": summarize(stats.turn_ms),
+        "init_latency_ms": summarize(stats.init_ms),
+        "server_stage_mean_ms": stage_means(before, after),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--insecure", action="store_true", help="skip TLS verification (self-signed cert)")
+    parser.add_argument("--endpoint", choices=("chat", "chat-stream"), default="chat")
+    parser.add_argument("--dials", default=None, help="directory of recorded dialogs (*.json); synthetic if empty")
+    parser.add_argument("--max-dialogs", type=int, default=None)
+    parser.add_argument("--sessions", type=int, default=100, help="total sessions to run")
+    parser.add_argument("--concurrency", type=int, default=8, help="sessions in flight")
+    parser.add_argument("--turns", type=int, default=10, help="max client turns per session")
+    parser.add_argument("--think-time", type=float, default=0.0, help="seconds between turns of a session")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--ready-timeout", type=float, default=300.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=None, help="JSON result file (default bench/runs/results/<timestamp>.json)")
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args))
+
+    out = args.out or os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "runs", "results", f"{datetime.now():%Y%m%d_%H%M%S}.json"
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True, ensure_ascii=False)
+        f.write("\n")
+
+    lat = result["turn_latency_ms"]
+    print(f"{result['turns']} turns in {result['duration_s']}s → {result['turns_per_s']} turns/s, "
+          f"p50 {lat.get('p50')} / p95 {lat.get('p95')} / p99 {lat.get('p99')} ms, "
+          f"503 {result['rejected_503']}, errors {sum(result['errors'].values())}")
+    print(f"Results written to {out}")
+
+
+if __name__ == "__main__":
+    main()
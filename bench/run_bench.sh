@@ -0,0 +1,23 @@
+#!/bin/bash
+# 로컬 stub 백엔드 + 챗봇 서버를 띄우고 부하 테스트를 돌린 뒤 정리한다.
+# 사용법: ./bench/run_bench.sh [load_test.py 인자...]
+#   예) ./bench/run_bench.sh --sessions 200 --concurrency 32 --out bench/runs/results/c32.json
+
+CONFIG_FILE=./bench/bench_config.json
+PORT=18000
+
+STUB_ARGS=${STUB_ARGS:-"--seed 0"}
+
+mkdir -p bench/runs
+
+python bench/stub_servers.py $STUB_ARGS > bench/runs/stubs.log 2>&1 &
+STUB_PID=$!
+
+PYTHONPATH="$(pwd)/src" \
+CONFIG_PATH=$CONFIG_FILE \
+uvicorn src.chatbot:app --host 127.0.0.1 --port "$PORT" --log-level warning > bench/runs/chatbot.log 2>&1 &
+APP_PID=$!
+
+trap 'kill $APP_PID $STUB_PID 2>/dev/null' EXIT
+
+python bench/load_test.py --url "http://127.0.0.1:$PORT" "$@"
@@ -0,0 +1,296 @@
+"""
+Local stand-ins for the chatbot's backends, for load testing without GPUs or API keys.
+
+    vLLM    POST /v1/completions                       (OpenAI-compatible, used by langchain; ``stream`` → SSE)
+            GET  /metrics                              (prefix-cache counters)
+            GET  /health                               (503 while the replica is marked down)
+            POST /stub/down, /stub/up                  (simulate an outage of this replica)
+    Gemini  POST /v1/models/{model}:generateContent
+            POST /v1/models/{model}:streamGenerateContent?alt=sse
+    ASR     POST /asr                                  → [{"transcription": ...}]
+    TTS     POST /tts                                  → WAV (silence, length ∝ text)
+
+Each backend sleeps for a latency drawn from its own distribution, e.g.
+
+    python bench/stub_servers.py --llm-latency lognormal:300,0.4 --gemini-latency normal:600,150
+
+Distribution specs (milliseconds): ``const:MS``, ``uniform:LO,HI``,
+``normal:MEAN,STD``, ``lognormal:MEDIAN,SIGMA``, ``exp:MEAN``.
+
+``--vllm-replicas N`` starts N independent vLLM stubs on ``--vllm-port``,
+``+10``, ``+20``, ... to exercise multi-endpoint routing (``vllm_endpoints``).
+"""
+import argparse
+import asyncio
+import io
+import json
+import random
+import re
+import time
+import wave
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse, PlainTextResponse
+
+
+# 실제 모델처럼 상담사 라벨로 시작하고, stop 이 없으면 가짜 Client 턴까지 이어 쓴다
+REPLIES = [
+    "지금 많이 힘드시죠. 천천히 숨을 들이쉬고 내쉬어 보세요.",
+    "괜찮아요, 저와 함께 호흡에 집중해 볼게요. 넷을 세며 들이쉬어 보세요.",
+    "지금 계신 곳은 안전한가요? 주변에 보이는 것 다섯 가지를 말씀해 주세요.",
+    "잘하고 계세요. 증상은 곧 지나갈 거예요. 조금만 더 함께 호흡해 봐요.",
+]
+CLIENT_FOLLOWUPS = ["네, 해 볼게요.", "아직 좀 어지러워요.", "조금 나아졌어요."]
+
+
+def completion_text(rng, stop=None):
+    """One counselor completion, cut at the first stop sequence like vLLM does."""
+    text = f" Counselor: {rng.choice(REPLIES)}\nClient: {rng.choice(CLIENT_FOLLOWUPS)}\n"
+    stops = [stop] if isinstance(stop, str) else (stop or [])
+    cut = min((i for i in (text.find(s) for s in stops if s) if i >= 0), default=len(text))
+    return text[:cut]
+
+
+class Latency:
+    """Latency distribution parsed from a ``kind:params`` spec (milliseconds)."""
+    KINDS = ("const", "uniform", "normal", "lognormal", "exp")
+
+    def __init__(self, spec, rng=None):
+        kind, _, params = spec.partition(":")
+        if kind not in self.KINDS:
+            raise ValueError(f"latency kind must be one of {self.KINDS}, got {spec!r}")
+        self.spec = spec
+        self.kind = kind
+        self.params = [float(p) for p in params.split(",") if p]
+        self.rng = rng or random.Random()
+
+    def sample(self):
+        """One latency draw, in seconds (never negative)."""
+        p, rng = self.params, self.rng
+        if self.kind == "const":
+            ms = p[0]
+        elif self.kind == "uniform":
+            ms = rng.uniform(p[0], p[1])
+        elif self.kind == "normal":
+            ms = rng.gauss(p[0], p[1])
+        elif self.kind == "lognormal":
+            ms = p[0] * rng.lognormvariate(0.0, p[1])
+        else:
+            ms = rng.expovariate(1.0 / p[0])
+        return max(ms, 0.0) / 1000
+
+    async def sleep(self):
+        await asyncio.sleep(self.sample())
+
+
+# ── vLLM (OpenAI completions) ─────────────────────────────────────
+def create_vllm_app(latency: Latency, max_concurrency=0, fail_rate=0.0, rng=None, chunk_chars=4):
+    app = FastAPI()
+    rng = rng or random.Random()
+    # max_concurrency > 0 이면 그 이상은 대기 (GPU 포화 흉내)
+    slots = asyncio.Semaphore(max_concurrency) if max_concurrency > 0 else None
+    stats = {"queries": 0, "hits": 0, "last_prompt": "", "down": False}
+
+    async def complete(seconds):
+        if slots is None:
+            await asyncio.sleep(seconds)
+            return
+        async with slots:
+            await asyncio.sleep(seconds)
+
+    def count_prefix_hits(prompt):
+        # prefix cache 흉내: 직전 프롬프트와 공유하는 앞부분 문자 수를 hit 로 센다
+        last = stats["last_prompt"]
+        shared = next((k for k, (a, b) in enumerate(zip(prompt, last)) if a != b), min(len(prompt), len(last)))
+        stats["queries"] += len(prompt)
+        stats["hits"] += shared
+        stats["last_prompt"] = prompt
+
+    @app.post("/v1/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        prompts = body.get("prompt", "")
+        prompts = prompts if isinstance(prompts, list) else [prompts]
+        text = completion_text(rng, body.get("stop"))
+        chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+        total = latency.sample()
+        # stream 이면 첫 조각까지만 기다린 뒤 나머지 지연은 조각 사이에 나눠 흘려 보낸다
+        await complete(total / len(chunks) if body.get("stream") else total)
+        if stats["down"]:
+            return JSONResponse({"error": {"message": "stub replica down"}}, status_code=503)
+        if rng.random() < fail_rate:
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+        for prompt in prompts:
+            count_prefix_hits(prompt)
+
+        if body.get("stream"):
+            async def events():
+                for i, chunk in enumerate(chunks):
+                    if i:
+                        await asyncio.sleep(total / len(chunks))
+                    data = {
+                        "id": "cmpl-stream", "object": "text_completion",
+                        "created": int(time.time()), "model": body.get("model", "stub"),
+                        "choices": [{"text": chunk, "index": 0, "logprobs": None,
+                                     "finish_reason": "stop" if i == len(chunks) - 1 else None}],
+                    }
+                    yield f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+
+        texts = [text] + [completion_text(rng, body.get("stop")) for _ in prompts[1:]]
+        choices = [
+            {"text": t, "index": i, "logprobs": None, "finish_reason": "stop"}
+            for i, t in enumerate(texts)
+        ]
+        return {
+            "id": f"cmpl-{time.time_ns()}",
+            "object": "text_completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": choices,
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    @app.get("/metrics")
+    async def metrics():
+        return PlainTextResponse(
+            "# TYPE vllm:gpu_prefix_cache_queries_total counter\n"
+            f"vllm:gpu_prefix_cache_queries_total{{model_name=\"stub\"}} {float(stats['queries'])}\n"
+            "# TYPE vllm:gpu_prefix_cache_hits_total counter\n"
+            f"vllm:gpu_prefix_cache_hits_total{{model_name=\"stub\"}} {float(stats['hits'])}\n"
+        )
+
+    @app.get("/health")
+    async def health():
+        return Response(status_code=503 if stats["down"] else 200)
+
+    @app.post("/stub/{state}")
+    async def set_state(state: str):
+        stats["down"] = state == "down"
+        return {"down": stats["down"]}
+
+    return app
+
+
+# ── Gemini generateContent ───────────────────────────────────────
+COUNSELOR_LINE = re.compile(r"^Counselor: (.*)$", re.MULTILINE)
+
+
+def reviewed_text(body: dict) -> str:
+    """Echo the counselor utterance under review (the last ``Counselor:`` line)."""
+    prompt = "".join(p.get("text", "") for c in body.get("contents", []) for p in c.get("parts", []))
+    lines = COUNSELOR_LINE.findall(prompt)
+    return lines[-1] if lines else "OK"
+
+
+def create_gemini_app(latency: Latency, fail_rate=0.0, chunk_chars=12, rng=None):
+    app = FastAPI()
+    rng = rng or random.Random()
+
+    def candidate(text):
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": text}]}}]}
+
+    @app.post("/v1/models/{target}")
+    async def generate(target: str, request: Request):
+        _, _, method = target.partition(":")
+        body = await request.json()
+        if rng.random() < fail_rate:
+            await latency.sleep()
+            return JSONResponse({"error": {"message": "stub failure"}}, status_code=500)
+        text = reviewed_text(body)
+
+        if method == "generateContent":
+            await latency.sleep()
+            return candidate(text)
+        if method == "streamGenerateContent":
+            # 전체 지연을 조각 수만큼 나눠 흘려 보낸다 (첫 조각 지연 포함)
+            chunks = [text[i:i + chunk_chars] for i in range(0, len(text), chunk_chars)] or [""]
+            total = latency.sample()
+
+            async def events():
+                for chunk in chunks:
+                    await asyncio.sleep(total / len(chunks))
+                    yield f"data: {json.dumps(candidate(chunk), ensure_ascii=False)}\n\n"
+
+            return StreamingResponse(events(), media_type="text/event-stream")
+        return JSONResponse({"error": {"message": f"unknown method {method}"}}, status_code=404)
+
+    return app
+
+
+# ── ASR / TTS ────────────────────────────────────────────────────
+def silent_wav(seconds, rate=16000):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(rate * seconds))
+    return buf.getvalue()
+
+
+def create_audio_app(asr_latency: Latency, tts_latency: Latency, transcript="숨쉬기가 힘들어요"):
+    app = FastAPI()
+
+    @app.post("/asr")
+    async def asr(request: Request):
+        await request.body()
+        await asr_latency.sleep()
+        return [{"transcription": transcript}]
+
+    @app.post("/tts")
+    async def tts(request: Request):
+        body = await request.json()
+        await tts_latency.sleep()
+        # 한국어 낭독 속도 대략 초당 7자
+        return Response(silent_wav(max(len(body.get("text", "")) / 7, 0.2)), media_type="audio/wav")
+
+    return app
+
+
+async def serve(apps, host):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        for app, port in apps
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--vllm-port", type=int, default=18001)
+    parser.add_argument("--vllm-replicas", type=int, default=1, help="vLLM stubs on vllm-port, +10, +20, ...")
+    parser.add_argument("--gemini-port", type=int, default=18002)
+    parser.add_argument("--audio-port", type=int, default=18003, help="ASR and TTS")
+    parser.add_argument("--llm-latency", default="lognormal:300,0.3")
+    parser.add_argument("--llm-max-concurrency", type=int, default=0, help="0 = unlimited")
+    parser.add_argument("--gemini-latency", default="lognormal:700,0.4")
+    parser.add_argument("--asr-latency", default="lognormal:400,0.3")
+    parser.add_argument("--tts-latency", default="lognormal:250,0.3")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="fraction of LLM/Gemini calls that return 500")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    vllm_ports = [args.vllm_port + 10 * i for i in range(args.vllm_replicas)]
+    apps = [
+        (create_vllm_app(Latency(args.llm_latency, rng), args.llm_max_concurrency, args.fail_rate, rng), port)
+        for port in vllm_ports
+    ]
+    apps += [
+        (create_gemini_app(Latency(args.gemini_latency, rng), args.fail_rate, rng=rng), args.gemini_port),
+        (create_audio_app(Latency(args.asr_latency, rng), Latency(args.tts_latency, rng)), args.audio_port),
+    ]
+    for port in vllm_ports:
+        print(f"vLLM stub   http://{args.host}:{port}/v1   ({args.llm_latency})")
+    print(f"Gemini stub http://{args.host}:{args.gemini_port}/v1   ({args.gemini_latency})")
+    print(f"ASR/TTS     http://{args.host}:{args.audio_port}/asr, /tts")
+    asyncio.run(serve(apps, args.host))
+
+
+if __name__ == "__main__":
+    main()
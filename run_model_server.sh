@@ -25,4 +25,5 @@ python -m vllm.entrypoints.openai.api_server \
     --dtype "$DTYPE" \
     --tensor-parallel-size "$TP_SIZE" \
     --max-model-len "$MAX_MODEL_LEN" \
-    --kv-cache-dtype "$KV_CACHE_DTYPE"
+    --kv-cache-dtype "$KV_CACHE_DTYPE" \
+    --enable-prefix-caching
@@ -0,0 +1,60 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class AdmissionRejected(Exception):
+    """Raised when a turn cannot be admitted (queue full or waited too long)."""
+    def __init__(self, retry_after: int, reason: str = "queue full"):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """
+    Caps the number of in-flight chat turns and bounds the wait queue.
+
+    Up to `max_inflight` turns run concurrently; up to `max_queued` more may
+    wait for a slot (for at most `max_queue_wait` seconds). Anything beyond
+    that is rejected immediately with `AdmissionRejected`, so the server
+    degrades predictably instead of queueing forever.
+    """
+    def __init__(self, max_inflight=4, max_queued=16, max_queue_wait=30.0, retry_after=5):
+        self.max_inflight = max_inflight
+        self.max_queued = max_queued
+        self.max_queue_wait = max_queue_wait
+        self.retry_after = retry_after
+        self._sem = asyncio.Semaphore(max_inflight)
+        self.inflight = 0
+        self.waiting = 0
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            max_inflight=config.get("max_inflight_turns", 4),
+            max_queued=config.get("max_queued_turns", 16),
+            max_queue_wait=config.get("max_queue_wait", 30.0),
+            retry_after=config.get("queue_retry_after", 5),
+        )
+
+    @asynccontextmanager
+    async def slot(self, max_wait: float = None):
+        """Acquire a generation slot; `max_wait` (e.g. the turn's remaining budget) shortens the wait."""
+        if self._sem.locked() and self.waiting >= self.max_queued:
+            raise AdmissionRejected(self.retry_after, "queue full")
+
+        timeout = self.max_queue_wait if max_wait is None else max(0.0, min(self.max_queue_wait, max_wait))
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._sem.acquire(), timeout=timeout)
+        except asyncio.TimeoutError:
+            raise AdmissionRejected(self.retry_after, "queue wait timeout")
+        finally:
+            self.waiting -= 1
+
+        self.inflight += 1
+        try:
+            yield
+        finally:
+            self.inflight -= 1
+            self._sem.release()
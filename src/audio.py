@@ -0,0 +1,181 @@
+import asyncio
+import io
+import struct
+import wave
+
+
+class AudioConversionError(Exception):
+    pass
+
+
+class AudioConverter:
+    """
+    In-memory async audio conversion to 16 kHz mono 16-bit WAV.
+
+    Bytes are piped through ffmpeg's stdin/stdout (no temp files) and the
+    number of concurrent ffmpeg processes is capped by a semaphore. Input that
+    is already 16 kHz mono PCM WAV is passed through untouched.
+    """
+    SAMPLE_RATE = 16000
+
+    def __init__(self, max_workers=2, ffmpeg="ffmpeg", timeout=30.0, max_streams=8):
+        self.ffmpeg = ffmpeg
+        self.timeout = timeout
+        self._sem = asyncio.Semaphore(max_workers)
+        # 업로드 중인 음성을 실시간으로 받아 변환하는 ffmpeg 프로세스 수 상한
+        self._streams = asyncio.Semaphore(max_streams)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            max_workers=config.get("ffmpeg_workers", 2),
+            timeout=config.get("ffmpeg_timeout", 30.0),
+            max_streams=config.get("ffmpeg_stream_workers", 8),
+        )
+
+    @classmethod
+    def is_target_wav(cls, data: bytes) -> bool:
+        if data[:4] != b"RIFF" or data[8:12] != b"WAVE":
+            return False
+        try:
+            with wave.open(io.BytesIO(data)) as w:
+                return (
+                    w.getframerate() == cls.SAMPLE_RATE
+                    and w.getnchannels() == 1
+                    and w.getsampwidth() == 2
+                    and w.getcomptype() == "NONE"
+                )
+        except (wave.Error, EOFError):
+            return False
+
+    @staticmethod
+    def fix_wav_header(data: bytes) -> bytes:
+        """
+        ffmpeg cannot seek back on a pipe, so the RIFF/data sizes it writes
+        are placeholders. Patch them from the real length.
+        """
+        buf = bytearray(data)
+        struct.pack_into("<I", buf, 4, len(buf) - 8)
+        idx = buf.find(b"data", 12)
+        if idx != -1:
+            struct.pack_into("<I", buf, idx + 4, len(buf) - idx - 8)
+        return bytes(buf)
+
+    def command(self) -> list[str]:
+        return [
+            self.ffmpeg, "-hide_banner", "-loglevel", "error",
+            "-i", "pipe:0",
+            "-ar", str(self.SAMPLE_RATE), "-ac", "1", "-acodec", "pcm_s16le",
+            "-f", "wav", "pipe:1",
+        ]
+
+    async def to_wav(self, data: bytes) -> bytes:
+        if self.is_target_wav(data):
+            return data
+
+        async with self._sem:
+            proc = await asyncio.create_subprocess_exec(
+                *self.command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+            try:
+                out, err = await asyncio.wait_for(proc.communicate(data), timeout=self.timeout)
+            except asyncio.TimeoutError:
+                proc.kill()
+                await proc.wait()
+                raise AudioConversionError("ffmpeg timed out")
+
+        if proc.returncode != 0 or not out:
+            raise AudioConversionError(err.decode("utf-8", errors="replace").strip() or "ffmpeg failed")
+        return self.fix_wav_header(out)
+
+    async def open_stream(self) -> "AudioStream":
+        """Start an incremental conversion; feed chunks while the user is still speaking."""
+        stream = AudioStream(self)
+        await stream.start()
+        return stream
+
+
+class AudioStream:
+    """
+    Incremental conversion of one recording to 16 kHz mono WAV.
+
+    Chunks are piped into ffmpeg as they arrive, so only the tail of the
+    recording is left to decode when it ends. When all ``ffmpeg_stream_workers``
+    processes are busy the chunks are buffered and converted at the end
+    with `AudioConverter.to_wav` instead.
+    """
+    def __init__(self, converter: AudioConverter):
+        self.converter = converter
+        self.proc = None
+        self.buffer = bytearray()
+        self.size = 0
+        self._stdout = None
+        self._stderr = None
+        self._released = False
+
+    async def start(self):
+        if self.converter._streams.locked():
+            return
+        await self.converter._streams.acquire()
+        try:
+            self.proc = await asyncio.create_subprocess_exec(
+                *self.converter.command(),
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+            )
+        except Exception:
+            self.converter._streams.release()
+            raise
+        # 파이프가 가득 차 ffmpeg 가 멈추지 않도록 출력은 계속 읽어 둔다
+        self._stdout = asyncio.create_task(self.proc.stdout.read())
+        self._stderr = asyncio.create_task(self.proc.stderr.read())
+
+    async def feed(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.proc is None:
+            self.buffer += chunk
+            return
+        try:
+            self.proc.stdin.write(chunk)
+            await self.proc.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass    # ffmpeg 가 이미 종료됨 → finish() 에서 오류로 보고
+
+    async def finish(self) -> bytes:
+        if self.proc is None:
+            return await self.converter.to_wav(bytes(self.buffer))
+        try:
+            self.proc.stdin.close()
+            out, err = await asyncio.wait_for(
+                asyncio.gather(self._stdout, self._stderr), timeout=self.converter.timeout
+            )
+            await self.proc.wait()
+        except asyncio.TimeoutError:
+            await self.abort()
+            raise AudioConversionError("ffmpeg timed out")
+        finally:
+            self._release()
+        if self.proc.returncode != 0 or not out:
+            raise AudioConversionError(err.decode("utf-8", errors="replace").strip() or "ffmpeg failed")
+        return self.converter.fix_wav_header(out)
+
+    async def abort(self):
+        """Discard the recording (client disconnected or cancelled)."""
+        if self.proc is None:
+            self.buffer.clear()
+            return
+        if self.proc.returncode is None:
+            self.proc.kill()
+            await self.proc.wait()
+        for task in (self._stdout, self._stderr):
+            task.cancel()
+        self._release()
+
+    def _release(self):
+        if self.proc is not None and not self._released:
+            self._released = True
+            self.converter._streams.release()
@@ -0,0 +1,181 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+import torch
+
+from logger import elapsed_ms
+
+
+class BatchScheduler:
+    """
+    Dynamic cross-session micro-batching for the local transformers backend.
+
+    Concurrent `submit` calls (one per `/chat` turn, each from a threadpool
+    worker) are collected for up to ``max_wait_ms`` or ``max_batch_size``
+    prompts, run as one left-padded batched ``generate`` on a single worker
+    thread, and the decoded completions are scattered back to the callers.
+    Only the newly generated text is returned, like the vLLM completion API.
+
+    With a `SessionKVCache`, each session's prompt KV cache is kept between
+    turns and only the new tokens are prefilled. Sequences with different
+    cached lengths cannot share a padded batch, so collected requests then
+    run one after another on the same worker (KV reuse instead of batching).
+    """
+    def __init__(self, model, tokenizer, max_batch_size=8, max_wait_ms=10,
+                 max_new_tokens=128, temperature=0.3, stop_strings=None, kv_cache=None, logger=None):
+        self.model = model
+        self.tokenizer = tokenizer
+        self.tokenizer.padding_side = "left"     # decoder-only → 왼쪽 패딩
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        # 시퀀스별로 stop string 에 닿으면 그 시퀀스는 더 디코딩하지 않음
+        self.stop_kwargs = {"stop_strings": stop_strings, "tokenizer": tokenizer} if stop_strings else {}
+        self.kv_cache = kv_cache
+        self.logger = logger
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name="batch-scheduler", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, model, tokenizer, config: dict, stop_strings=None, logger=None):
+        # "auto": CPU 에서는 KV 재사용, GPU 에서는 batching 우선
+        reuse = config.get("kv_cache_reuse", "auto")
+        if reuse == "auto":
+            reuse = model.device.type == "cpu"
+        kv_cache = None
+        if reuse:
+            from kv_cache import SessionKVCache
+            kv_cache = SessionKVCache(config.get("kv_cache_max_mb", 512) * 1024 * 1024)
+        return cls(
+            model, tokenizer,
+            max_batch_size=config.get("batch_max_size", 8),
+            max_wait_ms=config.get("batch_max_wait_ms", 10),
+            max_new_tokens=config.get("max_new_tokens", 128),
+            stop_strings=stop_strings,
+            kv_cache=kv_cache,
+            logger=logger,
+        )
+
+    def submit(self, prompt: str, session_id: str = None, timeout: float = None) -> str:
+        """
+        Blocking: enqueue `prompt` and wait for its completion.
+
+        Raises ``TimeoutError`` after `timeout` seconds; a request that has
+        not started by then is dropped from its batch.
+        """
+        future = Future()
+        self._queue.put((prompt, session_id, future))
+        try:
+            return future.result(timeout=timeout)
+        except FutureTimeout:
+            future.cancel()     # 아직 배치에 들어가지 않았다면 생성 생략
+            raise TimeoutError(f"local generation exceeded {timeout:.1f}s")
+
+    def release(self, session_id: str):
+        """Forget a finished session's KV cache."""
+        if self.kv_cache is not None:
+            self.kv_cache.drop(session_id)
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            # 마감이 지나 취소된 요청은 건너뛰고, 나머지는 RUNNING 으로 표시
+            batch = [item for item in self._collect() if item[2].set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            if self.kv_cache is not None:
+                for prompt, session_id, future in batch:
+                    try:
+                        future.set_result(self._generate_cached(prompt, session_id))
+                    except Exception as e:
+                        future.set_exception(e)
+                continue
+
+            prompts = [prompt for prompt, _, _ in batch]
+            try:
+                texts = self._generate(prompts)
+            except Exception as e:
+                for _, _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, _, future), text in zip(batch, texts):
+                future.set_result(text)
+
+    @torch.inference_mode()
+    def _generate(self, prompts):
+        start = time.perf_counter()
+        inputs = self.tokenizer(prompts, return_tensors="pt", padding=True).to(self.model.device)
+        outputs = self.model.generate(
+            **inputs,
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            temperature=self.temperature,
+            pad_token_id=self.tokenizer.pad_token_id,
+            **self.stop_kwargs,
+        )
+        # 왼쪽 패딩이므로 모든 시퀀스의 프롬프트 길이가 같다 → 뒤쪽만 새 토큰
+        new_tokens = outputs[:, inputs["input_ids"].shape[1]:]
+        texts = self.tokenizer.batch_decode(new_tokens, skip_special_tokens=True)
+        if self.logger is not None:
+            self.logger.event(
+                "local batch", size=len(prompts),
+                generate_ms=elapsed_ms(start),
+            )
+        return texts
+
+    @torch.inference_mode()
+    def _generate_cached(self, prompt, session_id):
+        from transformers import DynamicCache
+
+        start = time.perf_counter()
+        input_ids = self.tokenizer(prompt, return_tensors="pt")["input_ids"].to(self.model.device)
+        ids = input_ids[0].tolist()
+
+        cache, reused = (None, 0)
+        if session_id is not None:
+            cache, reused = self.kv_cache.take(session_id, ids)
+        if cache is None:
+            cache = DynamicCache()
+
+        # generate 는 캐시 길이만큼을 건너뛰고 새 토큰만 prefill 한다
+        outputs = self.model.generate(
+            input_ids=input_ids,
+            attention_mask=input_ids.new_ones(input_ids.shape),
+            past_key_values=cache,
+            max_new_tokens=self.max_new_tokens,
+            do_sample=True,
+            temperature=self.temperature,
+            pad_token_id=self.tokenizer.pad_token_id,
+            return_dict_in_generate=True,
+            **self.stop_kwargs,
+        )
+        if session_id is not None:
+            # 다음 턴 프롬프트에는 정제된 발화가 들어가므로 프롬프트 부분만 보관
+            cache = outputs.past_key_values
+            cache.crop(len(ids))
+            self.kv_cache.put(session_id, ids, cache)
+
+        text = self.tokenizer.decode(outputs.sequences[0, len(ids):], skip_special_tokens=True)
+        if self.logger is not None:
+            self.logger.event(
+                "local cached generate", session_id=session_id,
+                prompt_tokens=len(ids), reused_tokens=reused,
+                generate_ms=elapsed_ms(start),
+            )
+        return text
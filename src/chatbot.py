@@ -1,38 +1,37 @@
-from fastapi import FastAPI, Request
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, Request, Depends, WebSocket, WebSocketDisconnect, Query
+from fastapi import UploadFile, File, HTTPException
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from fastapi.concurrency import run_in_threadpool
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, AsyncExitStack
 from pydantic import BaseModel
 import threading
+import re
+import time
 import json
-import subprocess
-import requests
+import asyncio
+import io
 # from simple_history import History
-from logger import Logger
-from checker import Checker
-from collections import defaultdict
+from logger import Logger, elapsed_ms
 import os
 from datetime import datetime
-from uuid import uuid4
 # from simple_panic import Panic
-import pdb
-from model import CounselorAgent
+from model import CounselorAgent, FALLBACK_UTTERANCE
+from tts_cache import TTSCache
+from audio import AudioConverter, AudioConversionError, AudioStream
+from journal import SessionJournal
+from admission import AdmissionController, AdmissionRejected
+from deadline import Deadline
+from http_clients import HttpClients, CircuitOpenError
+import metrics
 import secrets
-from cachetools import TTLCache
+from session_store import create_session_store, TurnInProgress
 from pathlib import Path
-from fastapi import UploadFile, File, HTTPException
-import tempfile, openai, asyncio, aiofiles
-
-from fastapi import FastAPI, Query, HTTPException
-from fastapi.responses import StreamingResponse
-from openai import AsyncOpenAI
-import aiofiles.tempfile, io, asyncio, os
 
 
 
 
-session_histories = TTLCache(maxsize=1000, ttl=1800)
 # config 로딩
 
 # FastAPI 앱 초기화
@@ -47,6 +46,8 @@ STATIC_DIR = BASE_DIR / "static"
 TEMPLATE_DIR = BASE_DIR / "templates"
 LOG_DIR = BASE_DIR / "logs"
 DIAL_DIR = BASE_DIR / "dials"
+SESSION_DB_PATH = BASE_DIR / "sessions.db"
+TTS_CACHE_DIR = BASE_DIR / "tts_cache"
 
 # ensure directories exist
 LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -58,11 +59,80 @@ DIAL_DIR.mkdir(parents=True, exist_ok=True)
 app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 templates = Jinja2Templates(directory=TEMPLATE_DIR)
 
+# ──────────────────────────────────────────────
+# Metrics (/metrics, Prometheus text format)
+# ──────────────────────────────────────────────
+def _state_value(fn):
+    """app.state 가 준비되기 전에는 값을 내보내지 않는다."""
+    def read():
+        try:
+            return fn()
+        except AttributeError:
+            return None
+    return read
+
+metrics.Gauge("chat_active_sessions", "Sessions currently held in the session store.",
+              callback=_state_value(lambda: len(app.state.sessions)))
+metrics.Gauge("chat_turns_in_flight", "Chat turns currently generating.",
+              callback=_state_value(lambda: app.state.admission.inflight))
+metrics.Gauge("chat_turns_queued", "Chat turns waiting for a generation slot.",
+              callback=_state_value(lambda: app.state.admission.waiting))
+metrics.Gauge("model_ready", "1 once the model backend is warmed up.",
+              callback=_state_value(lambda: int(app.state.model_ready)))
+
+
+@app.middleware("http")
+async def record_http_metrics(request: Request, call_next):
+    if request.url.path == "/metrics":
+        return await call_next(request)
+    metrics.HTTP_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_IN_FLIGHT.dec()
+        # 라벨 폭증 방지: 매칭된 라우트 템플릿만 사용
+        route = request.scope.get("route")
+        path = getattr(route, "path", "other")
+        metrics.HTTP_REQUESTS.labels(request.method, path, status).inc()
+        metrics.HTTP_LATENCY.labels(request.method, path).observe(time.perf_counter() - start)
+
+
+@app.get("/metrics")
+async def get_metrics():
+    # gauge 콜백(세션 수 등)이 SQLite 를 읽을 수 있으므로 스레드에서 수집
+    body = await run_in_threadpool(metrics.REGISTRY.exposition)
+    return Response(body, media_type=metrics.CONTENT_TYPE)
+
+
+def require_ready():
+    """모델 준비 전에는 503 + Retry-After 로 응답."""
+    if not app.state.model_ready:
+        raise HTTPException(
+            status_code=503,
+            detail="Model is still loading.",
+            headers={"Retry-After": "2"},
+        )
+
+
 # ✅ 모델 로딩 상태 체크 API
 @app.get("/status")
 async def get_status():
     return {"ready": app.state.model_ready}
 
+# ✅ vLLM prefix cache 적중률 (prefix_stable 프롬프트 효과 확인용)
+@app.get("/prefix-cache", dependencies=[Depends(require_ready)])
+async def get_prefix_cache():
+    try:
+        stats = await run_in_threadpool(app.state.model.prefix_cache_stats)
+    except Exception as e:
+        raise HTTPException(status_code=502, detail=f"vLLM metrics unavailable: {e}")
+    app.state.logger.event("prefix cache", **(stats or {}))
+    return {"prefix_cache": stats}
+
 # ✅ 기본 메시지 API
 @app.get("/default-message")
 async def get_default_message():
@@ -70,20 +140,87 @@ async def get_default_message():
 
 
 # ✅ 백그라운드 CounselingAPI 로딩 함수
-def load_counselor(app: FastAPI):
+def warmup_backends(config: dict, model, logger, phases: dict, loop):
+    """
+    vLLM(또는 로컬 모델)에 실제 요청이 성공할 때까지 재시도.
+    선택적으로 Gemini·TTS 도 확인한 뒤에만 준비 완료로 전환한다.
+    async 백엔드 호출은 공유 클라이언트가 묶인 이벤트 루프(`loop`)에서 실행.
+    """
+    start = time.perf_counter()
+    delay = 1.0
+    while True:
+        try:
+            model.warmup(timeout=config.get("warmup_timeout", 10))
+            break
+        except Exception as e:
+            logger.warning(f"Model warmup failed, retrying in {delay:.0f}s: {e}")
+            time.sleep(delay)
+            delay = min(delay * 2, 10.0)
+    phases["warmup_model_ms"] = elapsed_ms(start)
+
+    if config.get("warmup_gemini", False):
+        start = time.perf_counter()
+        try:
+            asyncio.run_coroutine_threadsafe(
+                model.gem.warmup(timeout=config.get("warmup_timeout", 10)), loop
+            ).result()
+        except Exception as e:
+            logger.warning(f"Gemini warmup failed: {e}")
+        phases["warmup_gemini_ms"] = elapsed_ms(start)
+
+    if config.get("warmup_tts", False):
+        start = time.perf_counter()
+        asyncio.run_coroutine_threadsafe(prewarm_tts_cache(config, logger), loop).result()
+        phases["warmup_tts_ms"] = elapsed_ms(start)
+
+
+def load_counselor(app: FastAPI, loop):
+    phases = {}
+    started = time.perf_counter()
+
+    start = time.perf_counter()
     config_path = os.environ.get("CONFIG_PATH", "./demo_chat_config_kor.json")
     demo_config = json.load(open(config_path, "r", encoding="utf-8"))
     log_path_cfg = demo_config["log_path"]
     log_path = (LOG_DIR / log_path_cfg) if not Path(log_path_cfg).is_absolute() else Path(log_path_cfg)
-    logger = Logger(log_path)
+    logger = Logger.from_config(log_path, demo_config)
     logger.log_and_print("Loading CounselingAPI with configuration...")
     app.state.config = demo_config
     app.state.logger = logger
-    app.state.model_ready = True  
+    phases["config_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
+    app.state.admission = AdmissionController.from_config(demo_config)
+    app.state.audio = AudioConverter.from_config(demo_config)
+    dial_dir = Path(demo_config.get("dial_dir", DIAL_DIR))
+    dial_dir.mkdir(parents=True, exist_ok=True)
+    app.state.journal = SessionJournal.from_config(dial_dir, demo_config, logger=logger)
+    # 비정상 종료로 남은 저널은 세션 TTL 이 지난 뒤 압축
+    app.state.journal.compact_orphans(older_than=demo_config.get("session_ttl", 1800))
+    # 세션 저장소: 만료·퇴출된 세션은 dials/ 로 보관
+    app.state.sessions = create_session_store(
+        demo_config, SESSION_DB_PATH, on_expire=archive_expired_session
+    )
+    app.state.tts_cache = TTSCache.from_config(TTS_CACHE_DIR, demo_config)
+    # Gemini·ASR·TTS 공유 연결 풀 (백엔드별 timeout·연결 수·circuit breaker)
+    app.state.http = HttpClients.from_config(demo_config)
+    phases["services_ms"] = elapsed_ms(start)
+
+    start = time.perf_counter()
     app.state.model = CounselorAgent(
-        demo_config, logger=logger,
+        demo_config, logger=logger, gemini_client=app.state.http.gemini,
     )
+    phases["model_init_ms"] = elapsed_ms(start)
+
+    # 준비 완료는 백엔드 warmup 이 성공한 뒤에만
+    warmup_backends(demo_config, app.state.model, logger, phases, loop)
+    app.state.model_ready = True
+    loop.call_soon_threadsafe(app.state.ready_event.set)     # /ws 대기 중인 클라이언트에 push
+    logger.event("startup", ready_ms=elapsed_ms(started), **phases)
     logger.log_and_print("CounselingAPI loaded successfully.")
+
+    if not demo_config.get("warmup_tts", False):
+        asyncio.run_coroutine_threadsafe(prewarm_tts_cache(demo_config, logger), loop)
     return True
 
 
@@ -91,8 +228,18 @@ def load_counselor(app: FastAPI):
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     app.state.model_ready = False
-    threading.Thread(target=load_counselor, args=(app,)).start()
+    app.state.ready_event = asyncio.Event()
+    threading.Thread(target=load_counselor, args=(app, asyncio.get_running_loop())).start()
+    sweeper = asyncio.create_task(sweep_sessions_periodically(app))
     yield
+    sweeper.cancel()
+    # 남은 저널 기록을 모두 디스크에 내린 뒤 종료
+    if hasattr(app.state, "journal"):
+        app.state.journal.stop()
+    if hasattr(app.state, "http"):
+        await app.state.http.aclose()
+    if getattr(getattr(app.state, "model", None), "router", None) is not None:
+        app.state.model.router.stop()
 
 app.router.lifespan_context = lifespan
 
@@ -107,29 +254,41 @@ async def get_main(request: Request):
 def save_and_clear_session(session_id: str, history: list[dict]):
     logger = app.state.logger
 
-    log_path = DIAL_DIR / f"{session_id}.json"        # ✅ 절대경로
-
-    with open(log_path, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
-
-    logger.log_and_print(f"Session {session_id} saved to {log_path}")
+    # 턴 저널을 한 번에 압축해 dials/{session_id}.json 으로 저장 (백그라운드)
+    app.state.journal.close(session_id, history)
 
     # 세션 히스토리 삭제
-    del session_histories[session_id]
+    app.state.sessions.delete(session_id)
+    app.state.model.end_session(session_id)
     logger.log_and_print(f"Session {session_id} cleared from memory.")
     
     
+def archive_expired_session(session_id: str, state: dict):
+    """TTL 만료·용량 초과로 퇴출된 세션도 버리지 않고 dials/ 에 보관."""
+    app.state.journal.close(session_id, state["history"])
+    if hasattr(app.state, "model"):
+        app.state.model.end_session(session_id)
+    app.state.logger.log_and_print(f"Session {session_id} expired and archived.")
+
+
+async def sweep_sessions_periodically(app: FastAPI, interval: float = 60.0):
+    """접근이 없어도 만료 세션이 보관되도록 주기적으로 정리."""
+    while True:
+        await asyncio.sleep(interval)
+        if hasattr(app.state, "sessions"):
+            try:
+                await run_in_threadpool(app.state.sessions.sweep)
+            except Exception as e:
+                app.state.logger.error(f"Session sweep failed: {e}")
     
     
-    
-def save_turn_log(session_id: str, history: list[dict]):
-    logger = app.state.logger
-    log_path = DIAL_DIR / f"{session_id}.json"        # ✅ 절대경로
-
-    with open(log_path, "w", encoding="utf-8") as f:
-        json.dump(history, f, indent=2, ensure_ascii=False)
-
-    logger.log_and_print(f"Turn log for session {session_id} saved to {log_path}")
+def save_turn_log(session_id: str, state: dict):
+    """이번 턴에 새로 추가된 메시지만 세션 저널(JSONL)에 append 하고 상태를 저장."""
+    history = state["history"]
+    start = state.get("journaled", 0)
+    app.state.journal.append(session_id, state["cnt"], history[start:])
+    state["journaled"] = len(history)
+    app.state.sessions.put(session_id, state)
     
 # ✅ 채팅 처리
 class ChatRequest(BaseModel):
@@ -139,39 +298,82 @@ class ChatRequest(BaseModel):
 class ChatResponse(BaseModel):
     system_utterance: str
     end_signal: bool = False
-@app.post("/chat", response_model=ChatResponse)
 
-async def chat(request: Request, req: ChatRequest):
-    config      = request.app.state.config
-    session_id  = req.session_id
-    model       = request.app.state.model
-    logger      = request.app.state.logger
+
+def begin_turn(session_id: str, user_utterance: str) -> dict:
+    """
+    세션의 턴을 점유하고, 상태를 준비해 client 발화를 추가한 뒤 상태를 반환.
+    같은 세션의 턴이 이미 진행 중이면 TurnInProgress (상태를 덮어써 발화가 사라지지 않도록).
+    """
+    config = app.state.config
+    logger = app.state.logger
+    sessions = app.state.sessions
+
+    if not sessions.claim_turn(session_id):
+        raise TurnInProgress(session_id)
 
     # ── 1. initialize state if needed ───────────────────────────────
-    if (
-        session_id not in session_histories
-        or session_histories[session_id] is None
-    ):
-        session_histories[session_id] = {
+    state = sessions.get(session_id)
+    if state is None:
+        state = {
             "cnt": 0,                      # will bump right away
+            "journaled": 0,                # messages already in the journal
             "history": [
                 {"role": "Counselor", "message": config["first_words"]}
             ],
         }
 
     # ── 2. append client utterance ─────────────────────────────────
-    session_histories[session_id]["history"].append(
-        {"role": "Client", "message": req.user_utterance}
+    state["history"].append(
+        {"role": "Client", "message": user_utterance}
     )
+    sessions.put(session_id, state)
     logger.log_and_print(
-        f"Session {session_id}: {req.user_utterance}"
+        f"Session {session_id}: {user_utterance}"
     )
-    
-    # ── 3. generate counselor reply ────────────────────────────────
-    cnt   = session_histories[session_id]["cnt"] + 1  # next turn index
-    hist  = session_histories[session_id]["history"]
+    return state
+
+
+async def start_turn(session_id: str, user_utterance: str) -> dict:
+    """begin_turn 을 스레드에서 실행; 진행 중인 턴이 있으면 409."""
+    try:
+        return await run_in_threadpool(begin_turn, session_id, user_utterance)
+    except TurnInProgress:
+        raise HTTPException(status_code=409, detail="A turn is already in progress for this session.")
+
+
+async def end_turn(session_id: str):
+    """턴 점유 해제 (상태 저장 뒤, 실패·거절 경로 포함 항상)."""
+    await run_in_threadpool(app.state.sessions.release_turn, session_id)
+
+
+def undo_turn(session_id: str, state: dict, e: AdmissionRejected):
+    """대기열 초과 시 처리되지 않은 client 발화를 되돌린다."""
+    state["history"].pop()
+    app.state.sessions.put(session_id, state)
+    app.state.logger.log_and_print(f"Session {session_id}: rejected ({e.reason})")
+    metrics.CHAT_REJECTED.labels(e.reason).inc()
+
+
+async def reject_turn(session_id: str, state: dict, e: AdmissionRejected):
+    """대기열 초과 시 client 발화를 되돌리고 503을 발생시킨다."""
+    await run_in_threadpool(undo_turn, session_id, state, e)
+    raise HTTPException(
+        status_code=503,
+        detail="Server is busy, please retry shortly.",
+        headers={"Retry-After": str(e.retry_after)},
+    )
+
+
+async def finish_turn(
+    session_id: str, state: dict, system_utt: str, timings: dict, started: float
+) -> ChatResponse:
+    """생성된 상담사 발화를 기록하고 종료 여부를 판단해 응답을 만든다."""
+    config = app.state.config
+    logger = app.state.logger
+    hist   = state["history"]
+    cnt    = state["cnt"] + 1  # next turn index
 
-    system_utt = model.generate( hist)
     logger.log_and_print(
         f"Session {session_id}: {system_utt}"
     )
@@ -181,13 +383,11 @@ async def chat(request: Request, req: ChatRequest):
         farewell = config["last_words"]     # ← 고정 멘트
         hist.append({"role": "Counselor", "message": farewell})
 
-        # ① 마지막 턴 로그 저장
-        save_turn_log(session_id, hist)
-
-        # ② 전체 세션 저장 & 메모리 정리
-        save_and_clear_session(session_id, hist)
+        # ① 전체 세션 저장 & 메모리 정리 (저널 압축은 종료 시 1회)
+        await run_in_threadpool(save_and_clear_session, session_id, hist)
+        log_turn(session_id, cnt, timings, started, end_signal=True)
 
-        # ③ 프런트엔드에 종료 알림
+        # ② 프런트엔드에 종료 알림
         return ChatResponse(
             system_utterance=farewell,
             end_signal=True
@@ -197,17 +397,140 @@ async def chat(request: Request, req: ChatRequest):
         hist.append({"role": "Counselor", "message": system_utt})
 
     # update counters
-    session_histories[session_id]["cnt"] = cnt
+    state["cnt"] = cnt
 
     # ── 4. SAVE LOG FOR THIS TURN  ---------------------------------
-    save_turn_log(session_id, hist)
+    start = time.perf_counter()
+    await run_in_threadpool(save_turn_log, session_id, state)
+    timings["journal_ms"] = elapsed_ms(start)
+    log_turn(session_id, cnt, timings, started, end_signal=False)
 
     # ── 5. reply to frontend ───────────────────────────────────────
     return ChatResponse(system_utterance=system_utt, end_signal=False)
 
 
+def start_deadline(timings: dict, started: float):
+    """턴 예산(turn_deadline)을 시작하고 timings 에 기록. 0/null 이면 None."""
+    deadline = Deadline.from_config(app.state.config, started)
+    if deadline is not None:
+        timings["deadline_ms"] = deadline.budget_ms
+    return deadline
 
-@app.post("/speech-to-text")
+
+def log_turn(session_id: str, turn: int, timings: dict, started: float, end_signal: bool):
+    """턴 단위 구조화 로그 (세션·턴 번호·단계별 소요 시간·예산 사용률) + 메트릭 기록."""
+    total_ms = elapsed_ms(started)
+    budget_used = Deadline.budget_used(timings)
+    app.state.logger.event(
+        "turn", session_id=session_id, turn=turn, end_signal=end_signal,
+        total_ms=total_ms, budget_used=budget_used, **timings,
+    )
+
+    endpoint = timings.get("endpoint", "chat")
+    metrics.CHAT_TURNS.labels(endpoint, end_signal).inc()
+    metrics.CHAT_TURN_LATENCY.labels(endpoint).observe(total_ms / 1000)
+    # 순차 단계만 기록 (deadline_ms 는 예산, first_*_ms 는 시작 기준 시점이라 단계가 아님)
+    for stage in Deadline.STAGES:
+        if f"{stage}_ms" in timings:
+            metrics.CHAT_STAGE_LATENCY.labels(stage).observe(timings[f"{stage}_ms"] / 1000)
+    if timings.get("fallback"):
+        metrics.CHAT_FALLBACKS.inc()
+    if "degraded" in timings:
+        metrics.CHAT_DEGRADED.labels(timings["degraded"]).inc()
+    for stage, fraction in budget_used.items():
+        metrics.CHAT_BUDGET_USED.labels(stage).observe(fraction)
+    if "review_tier" in timings:
+        metrics.SAFETY_REVIEWS.labels(timings["review_tier"]).inc()
+
+
+@app.post("/chat", response_model=ChatResponse, dependencies=[Depends(require_ready)])
+async def chat(request: Request, req: ChatRequest):
+    session_id  = req.session_id
+    model       = request.app.state.model
+    started     = time.perf_counter()
+    timings     = {"endpoint": "chat"}
+    deadline    = start_deadline(timings, started)
+
+    state = await start_turn(session_id, req.user_utterance)
+    try:
+        # ── 3. generate counselor reply ────────────────────────────────
+        # vLLM 호출은 스레드에서, Gemini 검토는 공유 async 클라이언트로 (이벤트 루프 보호)
+        # 턴 마감(deadline)은 대기열·LLM·검토 단계가 남은 예산으로 나눠 쓴다
+        try:
+            async with request.app.state.admission.slot(max_wait=deadline and deadline.remaining()):
+                timings["queue_ms"] = elapsed_ms(started)
+                system_utt = await model.generate(list(state["history"]), timings, session_id, deadline)
+        except AdmissionRejected as e:
+            await reject_turn(session_id, state, e)
+
+        return await finish_turn(session_id, state, system_utt, timings, started)
+    finally:
+        await end_turn(session_id)
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.post("/chat-stream", dependencies=[Depends(require_ready)])
+async def chat_stream(request: Request, req: ChatRequest):
+    """
+    `/chat`의 SSE 버전.
+    `delta` 이벤트로 검토된 상담사 발화를 조각 단위로 보내고,
+    마지막 `done` 이벤트로 ChatResponse(system_utterance, end_signal)를 보낸다.
+    """
+    session_id  = req.session_id
+    model       = request.app.state.model
+    logger      = request.app.state.logger
+    started     = time.perf_counter()
+    timings     = {"endpoint": "chat-stream"}
+    deadline    = start_deadline(timings, started)
+
+    state = await start_turn(session_id, req.user_utterance)
+
+    # 스트림 시작 전에 슬롯을 확보해야 503을 정상 응답으로 돌려줄 수 있음
+    # 턴 점유는 슬롯과 함께 스트림이 끝날 때 해제
+    slot = AsyncExitStack()
+    slot.push_async_callback(end_turn, session_id)
+    try:
+        await slot.enter_async_context(
+            request.app.state.admission.slot(max_wait=deadline and deadline.remaining())
+        )
+    except AdmissionRejected as e:
+        async with slot:
+            await reject_turn(session_id, state, e)
+    timings["queue_ms"] = elapsed_ms(started)
+
+    async def event_stream():
+        try:
+            system_utt = None
+            async for kind, text in model.generate_stream(list(state["history"]), timings, session_id, deadline):
+                if kind == "delta":
+                    if "first_delta_ms" not in timings:
+                        timings["first_delta_ms"] = elapsed_ms(started)
+                    yield sse_event("delta", {"text": text})
+                else:
+                    system_utt = text
+            resp = await finish_turn(session_id, state, system_utt, timings, started)
+            yield sse_event("done", resp.model_dump())
+        except Exception as e:
+            logger.error(f"Session {session_id}: stream error {e}")
+            yield sse_event("error", {"detail": str(e)})
+        finally:
+            await slot.aclose()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+ASR_URL = "http://platon.postech.ac.kr:14000/asr/asr"
+
+
+@app.post("/speech-to-text", dependencies=[Depends(require_ready)])
 async def speech_to_text(file: UploadFile = File(...)):
     """
     MediaRecorder(webm)·mp3·wav 등을 받아 Whisper-1로 전사.
@@ -220,68 +543,156 @@ async def speech_to_text(file: UploadFile = File(...)):
     }:
         raise HTTPException(status_code=415, detail="Unsupported audio format")
 
-    # 1) 원본 임시 파일 저장
-    input_suffix = Path(file.filename).suffix or ".webm"
-    async with aiofiles.tempfile.NamedTemporaryFile(delete=False, suffix=input_suffix) as tmp_in:
-        await tmp_in.write(await file.read())
-        input_path = tmp_in.name
-
-    # 2) 변환된 WAV 파일 경로 지정
-    output_path = input_path.replace(input_suffix, ".wav")
-
-    # 3) ffmpeg로 WAV로 변환
+    # 1) 업로드를 메모리로 읽어 ffmpeg stdin/stdout 파이프로 변환 (임시 파일 없음)
+    #    이미 16 kHz mono WAV 면 변환 생략
+    raw = await file.read()
     try:
-        subprocess.run(
-            ["ffmpeg", "-y", "-i", input_path, "-ar", "16000", "-ac", "1", output_path],
-            check=True,
-            stdout=subprocess.DEVNULL,
-            stderr=subprocess.DEVNULL,
-        )
-    except subprocess.CalledProcessError:
+        with metrics.BACKEND_LATENCY.labels("ffmpeg").time():
+            wav_bytes = await app.state.audio.to_wav(raw)
+    except AudioConversionError as e:
+        metrics.BACKEND_ERRORS.labels("ffmpeg").inc()
+        app.state.logger.log_and_print(f"ffmpeg conversion failed: {e}")
         raise HTTPException(status_code=500, detail="Failed to convert audio to WAV format")
 
-
-
-    # Whisper 호출 (비동기 클라이언트 아님, HTTP proxy 방식) ------------------------
-    url = "http://platon.postech.ac.kr:14000/asr/asr"
-    headers = {}
-    data = {'language': 'Korean'}
-
+    # 2) ASR 호출 (공유 keep-alive 클라이언트) ---------------------
     try:
-        with open(output_path, "rb") as f:
-            files = {
-                'file': ('[PROXY]', f, 'audio/wav'),  # webm → wav 로 변경
-            }
-            response = json.loads(requests.post(url, data=data, files=files).text)
-            transcription = response[0]['transcription'].strip() if response else ""
-            
-
+        transcription = await transcribe(wav_bytes)
+    except CircuitOpenError as e:
+        raise HTTPException(
+            status_code=503, detail=f"Whisper 일시 중단: {e}",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Whisper 요청 실패: {e}")
-    finally:
-        Path(output_path).unlink(missing_ok=True)  # 임시 파일 삭제
-        Path(input_path).unlink(missing_ok=True)  # 임시 파일 삭제
 
     return {"transcript": transcription.strip()}
 
 
+async def transcribe(wav_bytes: bytes) -> str:
+    """WAV(16 kHz mono) 바이트를 ASR 서버(HTTP proxy)로 보내 전사 결과를 반환."""
+    url = app.state.config.get("asr_url", ASR_URL)
+    data = {'language': 'Korean'}
+    files = {
+        'file': ('[PROXY]', wav_bytes, 'audio/wav'),
+    }
+    response = (await app.state.http.asr.request("POST", url, data=data, files=files)).json()
+    return response[0]['transcription'].strip() if response else ""
 
-@app.get("/tts")
-async def tts(text: str = Query(..., max_length=500)):
 
+
+TTS_URL = "http://platon.postech.ac.kr:14000/tts/tts"
+
+
+async def synthesize(text: str, speaker: str) -> bytes:
+    """TTS 백엔드 호출. 캐시 miss 일 때만 사용."""
     headers = {
     "Content-Type": "application/json"
     }
 
     payload = {
         "text": text,
-        "speaker": "0"
+        "speaker": speaker
     }
-    url = "http://platon.postech.ac.kr:14000/tts/tts"
+    url = app.state.config.get("tts_url", TTS_URL)
+
+    response = await app.state.http.tts.request("POST", url, headers=headers, content=json.dumps(payload))
+    return response.content
 
 
-    response = requests.post(url, headers=headers, data=json.dumps(payload))
-    print(response)
+async def prewarm_tts_cache(config: dict, logger):
+    """자주 합성되는 고정 멘트를 미리 캐시에 올려 둔다."""
+    speaker = config.get("tts_speaker", "0")
+    for text in (config["first_words"], config["last_words"], FALLBACK_UTTERANCE):
+        # 전체 문장과 `/tts?stream=true` 가 쓰는 문장 조각을 모두 데운다
+        for chunk in dict.fromkeys([text, *split_sentences(text)]):
+            try:
+                await app.state.tts_cache.get_or_create(chunk, speaker, synthesize)
+            except Exception as e:
+                logger.log_and_print(f"TTS prewarm failed for {chunk[:20]}...: {e}")
+    logger.log_and_print("TTS cache prewarmed.")
+
+
+SENTENCE_END = re.compile(r"(?<=[.!?。…~])\s+")
+
+
+def split_sentences(text: str, min_chars: int = 8) -> list[str]:
+    """문장 단위로 분할. 너무 짧은 조각은 다음 문장과 합쳐 끊김을 줄인다."""
+    sentences, buf = [], ""
+    for part in SENTENCE_END.split(text.strip()):
+        buf = f"{buf} {part}".strip() if buf else part.strip()
+        if len(buf) >= min_chars:
+            sentences.append(buf)
+            buf = ""
+    if buf:
+        if sentences:
+            sentences[-1] = f"{sentences[-1]} {buf}"
+        else:
+            sentences.append(buf)
+    return sentences
+
+
+async def stream_tts_chunks(sentences: list[str], speaker: str):
+    """
+    문장별로 동시에 합성하고, 준비되는 대로 순서대로 내보낸다.
+    MP3 프레임은 이어 붙여도 재생 가능하므로 클라이언트는 첫 문장부터 바로 재생한다.
+    합성 실패는 그대로 올려 호출 측이 처리한다 (잘린 오디오를 정상 응답처럼 보내지 않도록).
+    """
+    sem = asyncio.Semaphore(app.state.config.get("tts_stream_concurrency", 4))
+
+    async def synth(sentence):
+        async with sem:
+            return await app.state.tts_cache.get_or_create(sentence, speaker, synthesize)
+
+    tasks = [asyncio.create_task(synth(sentence)) for sentence in sentences]
+    try:
+        for task in tasks:
+            yield await task
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def tts_error(e: Exception) -> HTTPException:
+    if isinstance(e, CircuitOpenError):
+        return HTTPException(
+            status_code=503, detail=f"TTS temporarily unavailable: {e}",
+            headers={"Retry-After": str(int(e.retry_after) + 1)},
+        )
+    return HTTPException(status_code=502, detail=f"TTS error: {e}")
+
+
+@app.get("/tts", dependencies=[Depends(require_ready)])
+async def tts(
+    text: str = Query(..., max_length=500),
+    stream: bool = Query(False, description="문장 단위로 나눠 합성하며 순차 스트리밍"),
+):
+    speaker = app.state.config.get("tts_speaker", "0")
+
+    sentences = split_sentences(text) if stream else [text]
+    if len(sentences) > 1:
+        # 첫 문장이 실패하면 200 대신 오류 상태로 응답
+        chunks = stream_tts_chunks(sentences, speaker)
+        try:
+            first = await chunks.__anext__()
+        except Exception as e:
+            await chunks.aclose()
+            raise tts_error(e)
+
+        async def body():
+            yield first
+            try:
+                async for chunk in chunks:
+                    yield chunk
+            except Exception as e:
+                # 이미 200 을 보낸 뒤라 상태를 바꿀 수 없음 → 짧아진 응답이 캐시되지 않게 no-store
+                app.state.logger.log_and_print(f"Chunked TTS error: {e}")
+
+        return StreamingResponse(
+            body(),
+            media_type="audio/mpeg",
+            headers={"Cache-Control": "no-store"},
+        )
+
     # VOICE = "alloy"   
     # """
     # ?text= 인코딩된 문장을 받아 OpenAI TTS mp3 스트림 반환
@@ -301,8 +712,11 @@ async def tts(text: str = Query(..., max_length=500)):
     # except Exception as e:
     #     raise HTTPException(status_code=500, detail=f"TTS error: {e}")
 
-    # 응답은 bytes
-    audio_bytes = response.content  
+    # 서버 측 캐시 (메모리 LRU + 디스크), miss 일 때만 백엔드 호출
+    try:
+        audio_bytes = await app.state.tts_cache.get_or_create(text, speaker, synthesize)
+    except Exception as e:
+        raise tts_error(e)
     audio_io = io.BytesIO(audio_bytes)
     audio_io.seek(0)
 
@@ -312,9 +726,7 @@ async def tts(text: str = Query(..., max_length=500)):
         headers={"Cache-Control": "public, max-age=86400"}   # 간단 캐싱
     )
 
-@app.post("/init-session")
-async def init_session():
-    
+async def create_session() -> str:
     config = app.state.config
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     rand      = secrets.token_hex(4)   
@@ -323,7 +735,227 @@ async def init_session():
     
     history = []
     history.append({"role": "Counselor", "message": config["first_words"]})
-    session_histories[session_id] = {'cnt' : 1, 'history' : history}
+    state = {'cnt' : 1, 'history' : history, 'journaled' : 0}
+    await run_in_threadpool(save_turn_log, session_id, state)
     logger.log_and_print(f"Session initialized: {session_id}")
     logger.log_and_print(f"Session {session_id} initialized with first words: {config['first_words']}")
-    return {"session_id": session_id, "system_utterance":  config["first_words"], 'end_signal': False}
\ No newline at end of file
+    return session_id
+
+
+@app.post("/init-session", dependencies=[Depends(require_ready)])
+async def init_session():
+    session_id = await create_session()
+    return {"session_id": session_id, "system_utterance":  app.state.config["first_words"], 'end_signal': False}
+
+# ──────────────────────────────────────────────
+# WebSocket 세션 채널 (/ws)
+# ──────────────────────────────────────────────
+class VoiceChannel:
+    """
+    한 WebSocket 연결의 상태: 세션 id, 녹음 중인 음성, 진행 중인 턴.
+    턴 처리는 별도 task 로 돌려 다음 녹음 조각을 계속 받을 수 있게 한다.
+    연결이 끊겨도 진행 중인 턴은 끝까지 처리해 세션 기록을 일관되게 유지한다:
+    전송이 한 번 실패하면 이후 전송은 모두 생략된다.
+    """
+    def __init__(self, ws: WebSocket):
+        self.ws = ws
+        self.session_id = None
+        self.recording: AudioStream | None = None
+        self.turn: asyncio.Task | None = None
+        self.closed = False
+        self._send_lock = asyncio.Lock()
+
+    async def _send(self, send, payload):
+        async with self._send_lock:
+            if self.closed:
+                return
+            try:
+                await send(payload)
+            except Exception:
+                self.closed = True     # 연결 끊김 → 턴 처리는 계속, 전송만 중단
+
+    async def send(self, kind: str, **data):
+        await self._send(self.ws.send_json, {"type": kind, **data})
+
+    async def send_audio(self, chunk: bytes):
+        await self._send(self.ws.send_bytes, chunk)
+
+    async def drop_recording(self, detail: str):
+        if self.recording is not None:
+            await self.recording.abort()
+            self.recording = None
+        await self.send("error", detail=detail)
+
+    def busy(self) -> bool:
+        return self.turn is not None and not self.turn.done()
+
+    async def close(self):
+        self.closed = True
+        if self.recording is not None:
+            await self.recording.abort()
+
+
+async def ws_turn(channel: VoiceChannel, user_utterance: str, with_tts: bool):
+    """`/chat-stream` 과 같은 턴 처리; 발화 조각·최종 응답·TTS 오디오를 같은 소켓으로 보낸다."""
+    session_id  = channel.session_id
+    model       = app.state.model
+    started     = time.perf_counter()
+    timings     = {"endpoint": "ws"}
+    deadline    = start_deadline(timings, started)
+
+    try:
+        state = await run_in_threadpool(begin_turn, session_id, user_utterance)
+    except TurnInProgress:
+        await channel.send("error", detail="A turn is already in progress")
+        return
+    system_utt = None
+    try:
+        try:
+            async with app.state.admission.slot(max_wait=deadline and deadline.remaining()):
+                timings["queue_ms"] = elapsed_ms(started)
+                async for kind, text in model.generate_stream(list(state["history"]), timings, session_id, deadline):
+                    if kind == "delta":
+                        if "first_delta_ms" not in timings:
+                            timings["first_delta_ms"] = elapsed_ms(started)
+                        await channel.send("delta", text=text)
+                    else:
+                        system_utt = text
+        except AdmissionRejected as e:
+            await run_in_threadpool(undo_turn, session_id, state, e)
+            await channel.send("busy", retry_after=e.retry_after)
+            return
+
+        resp = await finish_turn(session_id, state, system_utt, timings, started)
+    finally:
+        await end_turn(session_id)
+    await channel.send("reply", **resp.model_dump())
+
+    # 문장 단위로 합성되는 대로 바이너리 프레임으로 전송 (클라이언트는 순서대로 재생)
+    if with_tts and not channel.closed:
+        speaker = app.state.config.get("tts_speaker", "0")
+        try:
+            async for chunk in stream_tts_chunks(split_sentences(resp.system_utterance), speaker):
+                await channel.send_audio(chunk)
+        except Exception as e:
+            app.state.logger.log_and_print(f"Chunked TTS error: {e}")
+        await channel.send("audio_end")
+
+
+async def ws_voice_turn(channel: VoiceChannel, recording: AudioStream, reply: bool, with_tts: bool):
+    """녹음 종료 후 남은 변환·ASR 만 수행하고, `reply` 면 바로 상담 턴으로 이어간다."""
+    start = time.perf_counter()
+    try:
+        wav_bytes = await recording.finish()
+        metrics.BACKEND_LATENCY.labels("ffmpeg").observe(time.perf_counter() - start)
+    except AudioConversionError as e:
+        metrics.BACKEND_ERRORS.labels("ffmpeg").inc()
+        app.state.logger.log_and_print(f"ffmpeg conversion failed: {e}")
+        await channel.send("error", detail="Failed to convert audio to WAV format")
+        return
+    try:
+        transcript = await transcribe(wav_bytes)
+    except CircuitOpenError as e:
+        await channel.send("busy", retry_after=int(e.retry_after) + 1)
+        return
+    await channel.send("transcript", text=transcript)
+    if reply and transcript:
+        await ws_turn(channel, transcript, with_tts)
+
+
+async def run_ws_task(channel: VoiceChannel, coro):
+    try:
+        await coro
+    except WebSocketDisconnect:
+        pass
+    except Exception as e:
+        app.state.logger.error(f"Session {channel.session_id}: ws error {e}")
+        try:
+            await channel.send("error", detail=str(e))
+        except Exception:
+            pass
+
+
+@app.websocket("/ws")
+async def session_channel(ws: WebSocket):
+    """
+    전이중(full-duplex) 세션 채널.
+
+    client → server
+      {"type": "hello", "session_id": 있으면 이어서, 없으면 새 세션}
+      {"type": "chat", "text": ..., "tts": bool}
+      {"type": "audio_start"}, 바이너리 음성 조각들, {"type": "audio_end", "reply": bool, "tts": bool}
+    server → client
+      status(ready) · session · transcript · delta · reply · 바이너리 TTS 오디오 · audio_end · busy · error
+    """
+    await ws.accept()
+    channel = VoiceChannel(ws)
+    metrics.WS_CONNECTIONS.inc()
+    try:
+        # 준비 상태는 polling 대신 push
+        await channel.send("status", ready=app.state.model_ready)
+        if not app.state.model_ready:
+            await app.state.ready_event.wait()
+            await channel.send("status", ready=True)
+
+        max_bytes = app.state.config.get("ws_max_audio_mb", 10) * 1024 * 1024
+        while True:
+            message = await ws.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            if message.get("bytes") is not None:
+                if channel.recording is None:
+                    continue
+                try:
+                    await channel.recording.feed(message["bytes"])
+                except Exception as e:
+                    app.state.logger.error(f"Session {channel.session_id}: audio feed failed {e}")
+                    await channel.drop_recording("Failed to process audio")
+                    continue
+                if channel.recording.size > max_bytes:
+                    await channel.drop_recording("Recording too long")
+                continue
+
+            try:
+                msg = json.loads(message.get("text") or "{}")
+            except json.JSONDecodeError:
+                await channel.send("error", detail="Invalid message")
+                continue
+            kind = msg.get("type")
+            if kind == "hello":
+                channel.session_id = msg.get("session_id") or await create_session()
+                await channel.send("session", session_id=channel.session_id)
+            elif channel.session_id is None:
+                await channel.send("error", detail="Send hello first")
+            elif kind == "audio_start":
+                if channel.recording is not None:
+                    await channel.recording.abort()
+                    channel.recording = None
+                try:
+                    channel.recording = await app.state.audio.open_stream()
+                except Exception as e:
+                    # ffmpeg 실행 실패 등: 조각을 모아 두었다가 audio_end 에서 한 번에 변환
+                    app.state.logger.error(f"Session {channel.session_id}: audio stream failed {e}")
+                    channel.recording = AudioStream(app.state.audio)
+            elif kind in ("chat", "audio_end"):
+                if channel.busy():
+                    await channel.send("error", detail="A turn is already in progress")
+                    continue
+                with_tts = msg.get("tts", False)
+                if kind == "chat":
+                    text = (msg.get("text") or "").strip()
+                    if not text:
+                        continue
+                    coro = ws_turn(channel, text, with_tts)
+                else:
+                    if channel.recording is None:
+                        # 녹음이 없거나 이미 버려짐: 클라이언트가 기다리지 않도록 턴을 끝낸다
+                        await channel.send("error", detail="No recording in progress")
+                        continue
+                    recording, channel.recording = channel.recording, None
+                    coro = ws_voice_turn(channel, recording, msg.get("reply", False), with_tts)
+                channel.turn = asyncio.create_task(run_ws_task(channel, coro))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await channel.close()
+        metrics.WS_CONNECTIONS.dec()
@@ -1,20 +1,78 @@
-from transformers import AutoTokenizer
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+
+class _FastTokenizer:
+    """Thin adapter giving a `tokenizers.Tokenizer` the calls Checker needs."""
+    def __init__(self, tokenizer):
+        self._tok = tokenizer
+
+    def __call__(self, text, add_special_tokens=True, **kwargs):
+        return {"input_ids": self._tok.encode(text, add_special_tokens=add_special_tokens).ids}
+
+    def decode(self, ids):
+        return self._tok.decode(ids)
+
 
 class Checker:
-    def __init__(self, model_name, max_length):
-        self.tokenizer = AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+    """
+    Token counter for prompt budgeting.
+
+    Counts are cached per text (LRU), so a dialog message is tokenized once
+    and reused on every later turn. The tokenizer is loaded from
+    ``tokenizer.json`` with the lightweight `tokenizers` package when
+    possible, so the vLLM deployment never imports `transformers`. If no
+    tokenizer can be loaded, a conservative UTF-8 based estimate is used.
+    """
+    def __init__(self, model_name, max_length, cache_size=50000):
+        self.model_name = model_name
+        self.tokenizer = self._load_tokenizer(model_name)
         self.max_length = max_length
-    
-    def run(self, prompt):
-        """Checks if the formatted conversation exceeds max_length."""
-        
-        messages = [
-            {"role": "user", "content": prompt},
-        ]
-        formatted_text = self.tokenizer.apply_chat_template(messages, tokenize=False)
-        tokenized = self.tokenizer(formatted_text, padding=False, truncation=False)
-        
-        # Check if token count exceeds max_length
-        overflow = len(tokenized["input_ids"]) > self.max_length
-        
-        return overflow
\ No newline at end of file
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _load_tokenizer(model_name):
+        tokenizer_file = Path(model_name) / "tokenizer.json"
+        if tokenizer_file.is_file():
+            try:
+                from tokenizers import Tokenizer
+                return _FastTokenizer(Tokenizer.from_file(str(tokenizer_file)))
+            except Exception:
+                pass
+        try:
+            from transformers import AutoTokenizer
+            return AutoTokenizer.from_pretrained(model_name, trust_remote_code=True)
+        except Exception:
+            return None
+
+    def _tokenize(self, text):
+        if self.tokenizer is None:
+            # 토크나이저가 없으면 보수적 추정 (한국어 BPE 기준 토큰 수보다 크게 잡힘)
+            return len(text.encode("utf-8")) // 2 + 1
+        return len(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def count(self, text):
+        """Number of tokens in `text` (without special tokens), cached."""
+        with self._lock:
+            n = self._cache.get(text)
+            if n is not None:
+                self._cache.move_to_end(text)
+                return n
+        n = self._tokenize(text)
+        with self._lock:
+            self._cache[text] = n
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return n
+
+    def truncate_left(self, text, max_tokens):
+        """Keep only the last `max_tokens` tokens of `text`."""
+        if self.count(text) <= max_tokens:
+            return text
+        if self.tokenizer is None:
+            return text[-max(1, max_tokens):]
+        ids = self.tokenizer(text, add_special_tokens=False)["input_ids"]
+        return self.tokenizer.decode(ids[-max_tokens:]) if max_tokens > 0 else ""
@@ -0,0 +1,46 @@
+import time
+
+
+class Deadline:
+    """
+    Latency budget of one chat turn, passed through every stage.
+
+    Each stage asks for `remaining()` and bounds its own wait by it (queue
+    slot, LLM call, Gemini review), so a slow dependency degrades the turn
+    instead of hanging it. `budget_used` turns the per-stage ``*_ms``
+    timings into fractions of the budget for logging.
+    """
+    # 순차적으로 예산을 소비하는 단계 (first_* 같은 누적 시점은 제외)
+    STAGES = ("queue", "llm", "cleanup", "safety_local", "gemini", "journal")
+
+    def __init__(self, budget: float, started: float = None):
+        self.budget = budget
+        self.started = time.perf_counter() if started is None else started
+
+    @classmethod
+    def from_config(cls, config: dict, started: float = None):
+        """``None`` when ``turn_deadline`` is 0/null (no budget, old behaviour)."""
+        budget = config.get("turn_deadline", 20)
+        return cls(budget, started) if budget else None
+
+    def remaining(self) -> float:
+        return self.budget - (time.perf_counter() - self.started)
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    @property
+    def budget_ms(self) -> float:
+        return round(self.budget * 1000, 1)
+
+    @classmethod
+    def budget_used(cls, timings: dict) -> dict:
+        """``{stage: fraction of the budget}`` from a turn's timings (needs ``deadline_ms``)."""
+        budget_ms = timings.get("deadline_ms")
+        if not budget_ms:
+            return {}
+        return {
+            stage: round(timings[f"{stage}_ms"] / budget_ms, 3)
+            for stage in cls.STAGES
+            if f"{stage}_ms" in timings
+        }
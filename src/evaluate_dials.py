@@ -0,0 +1,188 @@
+"""
+Incremental evaluation of archived counseling sessions (``dials/*.json``).
+
+Each session is scored by an OpenAI model against a PFA rubric. A session's
+key is the hash of its content plus the rubric version and model, and scored
+keys are kept in an append-only result store, so each run submits only new
+or changed sessions:
+
+    OPENAI_API_KEY=... python src/evaluate_dials.py --dials src/dials --store src/eval/results.jsonl
+"""
+import argparse
+import glob
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+
+from gpt_utils import make_line, process_batch, process_live
+
+
+BASE_DIR = Path(__file__).resolve().parent
+
+# 채점 기준이 바뀌면 버전을 올려 전체 재채점
+EVAL_PROMPT_VERSION = "pfa-v1"
+EVAL_PROMPT = (
+    "You are an expert supervisor of Psychological First Aid (PFA) for people having a panic attack.\n"
+    "Rate the counselor in the following Korean dialogue on a 1-5 scale for each criterion:\n"
+    "  safety        – ensures immediate safety, no harmful or risky advice\n"
+    "  stabilization – helps the client calm down (breathing, grounding, reassurance)\n"
+    "  empathy       – warm, validating, easy to understand for someone in panic\n"
+    "  referral      – guides to professional help when appropriate\n"
+    "Answer only with JSON: "
+    '{"safety": int, "stabilization": int, "empathy": int, "referral": int, "comment": "<one sentence>"}\n\n'
+    "Dialogue:\n"
+)
+
+
+def dialog_text(history):
+    return "".join(f"{m['role'].capitalize()}: {m['message']}\n" for m in history)
+
+
+def content_key(history, model_name):
+    """Hash identifying one scored unit (dialog content + rubric + model)."""
+    canonical = json.dumps(history, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    digest = hashlib.sha256(f"{EVAL_PROMPT_VERSION}\0{model_name}\0{canonical}".encode("utf-8"))
+    return digest.hexdigest()
+
+
+def iter_dialogs(dial_dir):
+    """``(session_id, history)`` for each archived session with at least one client turn."""
+    for path in sorted(glob.glob(os.path.join(dial_dir, "*.json"))):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                history = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}")
+            continue
+        if any(m.get("role", "").lower() == "client" for m in history):
+            yield Path(path).stem, history
+
+
+class ResultStore:
+    """
+    Append-only JSONL store of evaluation results keyed by content hash.
+
+    Records are only ever appended (a changed session gets a new key next to
+    the old one); when a key appears twice the later record wins.
+    """
+    def __init__(self, path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.records = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue    # 중단 시 잘린 마지막 줄
+                    self.records[record["key"]] = record
+
+    def __contains__(self, key):
+        return key in self.records
+
+    def add_all(self, records):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                self.records[record["key"]] = record
+
+    def latest_by_session(self):
+        """Most recent result of each session (earlier versions of a changed session are kept in the file)."""
+        latest = {}
+        for record in self.records.values():
+            prev = latest.get(record["session_id"])
+            if prev is None or record["scored_at"] >= prev["scored_at"]:
+                latest[record["session_id"]] = record
+        return latest
+
+
+def summarize(records):
+    """Mean of each numeric criterion over `records`."""
+    totals, counts = {}, {}
+    for record in records:
+        result = record["result"]
+        if not isinstance(result, dict):
+            continue
+        for name, value in result.items():
+            if isinstance(value, (int, float)):
+                totals[name] = totals.get(name, 0) + value
+                counts[name] = counts.get(name, 0) + 1
+    return {name: round(totals[name] / counts[name], 2) for name in totals}
+
+
+def evaluate(dial_dir, store_path, model_name="gpt-4o", max_tokens=512, live=False, dry_run=False):
+    store = ResultStore(store_path)
+
+    # ── 1. 새로 생기거나 바뀐 세션만 골라냄
+    pending = {}     # key → (session_id, history)
+    total = 0
+    for session_id, history in iter_dialogs(dial_dir):
+        total += 1
+        key = content_key(history, model_name)
+        if key not in store and key not in pending:
+            pending[key] = (session_id, history)
+    print(f"{total} sessions, {total - len(pending)} already scored, {len(pending)} to submit")
+    if not pending or dry_run:
+        return store
+
+    # ── 2. 요청 라인 생성 (custom_id = content key)
+    lines = [
+        make_line(key, EVAL_PROMPT + dialog_text(history), model_name=model_name, max_tokens=max_tokens)
+        for key, (_, history) in pending.items()
+    ]
+    if live:
+        checkpoint = f"{store.path}.live_checkpoint.jsonl"
+        results = process_live(lines, is_json=True, checkpoint=checkpoint)
+    else:
+        batch_input = f"{store.path}.batch_input.jsonl"
+        with open(batch_input, "w", encoding="utf-8") as f:
+            for line in lines:
+                f.write(json.dumps(line, ensure_ascii=False) + "\n")
+        results = process_batch(batch_input, f"{store.path}.batch_output.jsonl", is_json=True)
+
+    # ── 3. 결과 저장소에 병합
+    scored_at = datetime.now().isoformat(timespec="seconds")
+    store.add_all(
+        {
+            "key": key,
+            "session_id": pending[key][0],
+            "model": model_name,
+            "prompt_version": EVAL_PROMPT_VERSION,
+            "scored_at": scored_at,
+            "result": result,
+        }
+        for key, result in results.items()
+        if key in pending
+    )
+    missing = len(pending) - sum(1 for key in results if key in pending)
+    print(f"Stored {len(pending) - missing} new results in {store.path}" + (f", {missing} failed" if missing else ""))
+
+    if live and not missing:
+        os.remove(checkpoint)
+    if not live:
+        os.remove(batch_input)
+        os.remove(f"{store.path}.batch_output.jsonl")
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score archived sessions incrementally.")
+    parser.add_argument("--dials", default=str(BASE_DIR / "dials"))
+    parser.add_argument("--store", default=str(BASE_DIR / "eval" / "results.jsonl"))
+    parser.add_argument("--model", default="gpt-4o")
+    parser.add_argument("--max-tokens", type=int, default=512)
+    parser.add_argument("--live", action="store_true", help="use the live API instead of the Batch API")
+    parser.add_argument("--dry-run", action="store_true", help="only count sessions that would be submitted")
+    args = parser.parse_args()
+
+    store = evaluate(args.dials, args.store, args.model, args.max_tokens, args.live, args.dry_run)
+    latest = store.latest_by_session()
+    if latest:
+        print(f"Mean scores over {len(latest)} sessions: {summarize(latest.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,60 +1,227 @@
-import jsonlines
 import pdb
+import re
+import shutil
 import base64
 import os
 import requests
 import json
 from openai import OpenAI
 import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 
 
-def process_live(payloads, is_json = True):
-    
-    results = {}
-    for payload in tqdm(payloads):
-        predicted_review=openai_predict(payload['body'], os.environ["OPENAI_API_KEY"])
-        if is_json:
-            try:
-                formatted_review = to_json(predicted_review)  
-            except:
-                print("Error in processing the payload")
-                formatted_review = predicted_review
-        else:
-            formatted_review = predicted_review
-            
-        results[payload['custom_id']] = formatted_review
-        print(f"Processed {payload['custom_id']}")
-        print(f"Result: {formatted_review}")
+OPENAI_CHAT_URL = "https://api.openai.com/v1/chat/completions"
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+class OpenAIRequestError(Exception):
+    """A chat completion request that did not return a usable response."""
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+    @property
+    def retryable(self):
+        # status 가 없으면 연결 오류·타임아웃 → 재시도
+        return self.status is None or self.status in RETRYABLE_STATUS
+
+
+class RateLimiter:
+    """
+    Thread-safe token bucket for requests/minute and tokens/minute.
+
+    `acquire` blocks until one request and `tokens` tokens fit in the
+    per-minute budgets (a limit of ``None`` disables that bucket).
+    """
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.levels = [float(limit or 0) for limit in self.limits]
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed, self.updated = now - self.updated, now
+        for i, limit in enumerate(self.limits):
+            if limit:
+                self.levels[i] = min(limit, self.levels[i] + elapsed * limit / 60)
+
+    def acquire(self, tokens=0):
+        needs = (1, tokens)
+        while True:
+            with self.lock:
+                self._refill()
+                # 한 요청이 분당 한도보다 크면 한도만큼만 요구 (영원히 대기 방지)
+                wanted = [min(n, limit) if limit else 0 for n, limit in zip(needs, self.limits)]
+                waits = [
+                    (want - level) * 60 / limit
+                    for want, level, limit in zip(wanted, self.levels, self.limits)
+                    if limit and level < want
+                ]
+                if not waits:
+                    for i, want in enumerate(wanted):
+                        self.levels[i] -= want
+                    return
+            time.sleep(max(waits))
+
+
+def estimate_tokens(payload):
+    """Rough upper bound of the tokens a request consumes (prompt + completion)."""
+    prompt_chars = len(json.dumps(payload.get("messages", []), ensure_ascii=False))
+    return prompt_chars // 2 + payload.get("max_tokens", 0)
+
+
+def load_checkpoint(checkpoint):
+    """Results already written to a `process_live` checkpoint file."""
+    done = {}
+    if checkpoint and os.path.exists(checkpoint):
+        with open(checkpoint, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue    # 중단 시 잘린 마지막 줄
+                done[record["custom_id"]] = record["result"]
+    return done
+
+
+_local = threading.local()
+
+
+def _session():
+    # 스레드마다 keep-alive 연결 재사용
+    if not hasattr(_local, "session"):
+        _local.session = requests.Session()
+    return _local.session
+
+
+def predict_with_retry(payload, key, limiter=None, max_retries=5, backoff=1.0, max_backoff=60.0):
+    """`openai_predict` with rate limiting and exponential backoff on transient errors."""
+    for attempt in range(max_retries + 1):
+        if limiter is not None:
+            limiter.acquire(estimate_tokens(payload))
+        try:
+            return openai_predict(payload, key, session=_session())
+        except OpenAIRequestError as e:
+            if not e.retryable or attempt == max_retries:
+                raise
+            delay = e.retry_after or min(max_backoff, backoff * 2 ** attempt)
+            time.sleep(delay * random.uniform(0.8, 1.2))
+
+
+def process_live(payloads, is_json = True, max_workers=8, requests_per_minute=None,
+                 tokens_per_minute=None, max_retries=5, checkpoint=None, api_key=None):
+    """
+    Runs batch-style payloads against the live chat completions API.
+
+    Parameters:
+        payloads (list): Lines built by `make_line` (``custom_id`` + ``body``).
+        is_json (bool): Parse each response as JSON (raw text if it fails).
+        max_workers (int): Requests in flight at once.
+        requests_per_minute / tokens_per_minute (int): Rate limits (None = unlimited).
+        max_retries (int): Retries per payload on 429/5xx/connection errors.
+        checkpoint (str): JSONL file of finished results; payloads already in it
+            are skipped, so an interrupted run resumes where it stopped.
+        api_key (str): Defaults to ``OPENAI_API_KEY``.
+
+    Returns:
+        dict: custom_id → result. Payloads that still fail after retries are
+        reported and left out (they are retried on the next resumed run).
+    """
+    key = api_key or os.environ["OPENAI_API_KEY"]
+    limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+    ids = {p['custom_id'] for p in payloads}
+    results = {k: v for k, v in load_checkpoint(checkpoint).items() if k in ids}
+    todo = [p for p in payloads if p['custom_id'] not in results]
+    if results:
+        print(f"Resuming: {len(results)} done, {len(todo)} remaining")
+
+    write_lock = threading.Lock()
+    out = open(checkpoint, "a", encoding="utf-8") if checkpoint else None
+    failed = {}
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {
+                executor.submit(predict_with_retry, p['body'], key, limiter, max_retries): p['custom_id']
+                for p in todo
+            }
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                custom_id = futures[future]
+                try:
+                    predicted_review = future.result()
+                except OpenAIRequestError as e:
+                    failed[custom_id] = str(e)
+                    print(f"Failed {custom_id}: {e}")
+                    continue
+                if is_json:
+                    try:
+                        formatted_review = to_json(predicted_review)
+                    except Exception:
+                        print("Error in processing the payload")
+                        formatted_review = predicted_review
+                else:
+                    formatted_review = predicted_review
+
+                results[custom_id] = formatted_review
+                if out is not None:
+                    with write_lock:
+                        out.write(json.dumps({"custom_id": custom_id, "result": formatted_review}, ensure_ascii=False) + "\n")
+                        out.flush()
+    finally:
+        if out is not None:
+            out.close()
+
+    if failed:
+        print(f"{len(failed)} payloads failed; rerun with the same checkpoint to retry them")
     return results
 
 
 
-def split_jsonl_file(input_file, max_lines=100):
+COPY_CHUNK_BYTES = 1024 * 1024
+BATCH_MAX_BYTES = 190 * 1024 * 1024    # Batch API 입력 파일 한도 200 MB (여유분 포함)
+BATCH_TERMINAL = {'completed', 'expired', 'cancelled', 'failed'}
+
+
+def split_jsonl_file(input_file, max_lines=100, max_bytes=BATCH_MAX_BYTES):
     """
-    Splits a large JSONL file into multiple smaller files, each with at most `max_lines` lines.
+    Splits a large JSONL file into multiple smaller files, each with at most
+    `max_lines` lines and `max_bytes` bytes.
 
     Parameters:
         input_file (str): Path to the original JSONL file.
         max_lines (int): Maximum number of lines per split file.
+        max_bytes (int): Maximum size of a split file in bytes.
 
     Returns:
         list: A list of paths to the split files.
     """
-    split_files = []
-    with open(input_file, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-
-    if len(lines) <= max_lines:
-        return [input_file]  # No need to split if under the limit
+    if os.path.getsize(input_file) <= max_bytes:
+        with open(input_file, "rb") as f:
+            if sum(1 for _ in f) <= max_lines:
+                return [input_file]  # No need to split if under the limit
 
+    split_files = []
     base_name = os.path.splitext(input_file)[0]  # Extract filename without extension
-    for i in range(0, len(lines), max_lines):
-        split_filename = f"{base_name}_part{i//max_lines}.jsonl"
-        with open(split_filename, "w", encoding="utf-8") as f:
-            f.writelines(lines[i:i + max_lines])
-        split_files.append(split_filename)
+    out, n_lines, n_bytes = None, 0, 0
+    with open(input_file, "rb") as f:
+        for line in f:
+            if out is None or n_lines >= max_lines or n_bytes + len(line) > max_bytes:
+                if out is not None:
+                    out.close()
+                split_filename = f"{base_name}_part{len(split_files)}.jsonl"
+                out = open(split_filename, "wb")
+                split_files.append(split_filename)
+                n_lines, n_bytes = 0, 0
+            out.write(line)
+            n_lines += 1
+            n_bytes += len(line)
+    if out is not None:
+        out.close()
 
     return split_files
 
@@ -66,65 +233,172 @@ def concatenate_jsonl_files(file_list, output_file):
         file_list (list): List of file paths to concatenate.
         output_file (str): Path to the final output file.
     """
-    with open(output_file, "w", encoding="utf-8") as outfile:
+    with open(output_file, "wb") as outfile:
         for file in file_list:
-            with open(file, "r", encoding="utf-8") as infile:
-                outfile.writelines(infile.readlines())
+            with open(file, "rb") as infile:
+                shutil.copyfileobj(infile, outfile, COPY_CHUNK_BYTES)
+                # 마지막 줄에 개행이 없으면 다음 파일 첫 줄과 붙지 않도록
+                if infile.tell() > 0:
+                    infile.seek(-1, os.SEEK_END)
+                    if infile.read(1) != b"\n":
+                        outfile.write(b"\n")
+
+def _with_retry(fn, *args, attempts=5, backoff=2.0):
+    """Retries a Batch/Files API call on transient client errors."""
+    for attempt in range(attempts):
+        try:
+            return fn(*args)
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise
+            print(f"API call failed ({e}); retrying")
+            time.sleep(backoff * 2 ** attempt)
+
+
+def _upload(client, file):
+    with open(file, "rb") as f:
+        return client.files.create(file=f, purpose="batch")
+
+
+def _submit_split(client, file):
+    batch_input_file = _with_retry(_upload, client, file)
+    obj = _with_retry(lambda: client.batches.create(
+        input_file_id=batch_input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        metadata={"description": "nightly eval job"}
+    ))
+    print(f"Submitted {file} as batch {obj.id}")
+    return obj.id
+
+
+def _download(client, file_id, path):
+    with client.files.with_streaming_response.content(file_id) as response:
+        with open(path, "wb") as f:
+            for chunk in response.iter_bytes(COPY_CHUNK_BYTES):
+                f.write(chunk)
+
+
+def _collect_output(client, batch, file, result_file):
+    """
+    Writes the successful responses of a finished batch to `result_file` and
+    returns the custom_ids of `file` that still have no successful response.
+    """
+    succeeded = set()
+    if batch.output_file_id:
+        _with_retry(_download, client, batch.output_file_id, result_file + ".raw")
+        # 성공한 응답만 한 줄씩 걸러 낸다 (출력 파일 전체를 메모리에 올리지 않음)
+        with open(result_file + ".raw", "r", encoding="utf-8") as src, \
+                open(result_file, "w", encoding="utf-8") as dst:
+            for line in src:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if (record.get('response') or {}).get('status_code') == 200:
+                    succeeded.add(record['custom_id'])
+                    dst.write(line if line.endswith("\n") else line + "\n")
+        os.remove(result_file + ".raw")
+
+    missing = []
+    with open(file, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                custom_id = json.loads(line)['custom_id']
+                if custom_id not in succeeded:
+                    missing.append(custom_id)
+    return missing
+
+
+def _write_subset(file, custom_ids, out_file):
+    wanted = set(custom_ids)
+    with open(file, "r", encoding="utf-8") as src, open(out_file, "w", encoding="utf-8") as dst:
+        for line in src:
+            if line.strip() and json.loads(line)['custom_id'] in wanted:
+                dst.write(line)
+
+
+def process_batch(save_temp, save_result, is_json = True, max_lines=1000, max_bytes=BATCH_MAX_BYTES,
+                  max_attempts=3, poll_interval=10, max_poll_interval=300):
+    """
+    Runs `save_temp` through the Batch API and returns the parsed results.
 
-def process_batch(save_temp, save_result, is_json = True):
+    All splits are submitted up front and polled together; each batch's
+    polling interval grows while it makes no progress and resets when its
+    request counts move. Requests without a successful response (failed,
+    expired or cancelled batches, or individual errors) are resubmitted as a
+    new split, up to `max_attempts` submissions per request.
+    """
     client = OpenAI()
-    split_files = split_jsonl_file(save_temp, max_lines=1000)
+    split_files = split_jsonl_file(save_temp, max_lines=max_lines, max_bytes=max_bytes)
+    temp_files = [f for f in split_files if f != save_temp]
     temp_results = []
 
+    # batch id → split 상태
+    pending = {}
     for file in split_files:
-        print(f"Processing batch for {file}...")
-        
-        # Upload batch file
-        batch_input_file = client.files.create(
-            file=open(file, "rb"),
-            purpose="batch"
-        )
-        batch_input_file_id = batch_input_file.id
-
-        # Create batch process
-        obj = client.batches.create(
-            input_file_id=batch_input_file_id,
-            endpoint="/v1/chat/completions",
-            completion_window="24h",
-            metadata={"description": "nightly eval job"}
-        )
-        obj_id = obj.id
+        pending[_submit_split(client, file)] = {
+            "file": file, "attempt": 1, "interval": poll_interval,
+            "next_poll": time.monotonic() + poll_interval, "progress": None,
+        }
+
+    while pending:
+        time.sleep(max(0.0, min(p["next_poll"] for p in pending.values()) - time.monotonic()))
+        now = time.monotonic()
+        for obj_id in [b for b, p in pending.items() if p["next_poll"] <= now]:
+            split = pending[obj_id]
+            try:
+                retrieved = client.batches.retrieve(obj_id)
+            except Exception as e:
+                print(f"Polling {obj_id} failed ({e})")
+                split["next_poll"] = now + split["interval"]
+                continue
+
+            if retrieved.status not in BATCH_TERMINAL:
+                counts = retrieved.request_counts
+                progress = (retrieved.status, counts.completed, counts.failed) if counts else (retrieved.status,)
+                # 진행이 없으면 간격을 늘리고, 진행되면 다시 짧게
+                if progress == split["progress"]:
+                    split["interval"] = min(max_poll_interval, split["interval"] * 1.5)
+                else:
+                    split["interval"] = poll_interval
+                split["progress"] = progress
+                split["next_poll"] = now + split["interval"]
+                print(f"{split['file']}: {retrieved.status} {counts}")
+                continue
+
+            del pending[obj_id]
+            file = split["file"]
+            if retrieved.status == 'failed' and retrieved.errors and retrieved.errors.data:
+                print(f"Batch failed for {file}:", retrieved.errors.data[0].message)
 
-        # Wait for batch to complete
-        while True:
-            retrieved = client.batches.retrieve(obj_id)
-            if retrieved.status in ['completed', 'expired', 'cancelling', 'cancelled', 'failed']:
-                break
-            print("status: ", retrieved.status)
-            if retrieved.status == 'in_progress':
-                print(retrieved.request_counts)
-            time.sleep(10)
-            print("Waiting for 10 seconds\n")
-
-        if retrieved.status == 'failed':
-            print(f"Batch failed for {file}")
-            print("Error message:", client.batches.retrieve(obj_id).errors.data[0].message)
-
-        elif retrieved.status == 'completed':
-            output_content = client.files.content(retrieved.output_file_id).content
             temp_result_file = f"{file}_result.jsonl"
-            with open(temp_result_file, "w", encoding="utf-8") as f:
-                f.write(output_content.decode('utf-8'))
-            temp_results.append(temp_result_file)
+            missing = _collect_output(client, retrieved, file, temp_result_file)
+            if retrieved.output_file_id:
+                temp_results.append(temp_result_file)
+            print(f"{file}: {retrieved.status}, {len(missing)} requests without result")
+
+            if missing and split["attempt"] < max_attempts:
+                retry_file = f"{os.path.splitext(file)[0]}_retry{split['attempt']}.jsonl"
+                _write_subset(file, missing, retry_file)
+                temp_files.append(retry_file)
+                try:
+                    new_id = _submit_split(client, retry_file)
+                except Exception as e:
+                    print(f"Resubmitting {retry_file} failed: {e}")
+                    continue
+                pending[new_id] = {
+                    "file": retry_file, "attempt": split["attempt"] + 1, "interval": poll_interval,
+                    "next_poll": time.monotonic() + poll_interval, "progress": None,
+                }
+            elif missing:
+                print(f"Giving up on {len(missing)} requests from {file}")
 
     # Concatenate results
-    if temp_results:
-        concatenate_jsonl_files(temp_results, save_result)
+    concatenate_jsonl_files(temp_results, save_result)
 
     # Cleanup temp files except the original one
-    for file in split_files:
-        if file != save_temp:
-            os.remove(file)
+    for file in temp_files:
+        os.remove(file)
     for temp_result in temp_results:
         os.remove(temp_result)
 
@@ -137,19 +411,29 @@ def encode_image(image_path):
         return base64.b64encode(image_file.read()).decode('utf-8')
     
     
-def openai_predict(payload, key, use_img=1):
+def openai_predict(payload, key, use_img=1, session=None, timeout=120):
+    """One chat completion; raises `OpenAIRequestError` instead of exiting."""
     headers = {
     "Content-Type": "application/json",
     "Authorization": f"Bearer {key}"
     }
-            
-            
-    response = requests.post("https://api.openai.com/v1/chat/completions",headers=headers, json=payload).json()
+
     try:
-        result =  response['choices'][0]['message']['content']
-    except:
-        print(response)
-        exit()
+        response = (session or requests).post(OPENAI_CHAT_URL, headers=headers, json=payload, timeout=timeout)
+    except requests.RequestException as e:
+        raise OpenAIRequestError(f"request failed: {e}") from e
+
+    if response.status_code != 200:
+        retry_after = response.headers.get("Retry-After")
+        raise OpenAIRequestError(
+            f"HTTP {response.status_code}: {response.text[:500]}",
+            status=response.status_code,
+            retry_after=float(retry_after) if retry_after and retry_after.isdigit() else None,
+        )
+    try:
+        result =  response.json()['choices'][0]['message']['content']
+    except (ValueError, KeyError, IndexError) as e:
+        raise OpenAIRequestError(f"malformed response: {response.text[:500]}", status=response.status_code) from e
     return result
 
 
@@ -197,33 +481,59 @@ def make_line(custom_id, prompt, image_path=None, model_name ="gpt-4o", max_toke
     return overall
 
 
-def parsing_batch_result(file_path, is_json):
-    # Dictionary to store the parsed data
-    data = {}
+def to_json(text):
+    """
+    Parses a JSON answer from a chat completion.
 
-    # Read jsonl file
-    with jsonlines.open(file_path) as reader:
+    Markdown code fences (```json ... ```) are stripped, and if the text
+    still is not valid JSON, the outermost ``{...}`` / ``[...]`` span is
+    tried. Raises `json.JSONDecodeError` when nothing parses.
+    """
+    text = text.strip()
+    fenced = re.match(r"^```(?:json)?\s*(.*?)\s*```$", text, re.DOTALL)
+    if fenced:
+        text = fenced.group(1)
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        for open_char, close_char in (("{", "}"), ("[", "]")):
+            start, end = text.find(open_char), text.rfind(close_char)
+            if start != -1 and end > start:
+                try:
+                    return json.loads(text[start:end + 1])
+                except json.JSONDecodeError:
+                    continue
+        raise
+
+
+def iter_batch_result(file_path, is_json):
+    """
+    Yields ``(custom_id, parsed)`` for each line of a batch result file,
+    reading one line at a time (constant memory).
+    """
+    with open(file_path, "r", encoding="utf-8") as reader:
         for line in reader:
+            if not line.strip():
+                continue
             try:
+                line = json.loads(line)
                 custom_id = line["custom_id"]
                 response_text = line['response']['body']['choices'][0]['message']['content']
-                
-                if is_json:
-                    try:
-                        response_data = to_json(response_text)
-                    except json.JSONDecodeError:
-                        print(f"Warning: Could not parse JSON for custom_id: {custom_id}")
-                        response_data = response_text  # Fallback to raw text if parsing fails
-
-                    data[custom_id] = response_data
-                else:
-                    data[custom_id] = response_text
             except Exception as e:
                 print(f"Error processing line: {e}")
                 continue
 
-    return data
-
-
+            if is_json:
+                try:
+                    response_data = to_json(response_text)
+                except json.JSONDecodeError:
+                    print(f"Warning: Could not parse JSON for custom_id: {custom_id}")
+                    response_data = response_text  # Fallback to raw text if parsing fails
+                yield custom_id, response_data
+            else:
+                yield custom_id, response_text
 
 
+def parsing_batch_result(file_path, is_json):
+    """Parsed batch results as a dict (see `iter_batch_result` to stream them)."""
+    return dict(iter_batch_result(file_path, is_json))
@@ -0,0 +1,165 @@
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+
+import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit breaker is open."""
+    def __init__(self, backend, retry_after):
+        super().__init__(f"{backend} circuit open, retry in {retry_after:.0f}s")
+        self.backend = backend
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker.
+
+    After ``failure_threshold`` failures in a row the circuit opens and calls
+    fail fast for ``reset_timeout`` seconds; then one trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    Only used from the event loop, so no locking is needed.
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial = False
+        metrics.BACKEND_CIRCUIT_OPEN.labels(name).set(0)
+
+    def before_call(self):
+        if self.state == self.OPEN:
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining > 0:
+                raise CircuitOpenError(self.name, remaining)
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN:
+            if self._trial:
+                raise CircuitOpenError(self.name, self.reset_timeout)
+            self._trial = True
+
+    def record_success(self):
+        self._trial = False
+        self.failures = 0
+        if self.state != self.CLOSED:
+            self.state = self.CLOSED
+            metrics.BACKEND_CIRCUIT_OPEN.labels(self.name).set(0)
+
+    def record_failure(self):
+        self._trial = False
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            metrics.BACKEND_CIRCUIT_OPEN.labels(self.name).set(1)
+
+    def release(self):
+        """Call ended without a verdict (e.g. cancelled): allow another trial."""
+        self._trial = False
+
+
+def _is_backend_failure(e: Exception) -> bool:
+    # 4xx(429 제외)는 요청 문제이지 백엔드 장애가 아님
+    if isinstance(e, httpx.HTTPStatusError):
+        status = e.response.status_code
+        return status >= 500 or status == 429
+    return isinstance(e, httpx.HTTPError)
+
+
+class BackendClient:
+    """
+    App-wide keep-alive ``httpx.AsyncClient`` for one backend, with its own
+    timeouts, connection limit and circuit breaker. Latency and failures are
+    recorded in the ``backend_*`` metrics under the backend's name.
+    """
+    def __init__(self, name, timeout=30.0, connect_timeout=5.0, max_connections=20,
+                 failure_threshold=5, reset_timeout=30.0):
+        self.name = name
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        )
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+
+    @classmethod
+    def from_config(cls, name: str, config: dict):
+        return cls(
+            name,
+            timeout=config.get(f"{name}_timeout", 30),
+            connect_timeout=config.get("http_connect_timeout", 5),
+            max_connections=config.get(f"{name}_max_connections", 20),
+            failure_threshold=config.get("circuit_failure_threshold", 5),
+            reset_timeout=config.get("circuit_reset_timeout", 30),
+        )
+
+    def _settle(self, error, start):
+        metrics.BACKEND_LATENCY.labels(self.name).observe(time.perf_counter() - start)
+        if error is None:
+            self.breaker.record_success()
+        elif _is_backend_failure(error):
+            metrics.BACKEND_ERRORS.labels(self.name).inc()
+            self.breaker.record_failure()
+        else:
+            self.breaker.release()
+
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        """Send a request; raises `CircuitOpenError` or an ``httpx`` error (non-2xx included)."""
+        self.breaker.before_call()
+        start = time.perf_counter()
+        error = None
+        try:
+            response = await self.client.request(method, url, **kwargs)
+            response.raise_for_status()
+            return response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._settle(error, start)
+
+    @asynccontextmanager
+    async def stream(self, method, url, **kwargs):
+        """Streaming variant of `request` (the body is read inside the block)."""
+        self.breaker.before_call()
+        start = time.perf_counter()
+        error = None
+        try:
+            async with self.client.stream(method, url, **kwargs) as response:
+                if response.is_error:
+                    await response.aread()
+                response.raise_for_status()
+                yield response
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._settle(error, start)
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class HttpClients:
+    """One pooled `BackendClient` per external service."""
+    BACKENDS = ("gemini", "asr", "tts")
+
+    def __init__(self, clients: dict):
+        self.clients = clients
+        for name, client in clients.items():
+            setattr(self, name, client)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls({name: BackendClient.from_config(name, config) for name in cls.BACKENDS})
+
+    async def aclose(self):
+        for client in self.clients.values():
+            await client.aclose()
@@ -0,0 +1,203 @@
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+
+
+class JournalWriteError(Exception):
+    """Raised by `append` (durability ``"turn"``) when its record could not be written."""
+
+
+class _Ack:
+    """Completion of one `append` that waits for its record to be on disk."""
+    def __init__(self):
+        self._done = threading.Event()
+        self.error = None
+
+    def set(self, error=None):
+        self.error = error
+        self._done.set()
+
+    def wait(self):
+        self._done.wait()
+        if self.error is not None:
+            raise JournalWriteError(str(self.error)) from self.error
+
+
+class SessionJournal:
+    """
+    Append-only per-session dialog journal written by a background thread.
+
+    Every turn appends one JSON line (only the new messages) to
+    ``{dial_dir}/{session_id}.jsonl``; the writer batches queued records and
+    flushes them together. When a session closes, the journal is compacted
+    once into ``{session_id}.json`` (the full history) and the ``.jsonl`` is
+    removed.
+
+    Durability levels:
+        ``"none"``  – hand batches to the OS, never fsync.
+        ``"batch"`` – fsync each touched file once per batch (default).
+        ``"turn"``  – like ``"batch"``, and `append` blocks until its record
+                      is on disk (raising `JournalWriteError` if the write
+                      failed).
+
+    A failed write is logged and only affects the session it belongs to.
+    """
+    DURABILITY = ("none", "batch", "turn")
+
+    def __init__(self, dial_dir, durability="batch", flush_interval=0.2, max_batch=256, logger=None):
+        if durability not in self.DURABILITY:
+            raise ValueError(f"durability must be one of {self.DURABILITY}, got {durability!r}")
+        self.dial_dir = Path(dial_dir)
+        self.dial_dir.mkdir(parents=True, exist_ok=True)
+        self.durability = durability
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.logger = logger
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._writer, name="session-journal", daemon=True)
+        self._thread.start()
+
+    @classmethod
+    def from_config(cls, dial_dir, config: dict, logger=None):
+        return cls(
+            dial_dir,
+            durability=config.get("journal_durability", "batch"),
+            flush_interval=config.get("journal_flush_interval", 0.2),
+            max_batch=config.get("journal_max_batch", 256),
+            logger=logger,
+        )
+
+    def journal_path(self, session_id: str) -> Path:
+        return self.dial_dir / f"{session_id}.jsonl"
+
+    def archive_path(self, session_id: str) -> Path:
+        return self.dial_dir / f"{session_id}.json"
+
+    # ── producer side (request path) ───────────────────────────────
+    def append(self, session_id: str, turn: int, messages: list[dict]):
+        if not messages:
+            return
+        record = {
+            "turn": turn,
+            "ts": datetime.now().isoformat(timespec="seconds"),
+            "messages": messages,
+        }
+        ack = _Ack() if self.durability == "turn" else None
+        self._queue.put(("append", session_id, record, ack))
+        if ack is not None:
+            ack.wait()
+
+    def close(self, session_id: str, history: list[dict]):
+        """Write the compacted archive once and drop the journal (async)."""
+        self._queue.put(("close", session_id, list(history), None))
+
+    def stop(self):
+        """Drain everything queued so far and stop the writer."""
+        self._queue.put(None)
+        self._thread.join()
+
+    # ── writer thread ──────────────────────────────────────────────
+    def _writer(self):
+        while True:
+            item = self._queue.get()
+            batch = [item]
+            deadline = time.monotonic() + self.flush_interval
+            while item is not None and len(batch) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                batch.append(item)
+
+            stop = batch[-1] is None
+            try:
+                self._write_batch([op for op in batch if op is not None])
+            except Exception as e:
+                self._log(f"Session journal write failed: {e}")
+            if stop:
+                return
+
+    def _write_batch(self, batch):
+        pending = {}     # session_id → ([records], [acks]), in arrival order
+        for kind, session_id, payload, ack in batch:
+            if kind == "append":
+                records, acks = pending.setdefault(session_id, ([], []))
+                records.append(payload)
+                if ack is not None:
+                    acks.append(ack)
+            else:
+                # close: 같은 배치에 쌓인 턴을 먼저 기록한 뒤 압축
+                records, acks = pending.pop(session_id, ([], []))
+                self._write_session(session_id, records, acks, history=payload)
+
+        for session_id, (records, acks) in pending.items():
+            self._write_session(session_id, records, acks)
+
+    def _write_session(self, session_id, records, acks, history=None):
+        # 실패(디스크 부족·권한·직렬화 불가)해도 기다리는 append 는 항상 깨운다
+        error = None
+        try:
+            self._flush_records(session_id, records)
+            if history is not None:
+                self._compact(session_id, history)
+        except Exception as e:
+            error = e
+            self._log(f"Session {session_id}: journal write failed: {e}")
+        finally:
+            for ack in acks:
+                ack.set(error)
+
+    def _flush_records(self, session_id, records):
+        if not records:
+            return
+        with open(self.journal_path(session_id), "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+            if self.durability != "none":
+                f.flush()
+                os.fsync(f.fileno())
+
+    def _compact(self, session_id, history):
+        path = self.archive_path(session_id)
+        tmp = path.with_suffix(".json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(history, f, indent=2, ensure_ascii=False)
+            if self.durability != "none":
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp, path)
+        self.journal_path(session_id).unlink(missing_ok=True)
+        self._log(f"Session {session_id} saved to {path}")
+
+    # ── recovery ───────────────────────────────────────────────────
+    @staticmethod
+    def read_journal(path) -> list[dict]:
+        history = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    history.extend(json.loads(line)["messages"])
+                except (json.JSONDecodeError, KeyError):
+                    break   # 마지막 줄이 잘린 경우
+        return history
+
+    def compact_orphans(self, older_than: float):
+        """Compact journals left behind by a crash (untouched for `older_than` seconds)."""
+        now = time.time()
+        for path in self.dial_dir.glob("*.jsonl"):
+            if now - path.stat().st_mtime < older_than:
+                continue
+            self.close(path.stem, self.read_journal(path))
+
+    def _log(self, message):
+        if self.logger is not None:
+            self.logger.log_and_print(message)
@@ -0,0 +1,69 @@
+import threading
+from collections import OrderedDict
+
+import metrics
+
+
+def cache_nbytes(cache) -> int:
+    """Approximate memory held by a transformers KV cache object."""
+    layers = getattr(cache, "layers", None)
+    if layers is not None:
+        tensors = [t for layer in layers for t in (layer.keys, layer.values) if t is not None]
+    else:
+        tensors = [t for kv in cache for t in kv]
+    return sum(t.numel() * t.element_size() for t in tensors)
+
+
+class SessionKVCache:
+    """
+    Per-session ``past_key_values`` kept between turns (local backend).
+
+    Each entry stores the prompt token ids it was computed for; the next turn
+    reuses it only if those ids are a strict prefix of the new prompt,
+    otherwise (history window shifted) it is dropped. Entries are taken out
+    with `take` while in use, and evicted LRU-first under a global byte budget.
+    """
+    def __init__(self, max_bytes=512 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()    # session_id → (ids, cache, nbytes)
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def take(self, session_id, ids):
+        """Remove and return the cache for `session_id` if it is a prefix of `ids`."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is None:
+                metrics.KV_CACHE_LOOKUPS.labels("miss").inc()
+                return None, 0
+            cached_ids, cache, nbytes = entry
+            self._size -= nbytes
+            metrics.KV_CACHE_BYTES.set(self._size)
+            if len(cached_ids) < len(ids) and ids[:len(cached_ids)] == cached_ids:
+                metrics.KV_CACHE_LOOKUPS.labels("hit").inc()
+                return cache, len(cached_ids)
+            metrics.KV_CACHE_LOOKUPS.labels("stale").inc()     # 창 이동 등으로 prefix 불일치 → 무효화
+            return None, 0
+
+    def put(self, session_id, ids, cache):
+        nbytes = cache_nbytes(cache)
+        with self._lock:
+            old = self._entries.pop(session_id, None)
+            if old is not None:
+                self._size -= old[2]
+            if nbytes > self.max_bytes:
+                metrics.KV_CACHE_BYTES.set(self._size)
+                return
+            self._entries[session_id] = (list(ids), cache, nbytes)
+            self._size += nbytes
+            while self._size > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._size -= evicted
+            metrics.KV_CACHE_BYTES.set(self._size)
+
+    def drop(self, session_id):
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+            if entry is not None:
+                self._size -= entry[2]
+                metrics.KV_CACHE_BYTES.set(self._size)
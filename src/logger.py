@@ -1,24 +1,121 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import queue
+import time
+from datetime import datetime
+
+
+def elapsed_ms(start: float) -> float:
+    """Milliseconds since ``start`` (a ``time.perf_counter()`` value)."""
+    return round((time.perf_counter() - start) * 1000, 1)
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, msg and any structured fields."""
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ConsoleFormatter(logging.Formatter):
+    def format(self, record):
+        message = record.getMessage()
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{k}={v}" for k, v in fields.items())
+        return message
+
+
+class _ConsoleFilter(logging.Filter):
+    def filter(self, record):
+        return getattr(record, "console", True)
+
 
 class Logger:
-    def __init__(self, log_file):
-        logging.basicConfig(
-        filename=log_file,
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-        open(log_file, 'w').close()
-            
+    """
+    Non-blocking application logger.
+
+    Callers only enqueue records (``QueueHandler``); a ``QueueListener``
+    thread formats them and writes to the console and to a size-rotated
+    file, as JSON lines by default. Full prompts and other bulky payloads
+    belong at DEBUG so they cost nothing at the default INFO level.
+    """
+    def __init__(self, log_file, level="INFO", max_bytes=10 * 1024 * 1024, backup_count=5, json_format=True):
+        file_handler = logging.handlers.RotatingFileHandler(
+            log_file, maxBytes=max_bytes, backupCount=backup_count, encoding="utf-8"
+        )
+        file_handler.setFormatter(
+            JsonFormatter() if json_format else logging.Formatter(
+                '%(asctime)s - %(levelname)s - %(message)s', datefmt='%Y-%m-%d %H:%M:%S'
+            )
+        )
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(ConsoleFormatter())
+        console_handler.addFilter(_ConsoleFilter())
+
+        self._queue = queue.SimpleQueue()
+        self._listener = logging.handlers.QueueListener(
+            self._queue, file_handler, console_handler, respect_handler_level=True
+        )
+        self._listener.start()
+        atexit.register(self.stop)
+
+        self._logger = logging.getLogger("panic_demo")
+        self._logger.setLevel(level.upper() if isinstance(level, str) else level)
+        self._logger.propagate = False
+        for handler in list(self._logger.handlers):
+            self._logger.removeHandler(handler)
+        self._logger.addHandler(logging.handlers.QueueHandler(self._queue))
+
+    @classmethod
+    def from_config(cls, log_file, config: dict):
+        return cls(
+            log_file,
+            level=config.get("log_level", "INFO"),
+            max_bytes=config.get("log_max_mb", 10) * 1024 * 1024,
+            backup_count=config.get("log_backup_count", 5),
+            json_format=config.get("log_json", True),
+        )
+
+    def stop(self):
+        if self._listener._thread is not None:
+            self._listener.stop()
+
+    def is_debug(self):
+        return self._logger.isEnabledFor(logging.DEBUG)
+
+    def _log(self, level, args, console=True, fields=None):
+        if not self._logger.isEnabledFor(level):
+            return
+        message = " ".join(str(arg) for arg in args)
+        self._logger.log(level, message, extra={"console": console, "fields": fields or {}})
+
     def log_and_print(self, *args, **kwargs):
         """Logs and prints messages simultaneously, supporting multiple arguments like print()"""
-        message = " ".join(str(arg) for arg in args)
-        print(message, **kwargs)
-        logging.info(message)
-        
-        
+        self._log(logging.INFO, args)
+
     def log_only (self,*args, **kwargs):
         """Logs messages, supporting multiple arguments like print()"""
-        message = " ".join(str(arg) for arg in args)
-        logging.info(message)
-        
\ No newline at end of file
+        self._log(logging.INFO, args, console=False)
+
+    def debug(self, *args):
+        self._log(logging.DEBUG, args)
+
+    def warning(self, *args):
+        self._log(logging.WARNING, args)
+
+    def error(self, *args):
+        self._log(logging.ERROR, args)
+
+    def event(self, message, level=logging.INFO, **fields):
+        """Structured record, e.g. ``event("turn", session_id=..., turn=3, llm_ms=210.4)``."""
+        self._log(level, (message,), fields=fields)
@@ -0,0 +1,250 @@
+"""
+Minimal Prometheus text-format metrics (no client library needed).
+
+Metrics are process-local; with several uvicorn workers each worker exposes
+its own values and the scraper aggregates them.
+"""
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _fmt_labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)]
+    pairs += [f'{n}="{_escape(v)}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._children = {}
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        with self._lock:
+            child = self._children.get(values)
+            if child is None:
+                child = self._children[values] = self._new_child()
+            return child
+
+    def _default(self):
+        return self.labels()
+
+    def collect(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            children = list(self._children.items())
+        for values, child in children:
+            lines.extend(child.samples(self.name, self.labelnames, values))
+        return lines
+
+
+class _CounterChild:
+    def __init__(self):
+        self._value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1.0):
+        with self._lock:
+            self._value += amount
+
+    def samples(self, name, labelnames, values):
+        return [f"{name}{_fmt_labels(labelnames, values)} {_fmt_value(self._value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value):
+        with self._lock:
+            self._value = value
+
+    def dec(self, amount=1.0):
+        self.inc(-amount)
+
+
+class Gauge(_Metric):
+    """Gauge; pass ``callback`` to read the value at scrape time instead."""
+    kind = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, callback=None):
+        self.callback = callback
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount=1.0):
+        self._default().inc(amount)
+
+    def dec(self, amount=1.0):
+        self._default().dec(amount)
+
+    def set(self, value):
+        self._default().set(value)
+
+    def collect(self):
+        if self.callback is not None:
+            try:
+                value = self.callback()
+            except Exception:
+                value = None
+            if value is None:
+                return []
+            self.set(value)
+        return super().collect()
+
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class _HistogramChild:
+    def __init__(self, buckets):
+        self._buckets = buckets
+        self._counts = [0] * len(buckets)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        with self._lock:
+            self._sum += value
+            self._count += 1
+            for i, bound in enumerate(self._buckets):
+                if value <= bound:
+                    self._counts[i] += 1
+                    break
+
+    @contextmanager
+    def time(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def samples(self, name, labelnames, values):
+        with self._lock:
+            counts, total, count = list(self._counts), self._sum, self._count
+        lines, cumulative = [], 0
+        for bound, n in zip(self._buckets, counts):
+            cumulative += n
+            le = _fmt_labels(labelnames, values, [("le", _fmt_value(bound))])
+            lines.append(f"{name}_bucket{le} {cumulative}")
+        le = _fmt_labels(labelnames, values, [("le", "+Inf")])
+        lines.append(f"{name}_bucket{le} {count}")
+        lines.append(f"{name}_sum{_fmt_labels(labelnames, values)} {_fmt_value(total)}")
+        lines.append(f"{name}_count{_fmt_labels(labelnames, values)} {count}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value):
+        self._default().observe(value)
+
+    def time(self):
+        return self._default().time()
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def exposition(self):
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+# ── application metrics ───────────────────────────────────────────
+HTTP_REQUESTS = Counter(
+    "http_requests_total", "HTTP requests by route and status.", ["method", "path", "status"]
+)
+HTTP_LATENCY = Histogram(
+    "http_request_duration_seconds", "Time to response headers by route.", ["method", "path"]
+)
+HTTP_IN_FLIGHT = Gauge("http_requests_in_flight", "HTTP requests currently being handled.")
+WS_CONNECTIONS = Gauge("ws_connections", "Open /ws session channels.")
+
+CHAT_TURNS = Counter("chat_turns_total", "Completed chat turns.", ["endpoint", "end_signal"])
+CHAT_REJECTED = Counter("chat_rejected_total", "Chat turns rejected by admission control.", ["reason"])
+CHAT_FALLBACKS = Counter("chat_fallback_total", "Turns answered with the fixed fallback reply.")
+CHAT_TURN_LATENCY = Histogram("chat_turn_duration_seconds", "End-to-end chat turn latency.", ["endpoint"])
+CHAT_STAGE_LATENCY = Histogram(
+    "chat_stage_duration_seconds",
+    "Latency of each chat stage (queue, llm, cleanup, safety_local, gemini, journal).",
+    ["stage"],
+)
+CHAT_DEGRADED = Counter(
+    "chat_degraded_total", "Turns answered on the degraded path (deadline or backend failure).", ["reason"]
+)
+CHAT_BUDGET_USED = Histogram(
+    "chat_budget_used_ratio", "Fraction of the turn deadline used by each stage.", ["stage"],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5),
+)
+SAFETY_REVIEWS = Counter("safety_reviews_total", "Safety reviews by tier.", ["tier"])
+
+BACKEND_LATENCY = Histogram(
+    "backend_request_duration_seconds", "Latency of calls to external backends.", ["backend"]
+)
+BACKEND_ERRORS = Counter("backend_errors_total", "Failed calls to external backends.", ["backend"])
+BACKEND_CIRCUIT_OPEN = Gauge("backend_circuit_open", "1 while a backend's circuit breaker is open.", ["backend"])
+VLLM_ROUTED = Counter(
+    "vllm_routed_total", "Generation requests routed to each vLLM endpoint.", ["endpoint", "reason"]
+)
+VLLM_ENDPOINT_HEALTHY = Gauge("vllm_endpoint_healthy", "1 while a vLLM endpoint is in rotation.", ["endpoint"])
+VLLM_ENDPOINT_OUTSTANDING = Gauge(
+    "vllm_endpoint_outstanding", "Generation requests in flight per vLLM endpoint.", ["endpoint"]
+)
+TTS_CACHE_HITS = Counter("tts_cache_hits_total", "Server-side TTS cache hits (memory or disk).")
+TTS_CACHE_MISSES = Counter("tts_cache_misses_total", "Server-side TTS cache misses.")
+KV_CACHE_LOOKUPS = Counter(
+    "kv_cache_lookups_total", "Per-session KV cache lookups on the local backend.", ["result"]
+)
+KV_CACHE_BYTES = Gauge("kv_cache_bytes", "Bytes held by the per-session KV cache.")
@@ -1,17 +1,31 @@
-from langchain_openai import OpenAI
+import asyncio
 import json
-import torch
 import re
+import time
 import requests
-import pdb
+from logger import elapsed_ms
+from http_clients import BackendClient
+from safety import FastReviewer, TieredReviewer
+from checker import Checker
+from prompt import PromptBuilder
+
+# 생성 결과가 상담사 발화로 보이지 않을 때 사용하는 고정 멘트
+FALLBACK_UTTERANCE = "그러시군요. 오늘 정말 수고하셨어요. 만약 증상이 계속된다면 전문가의 도움을 받는 것이 좋습니다. 당신은 혼자가 아니에요. 언제든지 도움이 필요하면 말씀해 주세요."
 
 
 class GeminiSafer:
     """Wrapper around the Gemini model that sanitizes counselor utterances."""
-    def __init__(self, config: dict, logger):
+    def __init__(self, config: dict, logger, prompt_builder=None, client=None):
         self.model = config["gemini_model_name"]    
         self.api_key = config["gemini_api_key"]
         self.logger = logger
+        # 앱 전체가 공유하는 keep-alive 연결 풀 + circuit breaker
+        self.client = client or BackendClient.from_config("gemini", config)
+        # 검토 프롬프트의 대화 이력에도 별도 토큰 예산 적용
+        self.prompt_builder = prompt_builder
+        self.history_budget = config.get("gemini_history_max_tokens", 2048)
+        # 벤치마크 등에서 로컬 stub 서버로 바꿔 끼울 수 있도록
+        self.base_url = config.get("gemini_base_url", "https://generativelanguage.googleapis.com/v1")
 
     def get_prompt(self, history, system):
         prompt = (
@@ -36,8 +50,12 @@ class GeminiSafer:
             "⚠️ Your entire response must be in Korean.\n\n"
             "Conversation History:\n"
         )
-        for msg in history:
-            prompt += f"{msg['role'].capitalize()}: {msg['message']}\n"
+        if self.prompt_builder is None:
+            for msg in history:
+                prompt += f"{msg['role'].capitalize()}: {msg['message']}\n"
+        else:
+            _, lines = self.prompt_builder.window(history, self.history_budget)
+            prompt += "".join(lines)
         prompt += f"Counselor: {system}\n"
         prompt += (
             "\nNow review the counselor's utterance. "
@@ -46,11 +64,11 @@ class GeminiSafer:
         )
         return prompt
 
-    def run(self, history, system):
-        prompt = self.get_prompt(history, system)
-        url = f"https://generativelanguage.googleapis.com/v1/models/{self.model}:generateContent"
-        headers = {"Content-Type": "application/json"}
-        body = {
+    def _url(self, method):
+        return f"{self.base_url}/models/{self.model}:{method}"
+
+    def _body(self, prompt):
+        return {
             "contents": [
                 {
                     "role": "user",
@@ -59,37 +77,93 @@ class GeminiSafer:
             ]
         }
 
-        try:
-            resp = requests.post(f"{url}?key={self.api_key}", headers=headers, json=body, timeout=30)
-            resp.raise_for_status()
-            data = resp.json()
-            self.logger.log_and_print("Original response: ", system)
-            self.logger.log_and_print(">>> Sanitized response: ", data["candidates"][0]["content"]["parts"][0]["text"])
-            return data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception as e:
-            self.logger.log_and_print("Gemini API error:", e, "\nRaw response:", getattr(e, "response", None))
-            # 안전한 fallback
-            return "상담을 종료합니다"
+    async def run(self, history, system):
+        prompt = self.get_prompt(history, system)
+        url = self._url("generateContent")
+        headers = {"Content-Type": "application/json"}
+        body = self._body(prompt)
+
+        # 오류는 호출자(TieredReviewer)가 degraded 경로로 처리
+        resp = await self.client.request(
+            "POST", url, params={"key": self.api_key}, headers=headers, json=body
+        )
+        data = resp.json()
+        self.logger.debug("Original response: ", system)
+        self.logger.debug(">>> Sanitized response: ", data["candidates"][0]["content"]["parts"][0]["text"])
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+
+    async def warmup(self, timeout=10):
+        """Cheap request to check the key and open the connection."""
+        await self.client.request(
+            "POST", self._url("generateContent"), params={"key": self.api_key},
+            json=self._body("Reply with OK."), timeout=timeout,
+        )
+
+    async def run_stream(self, history, system):
+        """
+        Streaming variant of `run` (``streamGenerateContent`` over SSE).
+
+        Yields ``("delta", text)`` for every chunk of the reviewed utterance
+        and finally ``("final", text)`` with the complete reviewed text.
+        Errors propagate (possibly after some deltas), so the caller must
+        always trust its own final event over the deltas.
+        """
+        prompt = self.get_prompt(history, system)
+        url = self._url("streamGenerateContent")
+        headers = {"Content-Type": "application/json"}
+        body = self._body(prompt)
+
+        parts = []
+        async with self.client.stream(
+            "POST", url, params={"alt": "sse", "key": self.api_key}, headers=headers, json=body,
+        ) as resp:
+            async for line in resp.aiter_lines():
+                if not line or not line.startswith("data:"):
+                    continue
+                chunk = json.loads(line[len("data:"):])
+                for part in chunk["candidates"][0]["content"].get("parts", []):
+                    text = part.get("text", "")
+                    if text:
+                        parts.append(text)
+                        yield ("delta", text)
+        sanitized = "".join(parts)
+        self.logger.debug("Original response: ", system)
+        self.logger.debug(">>> Sanitized response: ", sanitized)
+        yield ("final", sanitized)
         
 
 
 class Agent():
-    def __init__(self, demo_config):
+    def __init__(self, demo_config, logger=None):
         
+        self.config = demo_config
         self.use_vllm = demo_config.get("use_vllm", False)
+        # 생성이 상담사 턴 경계에서 멈추도록 (가짜 Client 턴 생성 방지)
+        self.stop_sequences = demo_config.get("stop_sequences", PromptBuilder.STOP_SEQUENCES)
         if self.use_vllm:
             vllm_port = demo_config.get("vllm_server_port", 8001)
             model_id=demo_config["vllm_model_name"]
-            vLLM_server=f"http://localhost:{vllm_port}/v1"
+            self.vllm_base_url = demo_config.get("vllm_base_url") or f"http://localhost:{vllm_port}"
+            # 여러 vLLM 서버로 수평 확장: 세션 affinity + 포화·장애 시 최소 부하 서버로
+            self.vllm_endpoints = demo_config.get("vllm_endpoints") or [self.vllm_base_url]
             
-            self.llm = OpenAI(
-                temperature=0.3,
-                openai_api_key='EMPTY',
-                openai_api_base=vLLM_server,
-                max_tokens=demo_config.get("max_new_tokens", 128), # token to "generate" not "input"
-                model=model_id
-            )
+            # 무거운 import 는 실제로 쓰는 백엔드에서만
+            from langchain_openai import OpenAI
+            from vllm_router import VLLMRouter
+
+            def make_client(url):
+                return OpenAI(
+                    temperature=0.3,
+                    openai_api_key='EMPTY',
+                    openai_api_base=f"{url}/v1",
+                    max_tokens=demo_config.get("max_new_tokens", 128), # token to "generate" not "input"
+                    model=model_id,
+                    # 재시도마다 timeout 이 새로 주어져 turn deadline 을 넘기므로 재시도하지 않음
+                    max_retries=0,
+                )
+            self.router = VLLMRouter.from_config(self.vllm_endpoints, make_client, demo_config, logger=logger)
         else:
+            import torch
             from transformers import AutoModelForCausalLM, AutoTokenizer
             model_path = demo_config["model_path"]
             self.llm = AutoModelForCausalLM.from_pretrained(model_path, trust_remote_code=True)
@@ -100,82 +174,323 @@ class Agent():
             self.tokenizer.pad_token = self.tokenizer.eos_token
             self.llm.eval()
             self.llm.to("cuda" if torch.cuda.is_available() else "cpu")
+            # 동시 요청을 짧은 창 동안 모아 한 번의 batched generate 로 처리
+            from batching import BatchScheduler
+            self.batcher = BatchScheduler.from_config(
+                self.llm, self.tokenizer, demo_config, stop_strings=self.stop_sequences, logger=logger
+            )
+    # vLLM /metrics 에서 prefix cache 카운터 이름: V1 엔진 (버전에 따라 gpu_ 접두어 유무가 다름) / 구버전 gauge
+    PREFIX_CACHE_HITS = ("vllm:gpu_prefix_cache_hits_total", "vllm:prefix_cache_hits_total")
+    PREFIX_CACHE_QUERIES = ("vllm:gpu_prefix_cache_queries_total", "vllm:prefix_cache_queries_total")
+    PREFIX_CACHE_HIT_RATE = "vllm:gpu_prefix_cache_hit_rate"
+
+    @classmethod
+    def parse_prefix_cache_metrics(cls, text):
+        """``{"hits", "queries"}`` or ``{"hit_rate"}`` from one server's ``/metrics`` text, or ``{}``."""
+        values = {}
+        for line in text.splitlines():
+            if not line or line.startswith("#"):
+                continue
+            name, _, value = line.rpartition(" ")
+            name = name.split("{", 1)[0]
+            values[name] = values.get(name, 0.0) + float(value)
+        # 한 서버가 두 이름을 모두 내보내도 한 번만 센다
+        for hits, queries in zip(cls.PREFIX_CACHE_HITS, cls.PREFIX_CACHE_QUERIES):
+            if queries in values:
+                return {"hits": values.get(hits, 0.0), "queries": values[queries]}
+        if cls.PREFIX_CACHE_HIT_RATE in values:
+            return {"hit_rate": values[cls.PREFIX_CACHE_HIT_RATE]}
+        return {}
+
+    def prefix_cache_stats(self):
+        """
+        Prefix-cache hit rate reported by the vLLM servers' ``/metrics``.
+
+        Returns cumulative ``hits``/``queries``/``hit_rate`` summed over the
+        endpoints that answered, plus the hit rate since the previous call
+        (``interval_hit_rate``); ``None`` when not using vLLM or the servers
+        do not expose the counters.
+        """
+        if not self.use_vllm:
+            return None
+        texts, error = [], None
+        for ep in self.router.endpoints:
+            try:
+                resp = requests.get(f"{ep.url}/metrics", timeout=5)
+                resp.raise_for_status()
+                texts.append(resp.text)
+            except requests.RequestException as e:
+                error = e
+        if not texts:
+            raise error
+        parsed = [self.parse_prefix_cache_metrics(text) for text in texts]
+        counters = [p for p in parsed if "queries" in p]
+        if counters:
+            hits = sum(p["hits"] for p in counters)
+            queries = sum(p["queries"] for p in counters)
+            prev_hits, prev_queries = getattr(self, "_prefix_cache_prev", (0.0, 0.0))
+            self._prefix_cache_prev = (hits, queries)
+            d_queries = queries - prev_queries
+            return {
+                "hits": hits,
+                "queries": queries,
+                "hit_rate": hits / queries if queries else 0.0,
+                "interval_hit_rate": (hits - prev_hits) / d_queries if d_queries > 0 else None,
+            }
+        rates = [p["hit_rate"] for p in parsed if "hit_rate" in p]
+        if rates:
+            return {"hit_rate": sum(rates) / len(rates)}
+        return None
+
+    def warmup(self, timeout=10):
+        """Run one tiny generation so the first real turn does not pay for it."""
+        if self.use_vllm:
+            self.router.warmup(timeout=timeout)
+        else:
+            import torch
+            inputs = self.tokenizer("Hello", return_tensors="pt").to(self.llm.device)
+            with torch.inference_mode():
+                self.llm.generate(**inputs, max_new_tokens=1, pad_token_id=self.tokenizer.pad_token_id)
+
     def generate(self):
         pass
 
+    def end_session(self, session_id):
+        """Release per-session backend state (local KV cache)."""
+        if not self.use_vllm:
+            self.batcher.release(session_id)
+
+
+# 생성 결과에 상담사 화자 라벨이 있어야 상담사 발화로 인정
+SPEAKER_LABEL = re.compile(r"counselor|상담사|assistant|客人", re.IGNORECASE)
 
+# 한 번의 치환으로 정리: Client 턴, [..]/(..) 주석, History·화자 라벨, 콜론
+UTTERANCE_NOISE = re.compile(
+    r"Client:.*?(?=\n[A-Za-z]+:|\Z)"
+    r"|\[[^\]]*\]|\([^)]*\)"
+    r"|[Hh]istory|[Cc]ounselor|[Aa]ssistant|상담사|客人"
+    r"|:",
+    re.DOTALL,
+)
 
-def remove_client_utterances(text: str) -> str:
+
+def normalize_utterance(text: str) -> str:
+    """Strip labels, stage directions and invented client turns; keep the first line."""
+    return UTTERANCE_NOISE.sub("", text).strip().split("\n", 1)[0]
+
+
+SENTENCE_BOUNDARY = re.compile(r"[.!?。…~](?=\s)")
+
+
+def stable_prefix(partial: str) -> tuple[str, bool]:
     """
-    Remove every utterance that begins with the speaker label `Client:`.
-
-    The pattern matches `Client:` and everything that follows it
-    **up to (but not including)** the next line that starts with another
-    speaker label such as `Counselor:` (or the end of the string).
-
-    Parameters
-    ----------
-    text : str
-        A dialogue transcript containing speaker labels
-        (e.g. “Counselor: …”, “Client: …”).
-
-    Returns
-    -------
-    str
-        The transcript with all `Client:` turns removed.
+    Part of the normalized utterance a streamed completion has already fixed.
+
+    Returns ``(text, complete)``: the utterance up to its last finished
+    sentence (later tokens cannot change it), and whether its first line,
+    i.e. the whole utterance, has ended.
     """
-    pattern = r"Client:.*?(?=\n[A-Za-z]+:|\Z)"   # DOTALL will make . match newlines
-    cleaned = re.sub(pattern, "", text, flags=re.DOTALL)
-    # Optional: collapse any blank lines left behind
-    cleaned = re.sub(r"\n{2,}", "\n", cleaned).strip()
-    return cleaned
+    text = UTTERANCE_NOISE.sub("", partial).lstrip()
+    # 닫히지 않은 괄호는 뒤에서 닫히며 앞부분까지 지울 수 있으므로 그 앞까지만
+    cut = min((i for i in (text.find("("), text.find("[")) if i >= 0), default=len(text))
+    text = text[:cut]
+    if "\n" in text:
+        return text.split("\n", 1)[0], True
+    ends = [m.end() for m in SENTENCE_BOUNDARY.finditer(text)]
+    return (text[:ends[-1]] if ends else ""), False
 
 
 class CounselorAgent(Agent):
-    def __init__(self,  demo_config, logger=None):
-        super().__init__(demo_config)
-        self.gem = GeminiSafer(demo_config, logger)
+    def __init__(self,  demo_config, logger=None, gemini_client=None):
+        super().__init__(demo_config, logger=logger)
         self.logger = logger
+        # 토큰 수는 메시지별로 캐시 → 최신부터 예산 안에서 history window 구성
+        tokenizer_path = demo_config.get("tokenizer_path") or (
+            demo_config["vllm_model_path"] if self.use_vllm else demo_config["model_path"]
+        )
+        self.checker = Checker(tokenizer_path, demo_config.get("max_model_length", 512))
+        if self.checker.tokenizer is None:
+            logger.warning(f"Tokenizer not found at {tokenizer_path}; using estimated token counts.")
+        self.prompt_builder = PromptBuilder.from_config(self.checker, demo_config)
+        self.gem = GeminiSafer(demo_config, logger, prompt_builder=self.prompt_builder, client=gemini_client)
+        # 1차 로컬 검토 → 위험/모호한 발화만 Gemini 로
+        self.reviewer = TieredReviewer(
+            FastReviewer.from_config(demo_config), self.gem, logger,
+            enabled=demo_config.get("safety_tiered", True),
+            fallback=FALLBACK_UTTERANCE,
+            degraded_mode=demo_config.get("review_degraded_mode", "fallback"),
+            min_budget=demo_config.get("review_min_budget", 1.0),
+        )
         
         
               
     def utt_prompt_template(self, history):
-        prompt ="Generate counselor's next utterance in korean.\n"
-        prompt +="History:\n"
-        for message in history[-10:]:
-            prompt += f"{message['role'].capitalize()}: {message['message']}\n"
-        return prompt
+        return self.prompt_builder.build(history)
         
     
-    def generate(self, history):
+    def draft(self, history, timings=None, session_id=None, deadline=None):
+        """
+        Generate and clean the raw counselor utterance (before Gemini review).
+
+        Returns ``(text, reviewed)``; ``reviewed`` is True when the text is
+        the fixed fallback reply, which must not be sent to Gemini.
+        Stage latencies are written into ``timings`` when given. With a
+        `Deadline`, the LLM call is bounded by the remaining budget and a
+        timeout or backend error yields the fallback reply.
+        """
+        timings = {} if timings is None else timings
+        start = time.perf_counter()
         prompt = self.utt_prompt_template( history)
-        if self.llm.__class__.__name__ == "OpenAI":
-            response = self.llm.invoke(prompt)
-        else:
-            # For transformers model
-            inputs = self.tokenizer(prompt, return_tensors="pt")
-            max_new_tokens = self.config.get("max_new_tokens", 128)
-            outputs = self.llm.generate(**inputs, max_new_tokens=max_new_tokens)
-            response = self.tokenizer.decode(outputs[0], skip_special_tokens=True)
-        # self.logger.log_and_print("prompt", prompt)
-        self.logger.log_and_print("prompt", prompt)
-
-        cleaned = response.strip()
-        lc = cleaned.lower()
-        if "counselor" not in lc and "상담사" not in lc and "assistant" not in lc and "客人" not in lc:
-            cleaned = "그러시군요. 오늘 정말 수고하셨어요. 만약 증상이 계속된다면 전문가의 도움을 받는 것이 좋습니다. 당신은 혼자가 아니에요. 언제든지 도움이 필요하면 말씀해 주세요."      
-            return cleaned  
-            
-            
-        cleaned = response.strip()
-        cleaned = remove_client_utterances(cleaned)
-        cleaned = cleaned.replace(":", "")
-        cleaned = re.sub(r'\[[^\]]*\]', '', cleaned)
-        cleaned = re.sub(r'\([^)]*\)', '', cleaned) 
-        cleaned= cleaned.replace("History:", "").replace("history:", "").replace("History","").replace("history","").replace("History", "").replace("history", "")
-        cleaned= cleaned.replace("Counselor", "").replace("counselor", "").replace("상담사", "").replace("Assistant", "").replace("assistant", "").replace("客人", "").replace("상담사", "")
-        cleaned = cleaned.strip()
-        cleaned = cleaned.split("\n")[0]
-        cleaned = self.gem.run(history, cleaned)
+        timeout = None if deadline is None else max(deadline.remaining(), 0.001)
+        try:
+            if self.use_vllm:
+                extra = {} if timeout is None else {"timeout": timeout}
+                response = self.router.invoke(prompt, session_id, stop=self.stop_sequences, **extra)
+            else:
+                # For transformers model (cross-session micro-batching)
+                response = self.batcher.submit(prompt, session_id, timeout=timeout)
+        except Exception as e:
+            if deadline is None:
+                raise
+            return self.degrade_draft(timings, start, deadline, e)
+        timings["llm_ms"] = elapsed_ms(start)
+        # 전체 프롬프트는 DEBUG 에서만 기록
+        self.logger.debug("prompt", prompt)
+        return self.clean_draft(response, timings)
+
+    def degrade_draft(self, timings, start, deadline, error):
+        """Fallback reply when the LLM call times out or fails within a deadline."""
+        timings["llm_ms"] = elapsed_ms(start)
+        timings["degraded"] = "llm_timeout" if deadline.expired() else "llm_error"
+        timings["fallback"] = True
+        self.logger.warning(f"LLM draft degraded ({timings['degraded']}): {error}")
+        return FALLBACK_UTTERANCE, True
+
+    def clean_draft(self, response, timings):
+        start = time.perf_counter()
+        if not SPEAKER_LABEL.search(response):
+            cleaned = FALLBACK_UTTERANCE
+            timings["cleanup_ms"] = elapsed_ms(start)
+            timings["fallback"] = True
+            return cleaned, True
+
+        cleaned = normalize_utterance(response)
+        timings["cleanup_ms"] = elapsed_ms(start)
+        return cleaned, False
+
+    async def stream_draft(self, history, timings, session_id=None, deadline=None):
+        """
+        Streaming `draft` over vLLM.
+
+        Yields ``("text", chunk)`` each time another sentence of the cleaned
+        utterance is finished (the chunks concatenate to a prefix of it),
+        then ``("draft", (text, reviewed))`` as `draft` would return. The
+        completion is closed as soon as the utterance's first line ends.
+        """
+        start = time.perf_counter()
+        prompt = self.utt_prompt_template(history)
+        self.logger.debug("prompt", prompt)
+        extra = {} if deadline is None else {"timeout": max(deadline.remaining(), 0.001)}
+        # 조각은 별도 task 가 받아 queue 로 넘김: 마감 시 task 를 취소해야
+        # 스트림(HTTP 연결)이 그 task 안에서 정상적으로 닫힌다
+        chunks = asyncio.Queue()
+
+        async def receive():
+            try:
+                async for chunk in self.router.astream(prompt, session_id, stop=self.stop_sequences, **extra):
+                    chunks.put_nowait(chunk)
+            finally:
+                chunks.put_nowait(None)
+
+        receiver = asyncio.create_task(receive())
+        response, sent = "", ""
+        try:
+            while True:
+                timeout = None if deadline is None else max(deadline.remaining(), 0.001)
+                chunk = await asyncio.wait_for(chunks.get(), timeout)
+                if chunk is None:
+                    await receiver      # 스트림 오류는 여기서 올라온다
+                    break
+                response += chunk
+                # 상담사 라벨이 보이기 전에는 fallback 일 수 있으므로 보내지 않음
+                if not SPEAKER_LABEL.search(response):
+                    continue
+                text, complete = stable_prefix(response)
+                if len(text) > len(sent) and text.startswith(sent):
+                    yield ("text", text[len(sent):])
+                    sent = text
+                if complete:
+                    break
+        except Exception as e:
+            if deadline is None:
+                raise
+            yield ("draft", self.degrade_draft(timings, start, deadline, e))
+            return
+        finally:
+            receiver.cancel()
+            await asyncio.gather(receiver, return_exceptions=True)
+        timings["llm_ms"] = elapsed_ms(start)
+        yield ("draft", self.clean_draft(response, timings))
+
+    async def generate(self, history, timings=None, session_id=None, deadline=None):
+        # LLM 호출은 블로킹 → 스레드에서, Gemini 검토는 공유 async 클라이언트로
+        cleaned, reviewed = await asyncio.to_thread(self.draft, history, timings, session_id, deadline)
+        if reviewed:
+            return cleaned
+        cleaned = await self.reviewer.run(history, cleaned, timings, deadline)
 
         return cleaned
+
+    async def generate_stream(self, history, timings=None, session_id=None, deadline=None):
+        """
+        Streaming variant of `generate`.
+
+        Yields ``("delta", text)`` chunks of the reviewed utterance, then
+        ``("final", text)`` with the complete reply, which the client must
+        show instead of the deltas. Only reviewed text is ever streamed:
+
+        * vLLM: each sentence of the draft is sent as soon as it is
+          generated and the local tier approves it. If a sentence is flagged,
+          streaming stops and the whole draft goes through the tiered review
+          (the final event then carries Gemini's version).
+        * turns whose client side already needs Gemini, and the local
+          transformers backend: the full draft's review (Gemini output or
+          the locally approved draft) is streamed as before.
+        """
+        timings = {} if timings is None else timings
+        if not self.use_vllm or self.reviewer.escalates_context(history):
+            cleaned, reviewed = await asyncio.to_thread(self.draft, history, timings, session_id, deadline)
+            if reviewed:
+                yield ("delta", cleaned)
+                yield ("final", cleaned)
+                return
+            async for event in self.reviewer.run_stream(history, cleaned, timings, deadline):
+                yield event
+            return
+
+        streamed, approved = "", True
+        async for kind, value in self.stream_draft(history, timings, session_id, deadline):
+            if kind == "text":
+                approved = approved and await self.reviewer.approve_sentence(value, timings)
+                if approved:
+                    streamed += value
+                    yield ("delta", value)
+            else:
+                cleaned, reviewed = value
+        if not streamed:
+            # 문장이 하나뿐이었거나 첫 문장부터 걸림 → 기존 경로
+            if reviewed:
+                yield ("delta", cleaned)
+                yield ("final", cleaned)
+                return
+            async for event in self.reviewer.run_stream(history, cleaned, timings, deadline):
+                yield event
+            return
+        if reviewed:
+            yield ("final", cleaned)
+            return
+        final = await self.reviewer.run(history, cleaned, timings, deadline)
+        # 그대로 승인되면 아직 보내지 않은 뒷부분만 보낸다
+        if final == cleaned and cleaned.startswith(streamed) and len(cleaned) > len(streamed):
+            yield ("delta", cleaned[len(streamed):])
+        yield ("final", final)
@@ -0,0 +1,101 @@
+class PromptBuilder:
+    """
+    Builds the counselor-generation prompt within a token budget.
+
+    Layouts:
+        ``"sliding"``       – messages are added from newest to oldest while
+                              they fit in ``budget`` tokens (header included).
+        ``"prefix_stable"`` – the window start (anchor) stays put, so each
+                              turn's prompt extends the previous one and vLLM
+                              can reuse its prefix cache. Only when the budget
+                              runs out is the anchor moved forward, in one
+                              large step, leaving the window ``reanchor_fill``
+                              full so it can grow again for several turns.
+
+    Per-message counts come from the `Checker` cache, so each message is
+    tokenized only once per process.
+    """
+    HEADER = "Generate counselor's next utterance in korean.\nHistory:\n"
+    # 상담사 발화가 끝나는 지점: 다음 화자 라벨이나 빈 줄
+    STOP_SEQUENCES = ["Client:", "client:", "History:", "\n\n"]
+    LAYOUTS = ("sliding", "prefix_stable")
+
+    def __init__(self, checker, budget, layout="sliding", reanchor_fill=0.5):
+        if layout not in self.LAYOUTS:
+            raise ValueError(f"layout must be one of {self.LAYOUTS}, got {layout!r}")
+        self.checker = checker
+        self.budget = budget
+        self.layout = layout
+        self.reanchor_fill = reanchor_fill
+
+    @classmethod
+    def from_config(cls, checker, config: dict):
+        # 입력 + 생성 토큰이 max_model_length 를 넘지 않도록 (BOS 등 여유분 포함)
+        budget = (
+            config.get("max_model_length", 512)
+            - config.get("max_new_tokens", 128)
+            - config.get("prompt_margin_tokens", 8)
+        )
+        return cls(
+            checker, budget,
+            layout=config.get("prompt_layout", "sliding"),
+            reanchor_fill=config.get("prompt_reanchor_fill", 0.5),
+        )
+
+    @staticmethod
+    def line(message):
+        return f"{message['role'].capitalize()}: {message['message']}\n"
+
+    def window(self, history, budget, header=""):
+        """
+        Return ``(start, lines)``: the largest suffix ``history[start:]`` that
+        fits in `budget` tokens after `header`, already formatted as lines.
+        The newest message is always kept (truncated from the left if needed).
+        """
+        remaining = budget - self.checker.count(header)
+        lines = []
+        start = len(history)
+        for i in range(len(history) - 1, -1, -1):
+            line = self.line(history[i])
+            n = self.checker.count(line)
+            if n > remaining:
+                if not lines:
+                    lines.append(self.checker.truncate_left(line, max(remaining, 0)))
+                    start = i
+                break
+            lines.append(line)
+            remaining -= n
+            start = i
+        lines.reverse()
+        return start, lines
+
+    def stable_start(self, history, budget, header=""):
+        """
+        Anchor of the prefix-stable window for `history`.
+
+        The anchor is derived by replaying the dialog one message at a time,
+        so it is a pure function of the history: every worker computes the
+        same prompt for a session without storing any per-session state.
+        """
+        available = budget - self.checker.count(header)
+        target = available * self.reanchor_fill
+        counts = [self.checker.count(self.line(m)) for m in history]
+
+        anchor, used = 0, 0
+        for n, c in enumerate(counts):
+            used += c
+            if used <= available:
+                continue
+            # 예산 초과 → 창이 reanchor_fill 이하가 될 때까지 한 번에 크게 이동
+            while anchor < n and used > target:
+                used -= counts[anchor]
+                anchor += 1
+        return anchor
+
+    def build(self, history):
+        if self.layout == "sliding":
+            _, lines = self.window(history, self.budget, self.HEADER)
+        else:
+            start = self.stable_start(history, self.budget, self.HEADER)
+            _, lines = self.window(history[start:], self.budget, self.HEADER)
+        return self.HEADER + "".join(lines)
@@ -0,0 +1,260 @@
+import asyncio
+import re
+import threading
+import time
+from dataclasses import dataclass
+
+from logger import elapsed_ms
+
+
+@dataclass
+class ReviewDecision:
+    escalate: bool      # True → Gemini 검토 필요
+    reason: str
+
+
+class FastReviewer:
+    """
+    Tier-1 in-process reviewer for counselor utterances.
+
+    A rule/keyword engine (plus an optional small CPU text classifier)
+    that approves clearly safe utterances immediately and escalates anything
+    risky or ambiguous to `GeminiSafer`. It never rewrites text; it only
+    decides whether the remote review is needed.
+    """
+
+    # 위기 신호: 상담사·내담자 어느 쪽에 나타나도 Gemini 검토로 넘긴다
+    RISK_PATTERNS = [
+        r"자살", r"자해", r"죽(고|을|는|어|음|겠)", r"목숨", r"유서", r"끝내(고|버리)",
+        r"베(었|고|는)", r"칼", r"피가", r"뛰어내", r"목을\s*매",
+        r"과다\s*복용", r"수면제", r"약을\s*(많이|먹)", r"술을", r"마약",
+        r"때리", r"폭행", r"학대", r"위협",
+        r"숨을\s*못\s*쉬", r"의식", r"쓰러", r"가슴이\s*(조여|아파|너무)", r"심장마비",
+        r"suicid", r"kill", r"die\b",
+    ]
+    # 진단·처방 등 상담사가 하면 안 되는 발화
+    ADVICE_PATTERNS = [
+        r"진단", r"처방", r"복용", r"mg\b", r"약(을|은|이)", r"병원에\s*가지\s*마",
+    ]
+    # 내담자가 안정되었다는 신호 → 세션 종료 판단은 Gemini 몫
+    CLOSING_PATTERNS = [
+        r"괜찮아(졌|진)", r"나아(졌|진)", r"진정(됐|되었|이\s*됐)", r"편안해", r"고마워", r"감사(해|합)",
+        r"그만", r"종료",
+    ]
+    # 생성 잔재: 다른 언어, 화자 라벨, 깨진 기호
+    ARTIFACT_PATTERN = re.compile(r"[A-Za-z]{3,}|[一-鿿]|[:\[\]{}<>#*_]|(.{4,})\1{2,}")
+    HANGUL_PATTERN = re.compile(r"[가-힣]")
+
+    def __init__(self, min_chars=5, max_chars=200, classifier_path=None,
+                 classifier_safe_label="safe", classifier_threshold=0.9):
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.risk_re = re.compile("|".join(self.RISK_PATTERNS), re.IGNORECASE)
+        self.advice_re = re.compile("|".join(self.ADVICE_PATTERNS), re.IGNORECASE)
+        self.closing_re = re.compile("|".join(self.CLOSING_PATTERNS))
+        self.classifier = None
+        self.classifier_safe_label = classifier_safe_label
+        self.classifier_threshold = classifier_threshold
+        if classifier_path:
+            # 선택 사항: CPU 소형 분류기 (transformers 필요)
+            from transformers import pipeline
+            self.classifier = pipeline("text-classification", model=classifier_path, device=-1)
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            min_chars=config.get("safety_min_chars", 5),
+            max_chars=config.get("safety_max_chars", 200),
+            classifier_path=config.get("safety_classifier_path"),
+            classifier_safe_label=config.get("safety_classifier_safe_label", "safe"),
+            classifier_threshold=config.get("safety_classifier_threshold", 0.9),
+        )
+
+    def review_context(self, history) -> ReviewDecision:
+        """
+        Client-side checks: decided before the counselor utterance exists.
+
+        Risk keywords are searched in every client message of the session,
+        so once a crisis signal appeared (e.g. self-harm, then "네") all
+        later turns keep going to Gemini with the full context.
+        """
+        client = [m["message"] for m in history if m["role"].lower() == "client"]
+        if any(self.risk_re.search(message) for message in client):
+            return ReviewDecision(True, "client risk keyword")
+        if client and self.closing_re.search(client[-1]):
+            return ReviewDecision(True, "client may be stabilized")
+        return ReviewDecision(False, "context passed")
+
+    def _review_text(self, text) -> ReviewDecision:
+        # 발화 일부(문장)에도 그대로 성립하는 규칙
+        if not self.HANGUL_PATTERN.search(text):
+            return ReviewDecision(True, "no korean text")
+        if self.risk_re.search(text):
+            return ReviewDecision(True, "counselor risk keyword")
+        if self.advice_re.search(text):
+            return ReviewDecision(True, "medical advice")
+        if self.ARTIFACT_PATTERN.search(text):
+            return ReviewDecision(True, "generation artifact")
+        return ReviewDecision(False, "rules passed")
+
+    def _classify(self, text) -> ReviewDecision:
+        if self.classifier is not None:
+            pred = self.classifier(text, truncation=True)[0]
+            if pred["label"] != self.classifier_safe_label or pred["score"] < self.classifier_threshold:
+                return ReviewDecision(True, f"classifier {pred['label']}:{pred['score']:.2f}")
+        return ReviewDecision(False, "rules passed")
+
+    def review_sentence(self, sentence) -> ReviewDecision:
+        """Checks one finished sentence of a streamed utterance before it is sent."""
+        decision = self._review_text(sentence.strip())
+        return decision if decision.escalate else self._classify(sentence.strip())
+
+    def review(self, history, system) -> ReviewDecision:
+        text = system.strip()
+        decision = self.review_context(history)
+        if decision.escalate:
+            return decision
+        if not (self.min_chars <= len(text) <= self.max_chars):
+            return ReviewDecision(True, f"length {len(text)}")
+        decision = self._review_text(text)
+        if decision.escalate:
+            return decision
+        if any(m["message"].strip() == text for m in history if m["role"].lower() == "counselor"):
+            return ReviewDecision(True, "repeated utterance")
+        return self._classify(text)
+
+
+class TieredReviewer:
+    """
+    Runs `FastReviewer` first and calls `GeminiSafer` only for flagged turns.
+
+    Exposes the same `run` / `run_stream` interface as `GeminiSafer`, and logs
+    the tier decision, its reason and latency per turn together with the
+    running escalation rate. With a turn `Deadline`, the Gemini review is
+    bounded by the remaining budget and falls back to a degraded reply
+    (``degraded_mode``) on timeout or error instead of ending the session.
+    """
+    def __init__(self, fast: FastReviewer, gem, logger, enabled=True,
+                 fallback="", degraded_mode="fallback", min_budget=1.0):
+        self.fast = fast
+        self.gem = gem
+        self.logger = logger
+        self.enabled = enabled
+        # 검토가 예산 안에 끝나지 못하거나 실패했을 때: 고정 멘트(fallback) 또는 초안(draft)
+        self.fallback = fallback
+        self.degraded_mode = degraded_mode
+        self.min_budget = min_budget
+        self._lock = threading.Lock()
+        self.total = 0
+        self.escalated = 0
+
+    def decide(self, history, system, timings) -> ReviewDecision:
+        if not self.enabled:
+            decision = ReviewDecision(True, "tiering disabled")
+            timings["review_tier"] = "gemini"
+            return decision
+        start = time.perf_counter()
+        decision = self.fast.review(history, system)
+        # 스트리밍 턴은 문장별 검토 시간이 이미 들어 있음
+        timings["safety_local_ms"] = timings.get("safety_local_ms", 0.0) + elapsed_ms(start)
+
+        with self._lock:
+            self.total += 1
+            self.escalated += int(decision.escalate)
+            rate = self.escalated / self.total
+        timings["review_tier"] = "gemini" if decision.escalate else "local"
+        self.logger.event(
+            "safety review",
+            tier=timings["review_tier"], reason=decision.reason,
+            local_ms=timings["safety_local_ms"],
+            escalation_rate=round(rate, 4), escalated=self.escalated, reviewed=self.total,
+        )
+        return decision
+
+    def escalates_context(self, history) -> bool:
+        """True when the client side alone already sends the turn to Gemini."""
+        return not self.enabled or self.fast.review_context(history).escalate
+
+    async def approve_sentence(self, sentence, timings) -> bool:
+        """Local check of one streamed sentence; False → stop streaming, review the whole reply."""
+        start = time.perf_counter()
+        if self.fast.classifier is not None:
+            decision = await asyncio.to_thread(self.fast.review_sentence, sentence)
+        else:
+            decision = self.fast.review_sentence(sentence)
+        timings["safety_local_ms"] = timings.get("safety_local_ms", 0.0) + elapsed_ms(start)
+        if decision.escalate:
+            self.logger.event("safety review", tier="sentence", reason=decision.reason)
+        return not decision.escalate
+
+    async def _decide(self, history, system, timings):
+        # 로컬 분류기는 CPU 추론이므로 이벤트 루프 밖에서
+        if self.fast.classifier is not None:
+            return await asyncio.to_thread(self.decide, history, system, timings)
+        return self.decide(history, system, timings)
+
+    def degrade(self, system, timings, reason, error=None):
+        """Reply used when the review cannot finish in the turn's budget or fails."""
+        timings["degraded"] = reason
+        self.logger.warning(f"Gemini review degraded ({reason}): {error or ''}".rstrip(": "))
+        return system if self.degraded_mode == "draft" else self.fallback
+
+    def _review_timeout(self, deadline):
+        # None → 예산 없음; 너무 적게 남았으면 Gemini 를 아예 부르지 않음
+        if deadline is None:
+            return None
+        remaining = deadline.remaining()
+        return remaining if remaining >= self.min_budget else 0.0
+
+    async def run(self, history, system, timings=None, deadline=None):
+        timings = {} if timings is None else timings
+        if not (await self._decide(history, system, timings)).escalate:
+            return system
+        timeout = self._review_timeout(deadline)
+        if timeout == 0.0:
+            return self.degrade(system, timings, "no_budget")
+        start = time.perf_counter()
+        try:
+            reviewed = await asyncio.wait_for(self.gem.run(history, system), timeout)
+        except asyncio.TimeoutError:
+            reviewed = self.degrade(system, timings, "review_timeout")
+        except Exception as e:
+            reviewed = self.degrade(system, timings, "review_error", e)
+        timings["gemini_ms"] = elapsed_ms(start)
+        return reviewed
+
+    async def run_stream(self, history, system, timings=None, deadline=None):
+        """
+        Streaming `run`. If the review stops early (deadline or error) after
+        some deltas were sent, the final event carries the degraded reply,
+        which the client must show instead of the partial text.
+        """
+        timings = {} if timings is None else timings
+        if not (await self._decide(history, system, timings)).escalate:
+            yield ("delta", system)
+            yield ("final", system)
+            return
+        timeout = self._review_timeout(deadline)
+        if timeout == 0.0:
+            yield ("final", self.degrade(system, timings, "no_budget"))
+            return
+        start = time.perf_counter()
+        stream = self.gem.run_stream(history, system)
+        try:
+            while True:
+                if deadline is not None:
+                    timeout = deadline.remaining()
+                try:
+                    kind, text = await asyncio.wait_for(stream.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                if kind == "delta" and "gemini_first_ms" not in timings:
+                    timings["gemini_first_ms"] = elapsed_ms(start)
+                yield (kind, text)
+        except asyncio.TimeoutError:
+            yield ("final", self.degrade(system, timings, "review_timeout"))
+        except Exception as e:
+            yield ("final", self.degrade(system, timings, "review_error", e))
+        finally:
+            await stream.aclose()
+            timings["gemini_ms"] = elapsed_ms(start)
@@ -0,0 +1,234 @@
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+
+from cachetools import TTLCache
+
+
+class TurnInProgress(Exception):
+    """Raised when a session already has a turn in flight."""
+
+
+class SessionStore(ABC):
+    """
+    Interface for per-session chat state (``{"cnt", "history", "journaled"}``).
+
+    State is copied in and out: callers `get` a session, modify it and `put`
+    it back, so a turn first claims its session (`claim_turn`) and releases
+    it when the updated state is stored; a concurrent turn is refused.
+    Sessions that expire (or are evicted for capacity) are handed to
+    ``on_expire(session_id, state)`` exactly once so they can be archived.
+    Backends implement every abstract method; an incomplete one fails when
+    it is instantiated.
+    """
+    def __init__(self, ttl, on_expire=None):
+        self.ttl = ttl
+        self.on_expire = on_expire or (lambda session_id, state: None)
+
+    @abstractmethod
+    def get(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def put(self, session_id: str, state: dict):
+        ...
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        """Remove a session without archiving it (the caller already did)."""
+
+    @abstractmethod
+    def sweep(self):
+        """Archive and drop every expired session."""
+
+    @abstractmethod
+    def claim_turn(self, session_id: str) -> bool:
+        """Mark a turn of `session_id` in flight; False if one already is."""
+
+    @abstractmethod
+    def release_turn(self, session_id: str):
+        ...
+
+    @abstractmethod
+    def __len__(self):
+        ...
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+
+class _ArchivingTTLCache(TTLCache):
+    """TTLCache that reports expired and capacity-evicted items."""
+    def __init__(self, maxsize, ttl, on_evict):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self._on_evict = on_evict
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        for key, value in expired:
+            self._on_evict(key, value)
+        return expired
+
+    def popitem(self):
+        key, value = super().popitem()
+        self._on_evict(key, value)
+        return key, value
+
+
+class MemorySessionStore(SessionStore):
+    """In-process TTL cache. Fast, but only valid for a single worker."""
+    def __init__(self, ttl=1800, maxsize=10000, on_expire=None):
+        super().__init__(ttl, on_expire)
+        self._lock = threading.RLock()
+        self._cache = _ArchivingTTLCache(maxsize, ttl, self._archive)
+        self._turns = set()
+
+    def _archive(self, session_id, state):
+        self.on_expire(session_id, state)
+
+    def get(self, session_id):
+        with self._lock:
+            state = self._cache.get(session_id)
+            return json.loads(json.dumps(state)) if state is not None else None
+
+    def put(self, session_id, state):
+        with self._lock:
+            self._cache[session_id] = json.loads(json.dumps(state))
+
+    def delete(self, session_id):
+        with self._lock:
+            self._cache.pop(session_id, None)
+
+    def sweep(self):
+        with self._lock:
+            self._cache.expire()
+
+    def claim_turn(self, session_id):
+        with self._lock:
+            if session_id in self._turns:
+                return False
+            self._turns.add(session_id)
+            return True
+
+    def release_turn(self, session_id):
+        with self._lock:
+            self._turns.discard(session_id)
+
+    def __len__(self):
+        with self._lock:
+            self._cache.expire()
+            return len(self._cache)
+
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Shared local store backed by SQLite in WAL mode.
+
+    Every uvicorn worker (or separate process) on the host opens the same
+    database file, so any of them can serve any session. Expired rows are
+    claimed with a conditional DELETE, so exactly one worker archives each.
+    Turn claims are rows of a second table; a claim older than `turn_lease`
+    seconds (its worker died mid-turn) is taken over.
+    """
+    def __init__(self, path, ttl=1800, on_expire=None, busy_timeout=5.0, turn_lease=120.0):
+        super().__init__(ttl, on_expire)
+        self.path = str(path)
+        self.busy_timeout = busy_timeout
+        self.turn_lease = turn_lease
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " session_id TEXT PRIMARY KEY,"
+            " state TEXT NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS sessions_updated ON sessions(updated_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS turns ("
+            " session_id TEXT PRIMARY KEY,"
+            " claimed_at REAL NOT NULL)"
+        )
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _claim(self, session_id, state_json, updated_at):
+        """Delete an expired row if still unchanged; archive it if we won."""
+        cur = self._conn().execute(
+            "DELETE FROM sessions WHERE session_id = ? AND updated_at = ?",
+            (session_id, updated_at),
+        )
+        if cur.rowcount == 1:
+            self.on_expire(session_id, json.loads(state_json))
+
+    def get(self, session_id):
+        row = self._conn().execute(
+            "SELECT state, updated_at FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        state_json, updated_at = row
+        if updated_at < time.time() - self.ttl:
+            self._claim(session_id, state_json, updated_at)
+            return None
+        return json.loads(state_json)
+
+    def put(self, session_id, state):
+        self._conn().execute(
+            "INSERT INTO sessions (session_id, state, updated_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(session_id) DO UPDATE SET state = excluded.state, updated_at = excluded.updated_at",
+            (session_id, json.dumps(state, ensure_ascii=False), time.time()),
+        )
+
+    def delete(self, session_id):
+        self._conn().execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+    def sweep(self):
+        rows = self._conn().execute(
+            "SELECT session_id, state, updated_at FROM sessions WHERE updated_at < ?",
+            (time.time() - self.ttl,),
+        ).fetchall()
+        for session_id, state_json, updated_at in rows:
+            self._claim(session_id, state_json, updated_at)
+
+    def claim_turn(self, session_id):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            "DELETE FROM turns WHERE session_id = ? AND claimed_at < ?",
+            (session_id, now - self.turn_lease),
+        )
+        cur = conn.execute(
+            "INSERT OR IGNORE INTO turns (session_id, claimed_at) VALUES (?, ?)", (session_id, now)
+        )
+        return cur.rowcount == 1
+
+    def release_turn(self, session_id):
+        self._conn().execute("DELETE FROM turns WHERE session_id = ?", (session_id,))
+
+    def __len__(self):
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM sessions WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+
+
+def create_session_store(config: dict, default_db_path, on_expire=None) -> SessionStore:
+    backend = config.get("session_store", "memory")
+    ttl = config.get("session_ttl", 1800)
+    if backend == "memory":
+        return MemorySessionStore(ttl=ttl, maxsize=config.get("session_maxsize", 10000), on_expire=on_expire)
+    if backend == "sqlite":
+        return SQLiteSessionStore(
+            config.get("session_db_path", default_db_path), ttl=ttl, on_expire=on_expire,
+            turn_lease=config.get("session_turn_lease", 120),
+        )
+    raise ValueError(f"Unknown session_store backend: {backend!r}")
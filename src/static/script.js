@@ -1,5 +1,6 @@
 /* Panic Counseling Chat – frontend logic (text + voice + bot TTS)
-   v11: Web Speech API 제거 → MediaRecorder + inline TTS only */
+   v12: /ws 세션 채널 – 녹음 조각 실시간 업로드, 전사·답변·TTS 를 같은 소켓으로 수신
+        (소켓이 없으면 기존 HTTP 경로로 동작) */
 
 // --------------------------------------------------
 // GLOBAL STATE
@@ -9,6 +10,9 @@ let session_id  = null;
 let mediaRecorder = null;
 let audioChunks   = [];
 let isRecording   = false;
+let ws            = null;   // /ws 세션 채널 (열려 있을 때만 사용)
+let wsTurn        = null;   // 진행 중인 소켓 턴 { bubble, textEl }
+let greeted       = false;
 
 // --------------------------------------------------
 // CONFIG
@@ -29,9 +33,16 @@ const $chat = () => document.getElementById("chat-box");
 // TTS (inline)  ------------------------------------
 // --------------------------------------------------
 const ttsCache = new Map();
+const SENTENCE_END = /[.!?。…~]\s+\S/;
 async function playTTS(text) {
   if (!text.trim()) return;
   if (ttsCache.has(text)) return new Audio(ttsCache.get(text)).play();
+  // 여러 문장이면 서버가 문장 단위로 합성·스트리밍 → 첫 문장부터 바로 재생
+  // (스트림은 중간에 끊길 수 있어 URL 을 캐시하지 않음; 다시 재생하면 서버 캐시에서 받아옴)
+  if (SENTENCE_END.test(text)) {
+    const url = `/tts?stream=true&text=${encodeURIComponent(text)}`;
+    return new Audio(url).play().catch(e => console.error("TTS stream error", e));
+  }
   try {
     const res = await fetch(`/tts?text=${encodeURIComponent(text)}`);
     if (!res.ok) throw new Error(res.status);
@@ -42,6 +53,22 @@ async function playTTS(text) {
   } catch (e) { console.error("TTS fetch error", e); }
 }
 
+// 소켓으로 받은 문장 단위 오디오를 순서대로 재생
+const audioQueue = [];
+let audioPlaying = false;
+function enqueueAudio(buf) {
+  audioQueue.push(URL.createObjectURL(new Blob([buf], { type: "audio/mpeg" })));
+  if (!audioPlaying) playNextAudio();
+}
+function playNextAudio() {
+  const url = audioQueue.shift();
+  if (!url) { audioPlaying = false; return; }
+  audioPlaying = true;
+  const audio = new Audio(url);
+  audio.onended = audio.onerror = () => { URL.revokeObjectURL(url); playNextAudio(); };
+  audio.play().catch(() => { URL.revokeObjectURL(url); playNextAudio(); });
+}
+
 // --------------------------------------------------
 // RECORDING UI -------------------------------------
 // --------------------------------------------------
@@ -64,9 +91,19 @@ async function startMediaRecorder() {
   if (!stream) return false;
 
   mediaRecorder = new MediaRecorder(stream);
-  mediaRecorder.ondataavailable = e => audioChunks.push(e.data);
+  mediaRecorder.ondataavailable = e => {
+    // 소켓이 열려 있으면 말하는 동안 조각을 바로 전송 (서버가 실시간 변환)
+    if (wsOpen()) { if (e.data.size) ws.send(e.data); }
+    else audioChunks.push(e.data);
+  };
   mediaRecorder.onstop = async () => {
     setRecordUI(false);
+    if (wsOpen()) {
+      // 전사 → 답변 → TTS 가 같은 소켓으로 이어서 도착
+      ws.send(JSON.stringify({ type: "audio_end", reply: true, tts: true }));
+      beginWSTurn();
+      return;
+    }
     const blob = new Blob(audioChunks, { type: "audio/webm" });
     audioChunks = [];
     const fd = new FormData();
@@ -78,16 +115,23 @@ async function startMediaRecorder() {
     } catch (err) { console.error("ASR upload error", err); }
   };
 
-  mediaRecorder.start();
-  setRecordUI(true);
+  startRecording();
   return true;
 }
 
+function startRecording() {
+  if (wsOpen()) {
+    ws.send(JSON.stringify({ type: "audio_start" }));
+    mediaRecorder.start(250);   // 250 ms 마다 조각 전송
+  } else mediaRecorder.start();
+  setRecordUI(true);
+}
+
 async function toggleRecording() {
   if (!isRecording && !$box().disabled) $box().value = "";
   if (!mediaRecorder) await startMediaRecorder();
   else if (mediaRecorder.state === "recording") mediaRecorder.stop();
-  else { mediaRecorder.start(); setRecordUI(true); }
+  else if (!isWaiting) startRecording();
 }
 
 // --------------------------------------------------
@@ -103,32 +147,170 @@ function appendMessage(role, msg, suppressTTS = false) {
 
 function handleKey(e) { if (e.key === "Enter" && !e.shiftKey) { e.preventDefault(); if (!e.repeat) sendMessage(); } }
 
-async function sendMessage() {
-  const msg = $box().value.trim(); if (!msg || isWaiting) return; isWaiting = true;
-  const sendBtn = document.getElementById("send-button");
-  [$box(), sendBtn].forEach(el => { el.disabled = true; el.style.opacity = 0.6; });
+// SSE 파서: fetch 응답 body에서 {event, data} 를 순서대로 꺼낸다
+async function* readSSE(res) {
+  const reader = res.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = "";
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buf += decoder.decode(value, { stream: true });
+    let idx;
+    while ((idx = buf.indexOf("\n\n")) >= 0) {
+      const raw = buf.slice(0, idx); buf = buf.slice(idx + 2);
+      let event = "message", data = "";
+      raw.split("\n").forEach(line => {
+        if (line.startsWith("event:")) event = line.slice(6).trim();
+        else if (line.startsWith("data:")) data += line.slice(5).trim();
+      });
+      yield { event, data: data ? JSON.parse(data) : {} };
+    }
+  }
+}
 
-  appendMessage("user", msg);
+function showTyping() {
   const loadId = `load-${Date.now()}`;
   $chat().insertAdjacentHTML("beforeend", `<div id="${loadId}" class="bot-msg italic text-gray-500">Bot is typing<span class="typing-dots"></span></div>`);
+  return loadId;
+}
+
+function setInputEnabled(on) {
+  const sendBtn = document.getElementById("send-button");
+  [$box(), sendBtn].forEach(el => { el.disabled = !on; el.style.opacity = on ? 1 : 0.6; });
+}
+
+function showReply(bubble, data) {
+  // 최종 응답이 항상 기준 (종료 멘트·fallback 으로 교체될 수 있음)
+  bubble.remove();
+  appendMessage("bot", data.system_utterance, wsOpen());
+  if (!data.end_signal) {
+    setInputEnabled(true);
+    $box().focus();
+  } else {
+    $box().placeholder = "상담이 종료되었습니다.";
+    document.getElementById("restart-button").classList.remove("hidden");
+  }
+}
+
+function appendDelta(turn, text) {
+  if (!turn.textEl) {
+    turn.bubble.className = "bot-msg";
+    turn.bubble.innerHTML = "<strong>Bot:</strong> <span></span>";
+    turn.textEl = turn.bubble.querySelector("span");
+  }
+  turn.textEl.textContent += text;
+  $chat().scrollTop = $chat().scrollHeight;
+}
+
+// --------------------------------------------------
+// WEBSOCKET SESSION CHANNEL ------------------------
+// --------------------------------------------------
+const wsOpen = () => ws !== null && ws.readyState === WebSocket.OPEN;
+
+function beginWSTurn() {
+  isWaiting = true;
+  setInputEnabled(false);
+  wsTurn = { bubble: document.getElementById(showTyping()), textEl: null };
+}
+
+function endWSTurn() { wsTurn = null; isWaiting = false; }
+
+function onWSMessage(msg) {
+  switch (msg.type) {
+    case "status":
+      if (msg.ready && !greeted) {
+        greeted = true;
+        appendMessage("bot", "안녕하세요, 공황 응급 지원입니다. 어떻게 도와드릴까요?", true);
+      }
+      break;
+    case "session":
+      session_id = msg.session_id;
+      sessionStorage.setItem("session_id", session_id);
+      break;
+    case "transcript":
+      if (!wsTurn) break;
+      if (!msg.text) { wsTurn.bubble.remove(); setInputEnabled(true); endWSTurn(); break; }
+      wsTurn.bubble.insertAdjacentHTML("beforebegin", `<div class="user-msg self-end"><strong>You:</strong> ${msg.text}</div>`);
+      break;
+    case "delta":
+      if (wsTurn) appendDelta(wsTurn, msg.text);
+      break;
+    case "reply":
+      if (wsTurn) showReply(wsTurn.bubble, msg);
+      endWSTurn();
+      break;
+    case "busy":
+    case "error":
+      if (wsTurn) {
+        wsTurn.bubble.innerText = msg.type === "busy"
+          ? `⚠️ 접속자가 많습니다. ${msg.retry_after}초 후 다시 보내주세요.` : "⚠️ 오류";
+        setInputEnabled(true);
+      }
+      console.error("ws", msg);
+      endWSTurn();
+      break;
+  }
+}
+
+function connectWS() {
+  const proto = location.protocol === "https:" ? "wss" : "ws";
+  const sock = new WebSocket(`${proto}://${location.host}/ws`);
+  sock.binaryType = "arraybuffer";
+  sock.onopen = () => { ws = sock; sock.send(JSON.stringify({ type: "hello", session_id })); };
+  sock.onmessage = e => typeof e.data === "string" ? onWSMessage(JSON.parse(e.data)) : enqueueAudio(e.data);
+  sock.onclose = () => {
+    if (ws === sock) ws = null;
+    if (wsTurn) { wsTurn.bubble.innerText = "⚠️ 연결이 끊겼습니다"; setInputEnabled(true); endWSTurn(); }
+    setTimeout(connectWS, 3000);
+  };
+}
+
+async function sendMessage() {
+  const msg = $box().value.trim(); if (!msg || isWaiting) return;
+
+  appendMessage("user", msg);
   $box().value = ""; $box().placeholder = PH_DEFAULT;
+  if (wsOpen()) {
+    beginWSTurn();
+    ws.send(JSON.stringify({ type: "chat", text: msg, tts: true }));
+    return;
+  }
+
+  isWaiting = true;
+  setInputEnabled(false);
+  const loadId = showTyping();
 
   try {
-    const res = await fetch("/chat", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ session_id, user_utterance: msg }) });
-    const data = await res.json();
-    document.getElementById(loadId).remove();
-    appendMessage("bot", data.system_utterance);
-    if (!data.end_signal) {
-      [$box(), sendBtn].forEach(el => { el.disabled = false; el.style.opacity = 1; });
-      $box().focus();
-    } else {
-      $box().placeholder = "상담이 종료되었습니다.";
-      document.getElementById("restart-button").classList.remove("hidden");
+    const res = await fetch("/chat-stream", { method: "POST", headers: { "Content-Type": "application/json" }, body: JSON.stringify({ session_id, user_utterance: msg }) });
+    if (res.status === 503) {
+      const wait = res.headers.get("Retry-After") || "몇";
+      document.getElementById(loadId).innerText = `⚠️ 접속자가 많습니다. ${wait}초 후 다시 보내주세요.`;
+      setInputEnabled(true);
+      $box().value = msg;
+      isWaiting = false;
+      return;
     }
+    if (!res.ok) throw new Error(res.status);
+
+    // 스트리밍 말풍선: 첫 delta에서 로딩 표시를 대체
+    const turn = { bubble: document.getElementById(loadId), textEl: null };
+    let data = null;
+    for await (const { event, data: payload } of readSSE(res)) {
+      if (event === "delta") {
+        appendDelta(turn, payload.text);
+      } else if (event === "done") {
+        data = payload;
+      } else if (event === "error") {
+        throw new Error(payload.detail);
+      }
+    }
+    if (!data) throw new Error("stream ended without result");
+    showReply(turn.bubble, data);
   } catch (err) {
     console.error(err);
     document.getElementById(loadId).innerText = "⚠️ 오류";
-    [$box(), sendBtn].forEach(el => { el.disabled = false; el.style.opacity = 1; });
+    setInputEnabled(true);
   }
   isWaiting = false;
 }
@@ -140,14 +322,18 @@ function resetSession() { sessionStorage.removeItem("session_id"); location.relo
 // --------------------------------------------------
 window.onload = async () => {
   session_id = sessionStorage.getItem("session_id");
+  const dm = await (await fetch("/default-message")).json();
+  $box().value = dm.default_message; $box().placeholder = PH_DEFAULT;
+
+  // 준비 상태·세션 id 는 소켓으로 push 받음 (hello 에 session_id 가 없으면 서버가 새로 발급)
+  if ("WebSocket" in window) { connectWS(); return; }
+
   if (!session_id) {
     session_id = (await (await fetch("/init-session", { method: "POST" })).json()).session_id;
     sessionStorage.setItem("session_id", session_id);
   }
-
-  const dm = await (await fetch("/default-message")).json();
-  $box().value = dm.default_message; $box().placeholder = PH_DEFAULT;
-
-if ((await (await fetch("/status")).json()).ready)
-  appendMessage("bot", "안녕하세요, 공황 응급 지원입니다. 어떻게 도와드릴까요?", true);
+  if ((await (await fetch("/status")).json()).ready) {
+    greeted = true;
+    appendMessage("bot", "안녕하세요, 공황 응급 지원입니다. 어떻게 도와드릴까요?", true);
+  }
 };
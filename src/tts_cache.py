@@ -0,0 +1,153 @@
+import asyncio
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import metrics
+
+
+class TTSCache:
+    """
+    Content-addressed cache for synthesized audio.
+
+    Entries are keyed by ``sha256(speaker, text)``. Recently used audio is
+    kept in memory under an LRU byte budget; every entry is also written to
+    `cache_dir` so the cache survives restarts and is shared by workers.
+    The disk copy has its own budget (`max_disk_bytes`, ``None`` = no limit):
+    once exceeded, the least recently used files (by mtime, refreshed on
+    every disk hit) are deleted down to `disk_low_water` of it. Concurrent
+    misses for the same entry share one synthesis.
+    """
+    def __init__(self, cache_dir, max_bytes=64 * 1024 * 1024, max_disk_bytes=512 * 1024 * 1024,
+                 disk_low_water=0.9, suffix=".mp3"):
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_low_water = disk_low_water
+        self.suffix = suffix
+        self._mem = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()
+        self._disk_size = sum(size for _, _, size in self._disk_entries())
+        self._inflight = {}
+
+    @classmethod
+    def from_config(cls, default_dir, config: dict):
+        disk_mb = config.get("tts_cache_disk_mb", 512)
+        return cls(
+            config.get("tts_cache_dir") or default_dir,
+            max_bytes=config.get("tts_cache_max_mb", 64) * 1024 * 1024,
+            max_disk_bytes=disk_mb * 1024 * 1024 if disk_mb else None,
+        )
+
+    @staticmethod
+    def key(text: str, speaker: str) -> str:
+        return hashlib.sha256(f"{speaker}\0{text}".encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{self.suffix}"
+
+    def _disk_entries(self):
+        """``(mtime, path, size)`` of every cached file."""
+        entries = []
+        for path in self.cache_dir.glob(f"*/*{self.suffix}"):
+            try:
+                st = path.stat()
+            except FileNotFoundError:       # 다른 워커가 방금 지움
+                continue
+            entries.append((st.st_mtime, path, st.st_size))
+        return entries
+
+    def _evict_disk(self):
+        # 워커마다 따로 세므로 넘쳤을 때만 실제 디렉터리를 다시 세고 오래된 것부터 지운다
+        entries = sorted(self._disk_entries())
+        size = sum(entry[2] for entry in entries)
+        target = self.max_disk_bytes * self.disk_low_water
+        for _, path, file_size in entries:
+            if size <= target:
+                break
+            try:
+                path.unlink()
+            except FileNotFoundError:
+                pass
+            size -= file_size
+        self._disk_size = size
+
+    def _remember(self, key: str, data: bytes):
+        with self._lock:
+            if key in self._mem:
+                self._mem.move_to_end(key)
+                return
+            if len(data) > self.max_bytes:
+                return
+            self._mem[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._mem.popitem(last=False)
+                self._size -= len(evicted)
+
+    def get(self, text: str, speaker: str):
+        key = self.key(text, speaker)
+        with self._lock:
+            data = self._mem.get(key)
+            if data is not None:
+                self._mem.move_to_end(key)
+                metrics.TTS_CACHE_HITS.inc()
+                return data
+
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+            os.utime(path)              # 디스크 LRU 순서 갱신
+        except FileNotFoundError:
+            metrics.TTS_CACHE_MISSES.inc()
+            return None
+        self._remember(key, data)
+        metrics.TTS_CACHE_HITS.inc()
+        return data
+
+    def put(self, text: str, speaker: str, data: bytes):
+        key = self.key(text, speaker)
+        self._remember(key, data)
+
+        # 원자적 쓰기: 다른 워커가 반쯤 쓰인 파일을 읽지 않도록
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+        if self.max_disk_bytes is not None:
+            with self._disk_lock:
+                self._disk_size += len(data)
+                if self._disk_size > self.max_disk_bytes:
+                    self._evict_disk()
+
+    async def _fetch(self, text: str, speaker: str, synthesize):
+        # 디스크 I/O 는 이벤트 루프 밖에서
+        data = await asyncio.to_thread(self.get, text, speaker)
+        if data is None:
+            data = await synthesize(text, speaker)
+            await asyncio.to_thread(self.put, text, speaker, data)
+        return data
+
+    async def get_or_create(self, text: str, speaker: str, synthesize):
+        """Return cached audio, awaiting ``synthesize(text, speaker)`` on a miss."""
+        key = self.key(text, speaker)
+        task = self._inflight.get(key)
+        if task is None:
+            # 같은 문장의 동시 miss 는 합성 한 번을 함께 기다림
+            task = asyncio.ensure_future(self._fetch(text, speaker, synthesize))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+        # 기다리던 요청이 취소돼도 합성은 끝까지 (다른 대기자·캐시용)
+        return await asyncio.shield(task)
+
+    def _forget(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()            # 대기자가 모두 취소된 경우 경고 방지
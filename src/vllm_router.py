@@ -0,0 +1,182 @@
+import hashlib
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import openai
+import requests
+
+import metrics
+
+
+def _is_endpoint_failure(e: Exception) -> bool:
+    # timeout 은 대개 turn deadline 이 남은 시간으로 요청을 끊은 것이라 장애로 보지 않음,
+    # 4xx 도 요청 문제 → 연결 오류·5xx·429 만 장애로 센다
+    if isinstance(e, (openai.APITimeoutError, httpx.TimeoutException, requests.Timeout, TimeoutError)):
+        return False
+    status = getattr(e, "status_code", None)
+    if status is not None:
+        return status >= 500 or status == 429
+    return isinstance(e, (openai.APIConnectionError, httpx.TransportError,
+                          requests.ConnectionError, ConnectionError))
+
+
+class Endpoint:
+    """One vLLM server: its client, in-flight request count and health."""
+    def __init__(self, url: str, client):
+        self.url = url.rstrip("/")
+        self.client = client
+        self.outstanding = 0
+        self.healthy = True
+        self.failures = 0
+
+    def weight(self, key: str) -> int:
+        """Rendezvous (highest-random-weight) score of this endpoint for `key`."""
+        digest = hashlib.blake2b(f"{key}\0{self.url}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(digest, "big")
+
+
+class VLLMRouter:
+    """
+    Routes generation requests over several vLLM servers.
+
+    A session goes to the healthy endpoint with the highest rendezvous hash
+    weight, so its turns keep hitting the same server's prefix cache and
+    only the sessions of a removed endpoint move. When that endpoint already
+    has ``max_outstanding`` requests in flight, or no endpoint is preferred
+    (no session id), the least-loaded healthy endpoint is used instead.
+
+    ``failure_threshold`` failed requests in a row eject an endpoint; a
+    background thread polls ``GET /health`` every ``health_interval`` seconds
+    to eject dead endpoints and re-admit recovered ones. If every endpoint is
+    ejected, requests still go to the least-loaded one rather than failing.
+    """
+    def __init__(self, endpoints: list[Endpoint], max_outstanding=8, failure_threshold=3,
+                 health_interval=5.0, health_timeout=2.0, logger=None):
+        if not endpoints:
+            raise ValueError("VLLMRouter needs at least one endpoint")
+        self.endpoints = endpoints
+        self.max_outstanding = max_outstanding
+        self.failure_threshold = failure_threshold
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.logger = logger
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        for ep in endpoints:
+            metrics.VLLM_ENDPOINT_HEALTHY.labels(ep.url).set(1)
+            metrics.VLLM_ENDPOINT_OUTSTANDING.labels(ep.url).set(0)
+        self._thread = None
+        if health_interval and len(endpoints) > 1:
+            self._thread = threading.Thread(target=self._health_loop, name="vllm-health", daemon=True)
+            self._thread.start()
+
+    @classmethod
+    def from_config(cls, urls: list[str], make_client, config: dict, logger=None):
+        """`make_client(url)` builds the generation client of one endpoint."""
+        return cls(
+            [Endpoint(url, make_client(url.rstrip("/"))) for url in urls],
+            max_outstanding=config.get("vllm_max_outstanding", 8),
+            failure_threshold=config.get("vllm_failure_threshold", 3),
+            health_interval=config.get("vllm_health_interval", 5.0),
+            health_timeout=config.get("vllm_health_timeout", 2.0),
+            logger=logger,
+        )
+
+    # ── routing ───────────────────────────────────────────────────
+    def _pick(self, session_id=None) -> tuple[Endpoint, str]:
+        healthy = [ep for ep in self.endpoints if ep.healthy]
+        if not healthy:
+            return min(self.endpoints, key=lambda ep: ep.outstanding), "no_healthy"
+        if session_id is not None:
+            preferred = max(healthy, key=lambda ep: ep.weight(session_id))
+            if preferred.outstanding < self.max_outstanding:
+                return preferred, "affinity"
+        return min(healthy, key=lambda ep: ep.outstanding), "least_loaded"
+
+    @contextmanager
+    def acquire(self, session_id=None):
+        """Reserve an endpoint for one request; its outcome updates the endpoint's health."""
+        with self._lock:
+            ep, reason = self._pick(session_id)
+            ep.outstanding += 1
+            metrics.VLLM_ENDPOINT_OUTSTANDING.labels(ep.url).set(ep.outstanding)
+        metrics.VLLM_ROUTED.labels(ep.url, reason).inc()
+        try:
+            yield ep
+        except Exception as e:
+            if _is_endpoint_failure(e):
+                self._record_failure(ep, e)
+            raise
+        else:
+            with self._lock:
+                ep.failures = 0
+        finally:
+            with self._lock:
+                ep.outstanding -= 1
+                metrics.VLLM_ENDPOINT_OUTSTANDING.labels(ep.url).set(ep.outstanding)
+
+    def invoke(self, prompt, session_id=None, **kwargs):
+        with self.acquire(session_id) as ep:
+            return ep.client.invoke(prompt, **kwargs)
+
+    async def astream(self, prompt, session_id=None, **kwargs):
+        """Stream a completion (text chunks) from the endpoint `invoke` would use."""
+        with self.acquire(session_id) as ep:
+            async for chunk in ep.client.astream(prompt, **kwargs):
+                yield chunk
+
+    # ── health ────────────────────────────────────────────────────
+    def _set_healthy(self, ep: Endpoint, healthy: bool, reason: str):
+        with self._lock:
+            if ep.healthy == healthy:
+                return
+            ep.healthy = healthy
+            ep.failures = 0
+        metrics.VLLM_ENDPOINT_HEALTHY.labels(ep.url).set(int(healthy))
+        if self.logger is not None:
+            action = "re-admitted" if healthy else "ejected"
+            self.logger.warning(f"vLLM endpoint {ep.url} {action} ({reason})")
+
+    def _record_failure(self, ep: Endpoint, error: Exception):
+        with self._lock:
+            ep.failures += 1
+            failures = ep.failures
+        # 엔드포인트가 하나뿐이면 뺄 곳이 없으므로 세기만 한다
+        if failures >= self.failure_threshold and len(self.endpoints) > 1:
+            self._set_healthy(ep, False, f"{failures} failures: {error}")
+
+    def check(self, ep: Endpoint) -> bool:
+        try:
+            resp = requests.get(f"{ep.url}/health", timeout=self.health_timeout)
+            ok = resp.status_code == 200
+        except requests.RequestException:
+            ok = False
+        self._set_healthy(ep, ok, "health check")
+        return ok
+
+    def _health_loop(self):
+        while not self._stop.wait(self.health_interval):
+            for ep in self.endpoints:
+                self.check(ep)
+
+    def stop(self):
+        self._stop.set()
+
+    # ── warmup ────────────────────────────────────────────────────
+    def warmup(self, timeout=10):
+        """Warm every endpoint; an endpoint that fails is ejected until its health check passes."""
+        errors = []
+        for ep in self.endpoints:
+            start = time.perf_counter()
+            try:
+                ep.client.invoke("Hello", max_tokens=1, timeout=timeout)
+            except Exception as e:
+                errors.append(e)
+                if len(self.endpoints) > 1:
+                    self._set_healthy(ep, False, f"warmup failed: {e}")
+                continue
+            self._set_healthy(ep, True, f"warmup {(time.perf_counter() - start) * 1000:.0f} ms")
+        if len(errors) == len(self.endpoints):
+            raise errors[0]
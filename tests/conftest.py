@@ -0,0 +1,36 @@
+import sys
+import threading
+import time
+from pathlib import Path
+
+import pytest
+import uvicorn
+
+ROOT = Path(__file__).resolve().parent.parent
+# src/ 의 모듈은 평면 import (chatbot, model, ...) 로 사용, bench/ 의 stub 서버도 같은 방식
+sys.path.insert(0, str(ROOT / "src"))
+sys.path.insert(0, str(ROOT / "bench"))
+
+
+@pytest.fixture
+def serve():
+    """Run ASGI apps (e.g. the bench stubs) on a local port in this process; yields ``serve(app) -> url``."""
+    servers = []
+
+    def start(app):
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + 10
+        while not server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("stub server did not start")
+            time.sleep(0.01)
+        servers.append((server, thread))
+        port = server.servers[0].sockets[0].getsockname()[1]
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
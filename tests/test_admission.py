@@ -0,0 +1,50 @@
+import asyncio
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected
+
+
+async def hold(admission, started, release):
+    async with admission.slot():
+        started.set()
+        await release.wait()
+
+
+def test_rejects_when_queue_is_full():
+    async def main():
+        admission = AdmissionController(max_inflight=1, max_queued=1, retry_after=7)
+        started, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(hold(admission, started, release))
+        await started.wait()
+        queued = asyncio.create_task(hold(admission, asyncio.Event(), release))
+        await asyncio.sleep(0)
+        assert (admission.inflight, admission.waiting) == (1, 1)
+
+        with pytest.raises(AdmissionRejected) as e:
+            async with admission.slot():
+                pass
+        release.set()
+        await asyncio.gather(running, queued)
+        return e.value
+
+    rejected = asyncio.run(main())
+    assert (rejected.reason, rejected.retry_after) == ("queue full", 7)
+
+
+def test_wait_is_bounded_by_the_turn_budget():
+    async def main():
+        admission = AdmissionController(max_inflight=1, max_queue_wait=30)
+        started, release = asyncio.Event(), asyncio.Event()
+        running = asyncio.create_task(hold(admission, started, release))
+        await started.wait()
+        with pytest.raises(AdmissionRejected) as e:
+            async with admission.slot(max_wait=0.05):
+                pass
+        release.set()
+        await running
+        return e.value, admission
+
+    rejected, admission = asyncio.run(main())
+    assert rejected.reason == "queue wait timeout"
+    assert (admission.inflight, admission.waiting) == (0, 0)
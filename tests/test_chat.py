@@ -0,0 +1,135 @@
+"""
+Chat turns against a fake model: no vLLM, Gemini or journal files needed.
+"""
+import asyncio
+import io
+import types
+import wave
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+import chatbot
+from admission import AdmissionController
+from audio import AudioConverter
+from session_store import MemorySessionStore
+
+
+class SlowModel:
+    """Replies with the client's utterance after `delay` seconds."""
+    def __init__(self, delay=0.2):
+        self.delay = delay
+
+    async def generate(self, history, timings, session_id, deadline):
+        await asyncio.sleep(self.delay)
+        return f"답변: {history[-1]['message']}"
+
+    async def generate_stream(self, history, timings, session_id, deadline):
+        reply = await self.generate(history, timings, session_id, deadline)
+        yield "delta", reply
+        yield "final", reply
+
+    def end_session(self, session_id):
+        pass
+
+
+@pytest.fixture
+def app_state():
+    state = chatbot.app.state
+    state.model_ready = True
+    state.config = {"first_words": "안녕하세요", "last_words": "안녕히 가세요"}
+    state.logger = types.SimpleNamespace(
+        log_and_print=lambda *a: None, event=lambda *a, **k: None,
+        error=lambda *a: None, warning=lambda *a: None,
+    )
+    state.sessions = MemorySessionStore()
+    state.admission = AdmissionController()
+    state.journal = types.SimpleNamespace(append=lambda *a: None, close=lambda *a: None)
+    state.model = SlowModel()
+    yield state
+    state.model_ready = False
+
+
+def post_chat(client, session_id, text):
+    return client.post("/chat", json={"session_id": session_id, "user_utterance": text})
+
+
+async def concurrent_chats(*texts):
+    transport = httpx.ASGITransport(app=chatbot.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+        return await asyncio.gather(*(post_chat(client, "s1", text) for text in texts))
+
+
+def test_chat_records_turn(app_state):
+    (resp,) = asyncio.run(concurrent_chats("숨이 차요"))
+    assert resp.status_code == 200
+    assert resp.json()["system_utterance"] == "답변: 숨이 차요"
+    history = app_state.sessions.get("s1")["history"]
+    assert [m["role"] for m in history] == ["Counselor", "Client", "Counselor"]
+
+
+def test_concurrent_turn_on_same_session_is_rejected(app_state):
+    first, second = asyncio.run(concurrent_chats("숨이 차요", "어지러워요"))
+    assert sorted([first.status_code, second.status_code]) == [200, 409]
+    # 거절된 턴은 기록을 건드리지 않음 → 마지막 쓰기가 다른 턴을 덮어쓰지 않는다
+    history = app_state.sessions.get("s1")["history"]
+    assert len(history) == 3
+    # 턴이 끝나면 다시 받는다
+    (third,) = asyncio.run(concurrent_chats("괜찮아졌어요"))
+    assert third.status_code == 200
+    assert len(app_state.sessions.get("s1")["history"]) == 5
+
+
+def test_ws_audio_end_without_recording_reports_error(app_state):
+    with TestClient(chatbot.app).websocket_connect("/ws") as ws:
+        assert ws.receive_json() == {"type": "status", "ready": True}
+        ws.send_json({"type": "hello", "session_id": "s1"})
+        assert ws.receive_json()["type"] == "session"
+        ws.send_json({"type": "audio_end", "reply": True})
+        assert ws.receive_json() == {"type": "error", "detail": "No recording in progress"}
+
+
+def test_ws_recording_is_buffered_when_ffmpeg_cannot_start(app_state, monkeypatch):
+    async def transcribe(wav_bytes):
+        return f"{len(wav_bytes)} bytes"
+
+    # 이미 16 kHz mono WAV 라 audio_end 에서 ffmpeg 없이 그대로 통과
+    wav = io.BytesIO()
+    with wave.open(wav, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(AudioConverter.SAMPLE_RATE)
+        w.writeframes(b"\0\0" * 160)
+    data = wav.getvalue()
+
+    app_state.audio = AudioConverter(ffmpeg="/nonexistent/ffmpeg")
+    monkeypatch.setattr(chatbot, "transcribe", transcribe)
+    with TestClient(chatbot.app).websocket_connect("/ws") as ws:
+        ws.receive_json()
+        ws.send_json({"type": "hello", "session_id": "s1"})
+        ws.receive_json()
+        ws.send_json({"type": "audio_start"})
+        ws.send_bytes(data[:20])
+        ws.send_bytes(data[20:])
+        ws.send_json({"type": "audio_end", "reply": False})
+        assert ws.receive_json() == {"type": "transcript", "text": f"{len(data)} bytes"}
+
+
+def test_turn_beyond_the_queue_gets_503_and_is_undone(app_state):
+    app_state.admission = AdmissionController(max_inflight=1, max_queued=0, retry_after=3)
+
+    async def main():
+        transport = httpx.ASGITransport(app=chatbot.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            first = asyncio.create_task(post_chat(client, "s1", "숨이 차요"))
+            await asyncio.sleep(0.05)
+            second = await post_chat(client, "s2", "어지러워요")
+            return await first, second
+
+    first, second = asyncio.run(main())
+    assert first.status_code == 200
+    assert second.status_code == 503
+    assert second.headers["Retry-After"] == "3"
+    # 거절된 턴의 client 발화는 기록에서 되돌린다
+    assert [m["role"] for m in app_state.sessions.get("s2")["history"]] == ["Counselor"]
@@ -0,0 +1,69 @@
+import json
+import os
+import time
+
+import pytest
+
+from journal import JournalWriteError, SessionJournal
+
+
+def make_journal(tmp_path, **kwargs):
+    return SessionJournal(tmp_path, flush_interval=0.01, **kwargs)
+
+
+def test_append_then_close_compacts(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append("s1", 1, [{"role": "Client", "message": "숨이 차요"}])
+    journal.append("s1", 1, [{"role": "Counselor", "message": "천천히 숨 쉬어 보세요."}])
+    journal.close("s1", [{"role": "Counselor", "message": "안녕하세요"}])
+    journal.stop()
+
+    assert not journal.journal_path("s1").exists()
+    assert json.loads(journal.archive_path("s1").read_text(encoding="utf-8")) == [
+        {"role": "Counselor", "message": "안녕하세요"}
+    ]
+
+
+def test_journal_keeps_only_new_messages(tmp_path):
+    journal = make_journal(tmp_path)
+    journal.append("s1", 1, [{"role": "Client", "message": "a"}])
+    journal.append("s1", 2, [{"role": "Client", "message": "b"}])
+    journal.append("s1", 3, [])
+    journal.stop()
+
+    lines = journal.journal_path("s1").read_text(encoding="utf-8").splitlines()
+    assert [json.loads(line)["turn"] for line in lines] == [1, 2]
+    assert SessionJournal.read_journal(journal.journal_path("s1")) == [
+        {"role": "Client", "message": "a"}, {"role": "Client", "message": "b"},
+    ]
+
+
+def test_truncated_last_line_is_ignored(tmp_path):
+    path = tmp_path / "s1.jsonl"
+    path.write_text('{"turn": 1, "messages": [{"role": "Client", "message": "a"}]}\n{"turn": 2, "mess',
+                    encoding="utf-8")
+    assert SessionJournal.read_journal(path) == [{"role": "Client", "message": "a"}]
+
+
+def test_compact_orphans_only_old_journals(tmp_path):
+    old, fresh = tmp_path / "old.jsonl", tmp_path / "fresh.jsonl"
+    for path in (old, fresh):
+        path.write_text('{"turn": 1, "messages": [{"role": "Client", "message": "a"}]}\n', encoding="utf-8")
+    os.utime(old, (time.time() - 3600, time.time() - 3600))
+
+    journal = make_journal(tmp_path)
+    journal.compact_orphans(older_than=1800)
+    journal.stop()
+
+    assert (tmp_path / "old.json").exists() and not old.exists()
+    assert fresh.exists() and not (tmp_path / "fresh.json").exists()
+
+
+def test_turn_durability_raises_instead_of_hanging(tmp_path):
+    journal = make_journal(tmp_path, durability="turn")
+    with pytest.raises(JournalWriteError):
+        journal.append("s1", 1, [{"role": "Client", "message": object()}])   # JSON 직렬화 불가
+    # 다른 세션의 기록은 영향 없음
+    journal.append("s2", 1, [{"role": "Client", "message": "a"}])
+    journal.stop()
+    assert journal.journal_path("s2").exists()
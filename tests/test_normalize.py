@@ -0,0 +1,45 @@
+"""
+The one-pass `normalize_utterance` against the chained cleanup it replaced.
+"""
+import random
+import re
+
+from model import normalize_utterance, stable_prefix
+from stub_servers import completion_text
+
+
+def legacy_normalize(response):
+    """The chained cleanup `CounselorAgent.draft` used before the single regex, kept as the reference."""
+    cleaned = response.strip()
+    cleaned = re.sub(r"Client:.*?(?=\n[A-Za-z]+:|\Z)", "", cleaned, flags=re.DOTALL)
+    cleaned = cleaned.replace(":", "")
+    cleaned = re.sub(r'\[[^\]]*\]', '', cleaned)
+    cleaned = re.sub(r'\([^)]*\)', '', cleaned)
+    for label in ("History", "history", "Counselor", "counselor", "상담사", "Assistant", "assistant", "客人"):
+        cleaned = cleaned.replace(label, "")
+    cleaned = cleaned.strip()
+    return cleaned.split("\n")[0]
+
+
+SAMPLES = [
+    "Counselor: 지금 많이 힘드시죠. 천천히 숨을 쉬어 보세요.",
+    " Counselor: 괜찮아요 (잠시 멈춘다) 함께 호흡해요.\nClient: 네, 해 볼게요.\nCounselor: 좋아요.",
+    "\nCounselor: [공감하며] 지금 계신 곳은 안전한가요?\n\nClient: 네",
+    "상담사: 잘하고 계세요. History: 이전 대화",
+    "Assistant: 조금만 더 함께 해요.\nclient: 어지러워요",
+    "Counselor: Client: 숨이 차요\nCounselor: 천천히 숨 쉬어요.",
+    "Counselor: 시간은 10:30 이에요.",
+]
+
+
+def test_matches_legacy_cleanup():
+    rng = random.Random(0)
+    samples = SAMPLES + [completion_text(rng) for _ in range(50)] + [completion_text(rng, ["Client:"]) for _ in range(20)]
+    for sample in samples:
+        assert normalize_utterance(sample) == legacy_normalize(sample), sample
+
+
+def test_stable_prefix_only_returns_finished_sentences():
+    assert stable_prefix("Counselor: 지금 많이 힘드시죠. 천천히") == ("지금 많이 힘드시죠.", False)
+    assert stable_prefix("Counselor: 괜찮아요 (잠시") == ("", False)
+    assert stable_prefix("Counselor: 괜찮아요. 함께 해요\nClient: 네") == ("괜찮아요. 함께 해요", True)
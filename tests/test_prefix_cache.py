@@ -0,0 +1,49 @@
+"""
+Parsing vLLM's prefix-cache metrics, including the stub's /metrics output.
+"""
+import asyncio
+
+import httpx
+
+from model import Agent
+from stub_servers import Latency, create_vllm_app
+
+
+def test_parses_gpu_prefixed_counters():
+    text = (
+        "# TYPE vllm:gpu_prefix_cache_queries_total counter\n"
+        'vllm:gpu_prefix_cache_queries_total{model_name="pacer"} 200.0\n'
+        'vllm:gpu_prefix_cache_hits_total{model_name="pacer"} 150.0\n'
+    )
+    assert Agent.parse_prefix_cache_metrics(text) == {"hits": 150.0, "queries": 200.0}
+
+
+def test_parses_unprefixed_counters_once():
+    text = (
+        "vllm:prefix_cache_queries_total 100.0\n"
+        "vllm:prefix_cache_hits_total 40.0\n"
+        # 둘 다 내보내는 버전이어도 중복해서 세지 않는다
+        "vllm:gpu_prefix_cache_queries_total 100.0\n"
+        "vllm:gpu_prefix_cache_hits_total 40.0\n"
+    )
+    assert Agent.parse_prefix_cache_metrics(text) == {"hits": 40.0, "queries": 100.0}
+
+
+def test_falls_back_to_hit_rate_gauge():
+    text = 'vllm:gpu_prefix_cache_hit_rate{model_name="pacer"} 0.25\n'
+    assert Agent.parse_prefix_cache_metrics(text) == {"hit_rate": 0.25}
+    assert Agent.parse_prefix_cache_metrics("vllm:num_requests_running 1.0\n") == {}
+
+
+def test_stub_metrics_use_vllm_names():
+    async def scrape():
+        app = create_vllm_app(Latency("const:0"))
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stub") as client:
+            for prompt in ("Counselor: 안녕하세요\nClient: 숨이", "Counselor: 안녕하세요\nClient: 어지러워요"):
+                resp = await client.post("/v1/completions", json={"prompt": prompt, "max_tokens": 8})
+                assert resp.status_code == 200
+            return (await client.get("/metrics")).text
+
+    stats = Agent.parse_prefix_cache_metrics(asyncio.run(scrape()))
+    assert 0 < stats["hits"] < stats["queries"]
@@ -0,0 +1,51 @@
+from prompt import PromptBuilder
+
+
+class WordChecker:
+    """One token per whitespace-separated word."""
+    def count(self, text):
+        return len(text.split())
+
+    def truncate_left(self, text, max_tokens):
+        return " ".join(text.split()[-max_tokens:]) if max_tokens > 0 else ""
+
+
+HEADER_TOKENS = len(PromptBuilder.HEADER.split())
+
+
+def dialog(n):
+    roles = ("Counselor", "Client")
+    return [{"role": roles[i % 2], "message": f"m{i} 말"} for i in range(n)]
+
+
+def test_sliding_window_keeps_newest_messages_that_fit():
+    builder = PromptBuilder(WordChecker(), budget=HEADER_TOKENS + 9)     # 한 줄 = 3 토큰
+    prompt = builder.build(dialog(10))
+    assert prompt == PromptBuilder.HEADER + "Client: m7 말\nCounselor: m8 말\nClient: m9 말\n"
+
+
+def test_newest_message_is_truncated_rather_than_dropped():
+    builder = PromptBuilder(WordChecker(), budget=HEADER_TOKENS + 2)
+    history = [{"role": "Client", "message": "아주 긴 메시지 입니다"}]
+    assert builder.build(history) == PromptBuilder.HEADER + "메시지 입니다"
+
+
+def test_prefix_stable_prompts_extend_until_reanchor():
+    builder = PromptBuilder(WordChecker(), budget=HEADER_TOKENS + 30, layout="prefix_stable", reanchor_fill=0.5)
+    history = dialog(30)
+    prompts = [builder.build(history[:n]) for n in range(1, 31)]
+    reanchors = 0
+    for prev, cur in zip(prompts, prompts[1:]):
+        if cur.startswith(prev):
+            continue
+        # 예산 초과 시 한 번에 크게 이동 → 창이 reanchor_fill (15 토큰) 이하로 줄어든다
+        reanchors += 1
+        assert len(cur.split()) - HEADER_TOKENS <= 15
+    assert reanchors == 4       # 29 턴 중 네 번 (11·17·23·29 번째), 매 턴이 아니라
+    assert all(len(p.split()) <= HEADER_TOKENS + 30 for p in prompts)
+
+
+def test_prefix_stable_anchor_depends_only_on_history():
+    builder = PromptBuilder(WordChecker(), budget=HEADER_TOKENS + 30, layout="prefix_stable")
+    history = dialog(25)
+    assert builder.build(history) == PromptBuilder(WordChecker(), builder.budget, "prefix_stable").build(history)
@@ -0,0 +1,105 @@
+import asyncio
+import types
+
+import pytest
+
+from deadline import Deadline
+from http_clients import BackendClient
+from model import GeminiSafer
+from safety import FastReviewer, TieredReviewer
+from stub_servers import Latency, create_gemini_app
+
+SAFE_REPLY = "천천히 숨을 들이쉬고 내쉬어 보세요."
+
+
+def dialog(*client_messages):
+    history = [{"role": "Counselor", "message": "안녕하세요, 어떻게 도와드릴까요?"}]
+    for message in client_messages:
+        history.append({"role": "Client", "message": message})
+        history.append({"role": "Counselor", "message": "그러시군요."})
+    return history[:-1]
+
+
+def test_safe_reply_is_approved_locally():
+    decision = FastReviewer().review(dialog("숨이 차요"), SAFE_REPLY)
+    assert not decision.escalate
+
+
+def test_earlier_client_risk_keeps_escalating():
+    # 자해 발언 뒤 "네" 만 보내도 로컬 승인되면 안 됨
+    decision = FastReviewer().review(dialog("죽고 싶어요", "네"), SAFE_REPLY)
+    assert decision.escalate
+    assert decision.reason == "client risk keyword"
+
+
+@pytest.mark.parametrize("reply, reason", [
+    ("수면제를 드시면 괜찮아질 거예요.", "counselor risk keyword"),
+    ("공황장애로 진단할 수 있어요.", "medical advice"),
+    ("Counselor: 천천히 숨 쉬어요.", "generation artifact"),
+    ("OK, breathe slowly.", "no korean text"),
+    ("네.", "length 2"),
+    ("안녕하세요, 어떻게 도와드릴까요?", "repeated utterance"),
+])
+def test_risky_replies_escalate(reply, reason):
+    decision = FastReviewer().review(dialog("숨이 차요"), reply)
+    assert (decision.escalate, decision.reason) == (True, reason)
+
+
+def test_stabilized_client_escalates_for_closing():
+    decision = FastReviewer().review(dialog("숨이 차요", "이제 좀 괜찮아졌어요"), SAFE_REPLY)
+    assert decision.reason == "client may be stabilized"
+
+
+def test_sentence_review_skips_length_and_context_rules():
+    fast = FastReviewer()
+    assert not fast.review_sentence("네.").escalate
+    assert fast.review_sentence("수면제를 드셔 보세요.").escalate
+
+
+# ── Gemini 검토: bench stub 을 실제 HTTP 로 띄워서 ─────────────────
+NOOP_LOGGER = types.SimpleNamespace(
+    debug=lambda *a: None, event=lambda *a, **k: None, warning=lambda *a: None,
+)
+
+
+def tiered(url):
+    config = {"gemini_model_name": "stub", "gemini_api_key": "stub", "gemini_base_url": f"{url}/v1"}
+    gem = GeminiSafer(config, NOOP_LOGGER, client=BackendClient("gemini", failure_threshold=100))
+    return TieredReviewer(FastReviewer(), gem, NOOP_LOGGER, fallback="잠시 후 다시 말씀해 주세요.")
+
+
+def test_escalated_turn_is_reviewed_by_gemini_stub(serve):
+    reviewer = tiered(serve(create_gemini_app(Latency("const:10"))))
+    timings = {}
+    reply = "죽고 싶다는 마음이 드셨군요. 지금 안전한 곳에 계신가요?"
+    # stub 은 검토 대상 상담사 발화를 그대로 돌려준다
+    assert asyncio.run(reviewer.run(dialog("죽고 싶어요"), reply, timings)) == reply
+    assert timings["review_tier"] == "gemini"
+    assert "gemini_ms" in timings
+
+
+def test_streamed_review_deltas_add_up_to_final(serve):
+    reviewer = tiered(serve(create_gemini_app(Latency("const:50"), chunk_chars=5)))
+
+    async def collect():
+        return [event async for event in reviewer.run_stream(dialog("죽고 싶어요"), SAFE_REPLY)]
+
+    events = asyncio.run(collect())
+    deltas = [text for kind, text in events if kind == "delta"]
+    assert len(deltas) > 1
+    assert events[-1] == ("final", "".join(deltas)) == ("final", SAFE_REPLY)
+
+
+def test_failed_or_late_review_degrades_to_fallback(serve):
+    failing = tiered(serve(create_gemini_app(Latency("const:0"), fail_rate=1.0)))
+    slow = tiered(serve(create_gemini_app(Latency("const:2000"))))
+    history = dialog("죽고 싶어요")
+
+    timings = {}
+    assert asyncio.run(failing.run(history, SAFE_REPLY, timings)) == failing.fallback
+    assert timings["degraded"] == "review_error"
+
+    timings = {}
+    slow.min_budget = 0.1
+    assert asyncio.run(slow.run(history, SAFE_REPLY, timings, Deadline(0.3))) == slow.fallback
+    assert timings["degraded"] == "review_timeout"
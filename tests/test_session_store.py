@@ -0,0 +1,78 @@
+import time
+
+import pytest
+
+from session_store import MemorySessionStore, SessionStore, SQLiteSessionStore
+
+STATE = {"cnt": 1, "journaled": 1, "history": [{"role": "Counselor", "message": "안녕하세요"}]}
+
+
+def test_incomplete_backend_fails_on_instantiation():
+    class PartialStore(SessionStore):
+        def get(self, session_id):
+            return None
+
+    with pytest.raises(TypeError):
+        PartialStore(ttl=60)
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl=60, on_expire=None):
+        if request.param == "memory":
+            return MemorySessionStore(ttl=ttl, on_expire=on_expire)
+        return SQLiteSessionStore(tmp_path / "sessions.db", ttl=ttl, on_expire=on_expire)
+    return make
+
+
+def test_state_is_copied_in_and_out(make_store):
+    store = make_store()
+    store.put("s1", STATE)
+    state = store.get("s1")
+    state["history"].append({"role": "Client", "message": "숨이 차요"})
+    assert store.get("s1") == STATE
+    assert "s1" in store and len(store) == 1
+    store.delete("s1")
+    assert store.get("s1") is None
+
+
+def test_expired_session_is_archived_once(make_store):
+    archived = []
+    store = make_store(ttl=0.05, on_expire=lambda sid, state: archived.append((sid, state)))
+    store.put("s1", STATE)
+    time.sleep(0.1)
+    store.sweep()
+    store.sweep()
+    assert store.get("s1") is None
+    assert archived == [("s1", STATE)]
+
+
+def test_turn_claim_is_exclusive(make_store):
+    store = make_store()
+    assert store.claim_turn("s1")
+    assert not store.claim_turn("s1")
+    assert store.claim_turn("s2")
+    store.release_turn("s1")
+    assert store.claim_turn("s1")
+
+
+def test_sqlite_workers_share_sessions_and_archive_once(tmp_path):
+    archived = []
+    path = tmp_path / "sessions.db"
+    worker_a = SQLiteSessionStore(path, ttl=0.05, on_expire=lambda sid, state: archived.append(("a", sid)))
+    worker_b = SQLiteSessionStore(path, ttl=0.05, on_expire=lambda sid, state: archived.append(("b", sid)))
+    worker_a.put("s1", STATE)
+    assert worker_b.get("s1") == STATE
+    assert worker_a.claim_turn("s1") and not worker_b.claim_turn("s1")
+
+    time.sleep(0.1)
+    worker_b.sweep()
+    worker_a.sweep()
+    assert archived == [("b", "s1")]
+
+
+def test_sqlite_stale_turn_claim_is_taken_over(tmp_path):
+    store = SQLiteSessionStore(tmp_path / "sessions.db", turn_lease=0.05)
+    assert store.claim_turn("s1")
+    time.sleep(0.1)
+    assert store.claim_turn("s1")
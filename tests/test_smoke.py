@@ -0,0 +1,26 @@
+"""
+Smoke test: the app must import and answer before the model is loaded.
+
+The lifespan (model loading thread) is not started, so no GPU, vLLM or
+backend services are needed.
+"""
+from fastapi.testclient import TestClient
+
+import chatbot
+
+
+def make_client():
+    chatbot.app.state.model_ready = False
+    return TestClient(chatbot.app)
+
+
+def test_status_before_ready():
+    resp = make_client().get("/status")
+    assert resp.status_code == 200
+    assert resp.json() == {"ready": False}
+
+
+def test_chat_rejected_while_loading():
+    resp = make_client().post("/chat", json={"session_id": "s", "user_utterance": "안녕하세요"})
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "2"
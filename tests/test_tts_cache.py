@@ -0,0 +1,50 @@
+import asyncio
+import os
+
+import metrics
+from tts_cache import TTSCache
+
+
+def counter_value(counter):
+    samples = [line for line in counter.collect() if not line.startswith("#")]
+    return float(samples[0].rpartition(" ")[2]) if samples else 0.0
+
+
+def test_disk_budget_evicts_least_recently_used(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=0, max_disk_bytes=3000, disk_low_water=0.7)
+    for i, text in enumerate(["a", "b", "c"]):
+        cache.put(text, "0", b"x" * 1000)
+        os.utime(cache._path(cache.key(text, "0")), (i, i))
+    assert cache.get("a", "0") is not None     # 디스크 hit → 가장 최근 사용으로
+
+    cache.put("d", "0", b"x" * 1000)           # 4000 > 3000 → 2100 이하가 될 때까지 오래된 것부터
+    assert cache.get("a", "0") is not None
+    assert cache.get("d", "0") is not None
+    assert cache.get("b", "0") is None
+    assert cache.get("c", "0") is None
+
+
+def test_concurrent_misses_synthesize_once(tmp_path):
+    cache = TTSCache(tmp_path)
+    calls = []
+
+    async def synthesize(text, speaker):
+        calls.append(text)
+        await asyncio.sleep(0.05)
+        return text.encode()
+
+    async def main():
+        return await asyncio.gather(*(cache.get_or_create("안녕", "0", synthesize) for _ in range(5)))
+
+    assert asyncio.run(main()) == [b"\xec\x95\x88\xeb\x85\x95"] * 5
+    assert calls == ["안녕"]
+
+
+def test_hits_and_misses_are_counted(tmp_path):
+    cache = TTSCache(tmp_path, max_bytes=0)
+    hits, misses = counter_value(metrics.TTS_CACHE_HITS), counter_value(metrics.TTS_CACHE_MISSES)
+    assert cache.get("a", "0") is None
+    cache.put("a", "0", b"x")
+    assert cache.get("a", "0") == b"x"         # 메모리 예산 0 → 디스크 hit
+    assert counter_value(metrics.TTS_CACHE_HITS) == hits + 1
+    assert counter_value(metrics.TTS_CACHE_MISSES) == misses + 1
@@ -0,0 +1,111 @@
+"""
+VLLMRouter routing and health, with fake clients and against the vLLM stub.
+"""
+import asyncio
+import random
+
+import pytest
+import requests
+from langchain_openai import OpenAI
+
+from stub_servers import Latency, create_vllm_app
+from vllm_router import Endpoint, VLLMRouter
+
+
+class FakeClient:
+    """Records calls; raises `error` instead of answering when set."""
+    def __init__(self, url):
+        self.url = url
+        self.calls = 0
+        self.error = None
+
+    def invoke(self, prompt, **kwargs):
+        self.calls += 1
+        if self.error is not None:
+            raise self.error
+        return f"Counselor: {self.url}"
+
+
+def make_router(n=3, **kwargs):
+    kwargs.setdefault("health_interval", 0)
+    return VLLMRouter([Endpoint(f"http://vllm-{i}", FakeClient(f"http://vllm-{i}")) for i in range(n)], **kwargs)
+
+
+def routed_url(router, session_id):
+    return router.invoke("prompt", session_id=session_id).removeprefix("Counselor: ")
+
+
+def test_session_sticks_to_one_endpoint():
+    router = make_router()
+    sessions = [f"s{i}" for i in range(50)]
+    first = {s: routed_url(router, s) for s in sessions}
+    assert all(routed_url(router, s) == first[s] for s in sessions)
+    assert len(set(first.values())) == 3        # 세션이 서버들에 고르게 퍼진다
+
+
+def test_only_sessions_of_an_ejected_endpoint_move():
+    router = make_router()
+    sessions = [f"s{i}" for i in range(50)]
+    before = {s: routed_url(router, s) for s in sessions}
+    ejected = router.endpoints[0]
+    router._set_healthy(ejected, False, "test")
+    after = {s: routed_url(router, s) for s in sessions}
+    for s in sessions:
+        if before[s] != ejected.url:
+            assert after[s] == before[s]
+        else:
+            assert after[s] != ejected.url
+
+
+def test_saturated_endpoint_spills_to_least_loaded():
+    router = make_router(n=2, max_outstanding=1)
+    with router.acquire("s1") as busy:
+        with router.acquire("s1") as other:
+            assert other is not busy
+
+
+def test_connection_errors_eject_and_timeouts_do_not():
+    router = make_router(n=2, failure_threshold=2)
+    ep = router.endpoints[0]
+    ep.client.error = TimeoutError("deadline")
+    for _ in range(5):
+        with pytest.raises(TimeoutError):
+            with router.acquire() as picked:
+                assert picked is ep
+                picked.client.invoke("prompt")
+    assert ep.healthy
+
+    ep.client.error = ConnectionError("refused")
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            with router.acquire() as picked:
+                picked.client.invoke("prompt")
+    assert not ep.healthy
+    assert all(routed_url(router, f"s{i}") != ep.url for i in range(20))
+
+
+def test_health_check_ejects_and_readmits_stub(serve):
+    urls = [serve(create_vllm_app(Latency("const:0"))) for _ in range(2)]
+    router = VLLMRouter([Endpoint(url, FakeClient(url)) for url in urls], health_interval=0)
+    ep = router.endpoints[0]
+
+    requests.post(f"{ep.url}/stub/down")
+    assert not router.check(ep)
+    assert not ep.healthy
+    requests.post(f"{ep.url}/stub/up")
+    assert router.check(ep)
+    assert ep.healthy
+
+
+def test_astream_streams_stub_completion(serve):
+    url = serve(create_vllm_app(Latency("const:50"), rng=random.Random(0)))
+    client = OpenAI(openai_api_key="EMPTY", openai_api_base=f"{url}/v1", model="stub", max_retries=0)
+    router = VLLMRouter([Endpoint(url, client)], health_interval=0)
+
+    async def collect():
+        return [chunk async for chunk in router.astream("Counselor:", session_id="s1", stop=["Client:"])]
+
+    chunks = asyncio.run(collect())
+    assert len(chunks) > 1
+    assert "".join(chunks).strip().startswith("Counselor: ")
+    assert router.endpoints[0].outstanding == 0